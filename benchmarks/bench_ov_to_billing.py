@@ -0,0 +1,38 @@
+"""
+Benchmark: OV scrubber, per-visit ov_to_billing loop vs ov_to_billing_batch.
+
+    python benchmarks/bench_ov_to_billing.py --visits 100000 --visits-per-patient 6 --history 14
+
+Synthetic visits share one recent_cpts list per patient (as an EHR export
+would), so the batch indexes each patient's history once. Both paths must
+produce identical suggestions.
+"""
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import synthetic_visits
+from src.scrubber.ov_to_billing import ov_to_billing, ov_to_billing_batch
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--visits", type=int, default=100_000)
+    parser.add_argument("--visits-per-patient", type=int, default=6)
+    parser.add_argument("--history", type=int, default=14, help="max recent_cpts rows per patient")
+    args = parser.parse_args()
+
+    visits = synthetic_visits(args.visits, args.visits_per_patient, args.history)
+    single, t_single = timed(lambda vs: [ov_to_billing(v) for v in vs], visits)
+    batch, t_batch = timed(ov_to_billing_batch, visits)
+    assert single == batch, "batch output differs from ov_to_billing"
+
+    print(f"output check ({args.visits:,} visits): identical")
+    print(f"ov_to_billing loop  {args.visits:>9,} visits: {t_single:7.2f}s ({args.visits / t_single:,.0f}/s)")
+    print(f"ov_to_billing_batch {args.visits:>9,} visits: {t_batch:7.2f}s ({args.visits / t_batch:,.0f}/s)")
+
+if __name__ == "__main__":
+    main()
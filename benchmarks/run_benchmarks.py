@@ -0,0 +1,320 @@
+"""
+Benchmark suite: ERA pipeline and scrubber hot paths at 1k/10k/100k scales.
+
+    python benchmarks/run_benchmarks.py                      # compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline      # record this machine's baseline
+    python benchmarks/run_benchmarks.py --scales 1000,10000 --stages ingest_pdf,worklist
+
+Inputs come from benchmarks/synthetic.py (no PHI): SPR-layout ERA prints as
+text and rendered PDFs, OV visits and claim stubs; the scale is service
+lines for the ERA stages, visits for ov_to_billing and claims for
+batch_score. Each stage is timed --repeat times (best run kept) with
+generation and setup outside the timer, then run once more under
+tracemalloc for its peak Python-heap allocation (MuPDF's and SQLite's own
+C allocations are not traced).
+
+With ingest_pdf selected, the PDFs are also ingested with one worker and
+with a process pool, and the run exits 1 if run_metrics' stage call counts
+differ between the two (a worker reporting stages it didn't run).
+
+A stage more than --tolerance slower (and --min-delta seconds) or heavier
+than its baseline entry is reported as a regression and the run exits 1.
+Baselines are per machine, so benchmarks/baseline.json is not committed.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Callable
+from datetime import date
+from functools import cached_property
+import argparse, json, os, platform, shutil, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import era_documents, write_era_pdfs, synthetic_visits, synthetic_claims
+from src.era_pipeline.layouts import parse_spr
+from src.era_pipeline.extract import era_files
+from src import metrics
+from src.era_pipeline.cache import ExtractionCache
+from src.era_pipeline.store import RemittanceStore
+from src.era_pipeline.frames import expand_denial_columns, worklist_frame
+from src.era_pipeline.aggregates import totals, amounts_by, denial_sums, monthly_performance
+from src.era_pipeline.stats import write_denial_stats, STATS_FILE
+from src.era_pipeline.columnar import write_table, ServiceLineTable
+from src.scrubber.ov_to_billing import ov_to_billing_batch
+from src.predict.denial_risk import batch_score
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SCALES = [1_000, 10_000, 100_000]
+TODAY = date(2026, 1, 1)
+
+# ---- FIXTURES ----
+class Fixture:
+    """Generated inputs for one scale, built on first use under a temp dir."""
+    def __init__(self, scale:int, root:str):
+        self.scale = scale
+        self.root = root
+        self._fresh = 0
+
+    def fresh(self, name:str) -> str:
+        # An unused path per setup, so every timed run starts cold.
+        self._fresh += 1
+        return os.path.join(self.root, f"{name}-{self._fresh}")
+
+    @cached_property
+    def documents(self) -> List:
+        return list(era_documents(self.scale))
+
+    @cached_property
+    def pdf_dir(self) -> str:
+        folder = os.path.join(self.root, "era")
+        write_era_pdfs(folder, self.scale)
+        return folder
+
+    @cached_property
+    def cache(self) -> ExtractionCache:
+        return ExtractionCache(os.path.join(self.root, "cache"))
+
+    @cached_property
+    def hashes(self) -> Dict[str,str]:
+        hashes, _ = self.cache.update(self.pdf_dir, era_files(self.pdf_dir))
+        return hashes
+
+    @cached_property
+    def db_path(self) -> str:
+        # the synced store, with its era_stats.json alongside
+        path = os.path.join(self.root, "remittance.db")
+        store = RemittanceStore(path)
+        store.sync(self.hashes, self.cache)
+        write_denial_stats(store, self.root)
+        store.close()
+        return path
+
+    @property
+    def stats_path(self) -> str:
+        return os.path.join(os.path.dirname(self.db_path), STATS_FILE)
+
+    def store(self) -> RemittanceStore:
+        return RemittanceStore(self.db_path, read_only=True)
+
+    @cached_property
+    def columns_path(self) -> str:
+        path = os.path.join(self.root, "columns")
+        store = self.store()
+        write_table(store, path)
+        store.close()
+        return path
+
+    @cached_property
+    def visits(self) -> List[Dict[str,Any]]:
+        return synthetic_visits(self.scale, 6)
+
+    @cached_property
+    def claims(self) -> List[Dict[str,Any]]:
+        return synthetic_claims(self.scale)
+
+# ---- STAGES ----
+# setup(fixture) -> run(); run returns the number of items it processed.
+def _parse_text(fx:Fixture) -> Callable[[], int]:
+    docs = fx.documents
+    return lambda: sum(1 for _, pages in docs for _ in parse_spr(pages))
+
+def _ingest_pdf(fx:Fixture) -> Callable[[], int]:
+    folder, cache_dir = fx.pdf_dir, fx.fresh("cache")
+    def run():
+        ExtractionCache(cache_dir).update(folder, era_files(folder))
+        return fx.scale
+    return run
+
+def _store_sync(fx:Fixture) -> Callable[[], int]:
+    cache, hashes, path = fx.cache, fx.hashes, fx.fresh("store.db")
+    def run():
+        store = RemittanceStore(path)
+        store.sync(hashes, cache)
+        store.close()
+        return fx.scale
+    return run
+
+def _store_load(fx:Fixture) -> Callable[[], int]:
+    store = fx.store()
+    return lambda: len(store.load())
+
+def _denial_pivot(fx:Fixture) -> Callable[[], int]:
+    store = fx.store()
+    df, adjustments = store.load(), store.load_adjustments()
+    store.close()
+    return lambda: len(expand_denial_columns(df, adjustments))
+
+def _aggregation(fx:Fixture) -> Callable[[], int]:
+    path = fx.fresh("aggregates.db")
+    shutil.copy(fx.db_path, path)
+    def run():
+        store = RemittanceStore(path)
+        store.rebuild_aggregates()
+        t = totals(store)
+        amounts_by(store, "payer"), amounts_by(store, "proc"), denial_sums(store), monthly_performance(store)
+        write_denial_stats(store, fx.fresh("stats"))
+        store.close()
+        return int(t["lines"])
+    return run
+
+def _worklist(fx:Fixture) -> Callable[[], int]:
+    store = fx.store()
+    df, adjustments = store.load("prov_pd = 0"), store.load_adjustments("prov_pd = 0")
+    store.close()
+    return lambda: len(worklist_frame(df, TODAY, adjustments=adjustments))
+
+def _columnar(fx:Fixture) -> Callable[[], int]:
+    # open the memory-mapped table, dashboard aggregates and worklist over it
+    path = fx.columns_path
+    def run():
+        table = ServiceLineTable(path)
+        totals(table), amounts_by(table, "payer"), amounts_by(table, "proc"), denial_sums(table), \
+            monthly_performance(table)
+        denied = table.where(table.column("prov_pd") == 0)
+        worklist_frame(denied.frame(), TODAY, adjustments=denied.adjustment_frame())
+        return len(table)
+    return run
+
+def _ov_to_billing(fx:Fixture) -> Callable[[], int]:
+    visits = fx.visits
+    return lambda: len(ov_to_billing_batch(visits))
+
+def _batch_score(fx:Fixture) -> Callable[[], int]:
+    claims, stats = fx.claims, fx.stats_path
+    return lambda: len(batch_score(claims, era_stats_path=stats))
+
+STAGES: Dict[str,Callable[[Fixture],Callable[[],int]]] = {
+    "parse_text": _parse_text,
+    "ingest_pdf": _ingest_pdf,
+    "store_sync": _store_sync,
+    "store_load": _store_load,
+    "denial_pivot": _denial_pivot,
+    "aggregation": _aggregation,
+    "worklist": _worklist,
+    "columnar": _columnar,
+    "ov_to_billing": _ov_to_billing,
+    "batch_score": _batch_score,
+}
+
+def measure(setup, fx:Fixture, repeat:int, memory:bool=True) -> Dict[str,Any]:
+    best, items = float("inf"), 0
+    for _ in range(repeat):
+        run = setup(fx)
+        start = time.perf_counter()
+        items = run()
+        best = min(best, time.perf_counter() - start)
+    result = {"seconds": round(best, 4), "items": items, "per_sec": round(items / best) if best else None}
+    if memory:
+        run = setup(fx)
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def pool_metrics_mismatch(fx:Fixture, workers:int=3) -> List[str]:
+    """Stages whose call counts differ between a serial and a pooled ingest."""
+    calls = []
+    for n in (1, workers):
+        with metrics.profile(None):
+            ExtractionCache(fx.fresh("cache")).update(fx.pdf_dir, era_files(fx.pdf_dir), workers=n)
+            calls.append({name: s["calls"] for name, s in metrics.snapshot()["stages"].items()})
+    serial, pooled = calls
+    return [f"{name}: {serial.get(name, 0)} calls with 1 worker, {pooled.get(name, 0)} with {workers}"
+            for name in sorted(set(serial) | set(pooled)) if serial.get(name) != pooled.get(name)]
+
+# ---- BASELINE ----
+def regressions(results:Dict[str,Dict[str,Any]], baseline:Dict[str,Dict[str,Any]],
+                tolerance:float, min_delta:float) -> List[str]:
+    found = []
+    for stage, by_scale in results.items():
+        for scale, r in by_scale.items():
+            base = baseline.get(stage, {}).get(scale)
+            if not base:
+                continue
+            if r["seconds"] > base["seconds"] * (1 + tolerance) and r["seconds"] - base["seconds"] > min_delta:
+                found.append(f"{stage} @ {scale}: {r['seconds']:.3f}s vs baseline {base['seconds']:.3f}s"
+                             f" ({r['seconds'] / base['seconds'] - 1:+.0%})")
+            if r.get("peak_mb") and base.get("peak_mb") and r["peak_mb"] > base["peak_mb"] * (1 + tolerance) \
+                    and r["peak_mb"] - base["peak_mb"] > 1:
+                found.append(f"{stage} @ {scale}: peak {r['peak_mb']:.1f} MB vs baseline {base['peak_mb']:.1f} MB"
+                             f" ({r['peak_mb'] / base['peak_mb'] - 1:+.0%})")
+    return found
+
+def _row(stage:str, scale:str, r:Dict[str,Any], base:Dict[str,Any]|None) -> str:
+    change = f"{r['seconds'] / base['seconds'] - 1:+7.0%}" if base and base.get("seconds") else "      -"
+    peak = f"{r['peak_mb']:9.1f}" if "peak_mb" in r else "        -"
+    return f"{stage:<14}{int(scale):>9,}{r['seconds']:10.3f}{r['per_sec'] or 0:>12,}{peak}   {change}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated sizes")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results into the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown / growth (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns under this many seconds")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s) {', '.join(unknown)}; choose from {', '.join(STAGES)}")
+    baseline: Dict[str,Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    base_results = baseline.get("results", {})
+
+    results: Dict[str,Dict[str,Any]] = {}
+    mismatched: List[str] = []
+    print(f"{'stage':<14}{'scale':>9}{'seconds':>10}{'items/s':>12}{'peak MB':>9}   vs baseline")
+    for scale in [int(s) for s in args.scales.split(",") if s]:
+        root = tempfile.mkdtemp(prefix=f"bench-{scale}-")
+        try:
+            fx = Fixture(scale, root)
+            for stage in stages:
+                r = measure(STAGES[stage], fx, args.repeat, not args.no_memory)
+                results.setdefault(stage, {})[str(scale)] = r
+                print(_row(stage, str(scale), r, base_results.get(stage, {}).get(str(scale))), flush=True)
+            if "ingest_pdf" in stages:
+                mismatched.extend(f"{scale:,}: {m}" for m in pool_metrics_mismatch(fx))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {"machine": {"python": platform.python_version(), "platform": platform.platform(),
+                          "cpus": os.cpu_count()},
+              "recorded": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if mismatched:
+        print("\nMETRICS differ between serial and pooled ingest:")
+        for line in mismatched:
+            print(f"  {line}")
+        sys.exit(1)
+    if args.save_baseline:
+        for stage, by_scale in results.items():
+            base_results.setdefault(stage, {}).update(by_scale)
+        report["results"] = base_results
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not base_results:
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    found = regressions(results, base_results, args.tolerance, args.min_delta)
+    if found:
+        print(f"\nREGRESSION ({len(found)}) beyond {args.tolerance:.0%}:")
+        for line in found:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nno regressions beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Synthetic, PHI-free inputs for the benchmarks: ERA prints in the
+clearinghouse SPR layout (as page text or rendered PDFs), OV visits for the
+scrubber and claim stubs for denial scoring. Everything is seeded, so a
+scale always produces the same data.
+
+Names, member and claim numbers are generated (SAMPLE/TEST surnames,
+random digits); only payer names, CPTs and CARCs are real vocabulary, so
+payer detection and the parsers take their normal paths.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple, Iterator
+import os, random
+from datetime import date, timedelta
+
+# ---- ERA PRINTS ----
+PAYER_HEADERS = [
+    "UNITEDHEALTHCARE COMMUNITY PLAN []",
+    "BLUE CROSS BLUE SHIELD OF MICHIGAN []",
+    "HUMANA CLAIMS OFFICE []",
+    "PRIORITY HEALTH []",
+    "AARP SUPPLEMENTAL HEALTH PLANS FROM UNITEDHEALTHCARE []",
+    "AETNA LIFE INSURANCE COMPANY []",
+    "MERIDIAN HEALTH PLAN []",
+    "BLUE CARE NETWORK OF MICHIGAN []",
+]
+PROCS = [("99213", 160.0), ("99214", 219.0), ("99215", 295.0), ("G0444", 27.0), ("G0439", 245.0),
+         ("99497", 110.0), ("36415", 20.0), ("82043", 14.7), ("99396", 327.0), ("G2211", 25.0)]
+MODS = ["", "", "", "", "25", "QW", "33"]
+DENIALS = ["CO-97", "CO-16", "CO-50", "PR-204", "OA-23", "CO-18", "CO-151"]
+SURNAMES = ["SAMPLE", "TEST", "DEMO", "EXAMPLE", "PLACEHOLDER", "SYNTHETIC"]
+GIVEN = ["ALEX", "JORDAN", "CASEY", "RILEY", "MORGAN", "TAYLOR"]
+RULE = "_" * 114
+COLUMNS = ("REND PROV  SERV DATE   POS NOS   PROC   MODS      BILLED    ALLOWED  DEDUCT    COINS"
+           "   GRP/RC-AMT          PROV PD")
+LINES_PER_PAGE = 60
+
+def _service_line(rng:random.Random, dos:date) -> List[str]:
+    proc, fee = rng.choice(PROCS)
+    mod = rng.choice(MODS)
+    billed = fee
+    if rng.random() < 0.4:  # denied: nothing paid, one denial adjustment
+        allowed = paid = 0.0
+        grp, amt = rng.choice(DENIALS), billed
+    else:
+        allowed = round(billed * rng.uniform(0.45, 0.9), 2)
+        paid = allowed
+        grp, amt = "CO-45", round(billed - allowed, 2)
+    code = (proc + (" " + mod if mod else "")).ljust(16)
+    line = (f"{rng.randrange(10**9, 10**10)} {dos:%m%d} {dos:%m%d%y} 11    1 {code}"
+            f"{billed:9.2f}{allowed:9.2f}{0:9.2f}{0:9.2f}   {grp:<8}{amt:9.2f}{paid:11.2f}")
+    out = [line]
+    if paid == 0 and rng.random() < 0.2:  # a second adjustment on its own continuation line
+        out.append(" " * 87 + f"{'PR-1':<8}{rng.uniform(5, 40):9.2f}")
+    return out
+
+def era_pages(rng:random.Random, lines:int) -> List[str]:
+    """Page texts of one synthetic SPR remittance with `lines` service lines."""
+    text = [rng.choice(PAYER_HEADERS).ljust(105) + "REMITTANCE",
+            "PO BOX 000000".ljust(108) + "ADVICE",
+            "SAMPLE FAMILY MEDICINE PLLC".ljust(80) + "NPI #:        0000000000",
+            "", COLUMNS, RULE]
+    start = date(2025, 1, 1)
+    written = 0
+    while written < lines:
+        claim_lines = min(lines - written, rng.randint(1, 5))
+        dos = start + timedelta(days=rng.randrange(300))
+        text.append(f"NAME {rng.choice(SURNAMES)}, {rng.choice(GIVEN)} {rng.randrange(10000):04d}".ljust(28)
+                    + f"HIC {rng.randrange(10**10, 10**11)}  ACNT {rng.randrange(10**6, 10**7)}SYN"
+                    + f"           ICN {rng.randrange(10**11, 10**12)}     ASG Y   MOA")
+        for _ in range(claim_lines):
+            text.extend(_service_line(rng, dos))
+        text.append("CLAIM TOTALS".rjust(40))
+        text.append(RULE)
+        written += claim_lines
+    return ["\n".join(text[i:i + LINES_PER_PAGE]) + "\n" for i in range(0, len(text), LINES_PER_PAGE)]
+
+def era_documents(lines:int, lines_per_file:int=40, seed:int=7) -> Iterator[Tuple[str,List[str]]]:
+    """(file name, page texts) per remittance, `lines` service lines in total."""
+    rng = random.Random(seed)
+    for n, first in enumerate(range(0, lines, lines_per_file)):
+        yield f"SYNTHETIC ERA {n:05d}.pdf", era_pages(rng, min(lines_per_file, lines - first))
+
+def write_era_pdfs(folder:str, lines:int, lines_per_file:int=40, seed:int=7) -> List[str]:
+    """Render the era_documents prints as PDFs (monospaced, one text block per page)."""
+    import fitz  # PyMuPDF
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for name, pages in era_documents(lines, lines_per_file, seed):
+        doc = fitz.open()
+        for page_text in pages:
+            page = doc.new_page(width=792, height=612)
+            page.insert_text((18, 24), page_text.rstrip("\n").split("\n"), fontname="cour", fontsize=5.5)
+        doc.save(os.path.join(folder, name))
+        doc.close()
+        names.append(name)
+    return names
+
+# ---- VISITS ----
+VISIT_TYPES = ["OV", "OV", "OV", "AWV", "Preventive"]
+MDM = [None, "straightforward", "low", "moderate", "high"]
+PROCEDURES = [[], [], ["cryotherapy"], ["ACP discussion"], ["joint injection"]]
+COMPLAINTS = [[], ["depression screen"], ["PHQ depression follow-up"], ["annual wellness"], ["cough", "fatigue"]]
+ASSESSMENTS = [
+    "CKD stage 3a; PHQ-9 completed",
+    "No abnormal findings",
+    "Advance care planning discussed with patient and daughter",
+    "Hypertension, stable. Abnormal lipid panel.",
+    "Depression, moderate; G0444 screening done",
+    "",
+]
+HISTORY_CODES = ["G0439", "G0402", "99214", "99213", "G0444", "36415"]
+
+def synthetic_visits(visits:int, per_patient:int, history_rows:int=14, seed:int=7) -> List[Dict[str,Any]]:
+    rng = random.Random(seed)
+    start = date(2023, 1, 1)
+    out = []
+    history = []
+    for i in range(visits):
+        if i % per_patient == 0:
+            history = [{"code": rng.choice(HISTORY_CODES),
+                        "dos": (start + timedelta(days=rng.randrange(900))).isoformat()}
+                       for _ in range(rng.randrange(2, history_rows + 1))]
+        out.append({
+            "id": f"V{i:06d}",
+            "patient_id": f"P{i // per_patient:06d}",
+            "dos": (start + timedelta(days=rng.randrange(600, 1000))).isoformat(),
+            "visit_type": rng.choice(VISIT_TYPES),
+            "mdm_level": rng.choice(MDM),
+            "time_minutes": rng.choice([0, 8, 15, 20, 25, 30, 45]),
+            "procedures": rng.choice(PROCEDURES),
+            "complaints": rng.choice(COMPLAINTS),
+            "assessment_free_text": rng.choice(ASSESSMENTS),
+            "icd_candidates": rng.choice([[], ["Z13.31"], ["I10"]]),
+            "history": {"recent_cpts": history},
+            "previous_cpt_lookback_days": 365,
+        })
+    return out
+
+# ---- CLAIM STUBS ----
+CLAIM_PAYERS = ["UHC", "BCBS", "Humana", "Priority Health", "AARP", "Aetna", "MC"]
+CLAIM_ICDS = ["Z00.00", "Z00.01", "Z13.31", "F32.A", "N18.30", "I10", "E11.9"]
+
+def synthetic_claims(claims:int, seed:int=7) -> List[Dict[str,Any]]:
+    rng = random.Random(seed)
+    return [{"id": f"C{i:07d}",
+             "payer": rng.choice(CLAIM_PAYERS),
+             "cpts": [{"code": code, "modifiers": [m] if m else []}
+                      for code, m in ((rng.choice(PROCS)[0], rng.choice(MODS)) for _ in range(rng.randint(1, 4)))],
+             "icds": rng.sample(CLAIM_ICDS, rng.randint(0, 3))}
+            for i in range(claims)]
@@ -1,18 +1,24 @@
 import os
+from src.era_pipeline.cache import ExtractionCache
+from src.era_pipeline.extract import era_files
 
 pdf_folder = r"C:\Users\ma\Documents\DASHBOARD-BILLING\ERA COPIES 2025"
-log_file = r"C:\Users\ma\Documents\DASHBOARD-BILLING\processed_files.txt"
+cache_dir = r"C:\Users\ma\Documents\DASHBOARD-BILLING\era_cache"
 
 
 # All actual PDF files
-pdf_files = set(f for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf"))
+pdf_files = era_files(pdf_folder)
 
-# Logged processed files
-with open(log_file, "r") as f:
-    logged_files = set(f.read().splitlines())
-
-# Difference
-unprocessed = pdf_files - logged_files
+# New, changed, or parsed by an older parser version
+cache = ExtractionCache(cache_dir)
+hashes, unprocessed = cache.status(pdf_folder, pdf_files)
 print(f"🚨 Missing {len(unprocessed)} file(s):")
-for f in sorted(unprocessed):
+for f in unprocessed:
     print(f)
+
+# Pages with no text layer (scans), queued for an OCR pass
+no_text = cache.texts.no_text(hashes)
+if no_text:
+    print(f"📷 {len(no_text)} page(s) with no text layer:")
+    for f, page in no_text:
+        print(f"{f} p{page + 1}")
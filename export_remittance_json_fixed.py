@@ -1,185 +1,137 @@
 import os
-import fitz  # PyMuPDF
-import pandas as pd
-import re
 import json
-from datetime import datetime
+import argparse
+from src.era_pipeline.extract import default_workers, era_files
+from src.era_pipeline.cache import ExtractionCache
+from src.era_pipeline.store import RemittanceStore
+from src.era_pipeline.frames import expand_denial_columns, worklist_frame
+from src.era_pipeline.shards import write_sharded
+from src.era_pipeline.reconcile import line_visits
+from src.era_pipeline.columnar import refresh
+from src.era_pipeline.stats import write_denial_stats
+from src.era_pipeline.aggregates import totals, amounts_by, denial_sums
+from src import metrics
 
 # ---- PATH SETUP ----
 folder_path = r"C:\Users\ma\Documents\DASHBOARD-BILLING"
 source_pdf_folder = os.path.join(folder_path, "ERA COPIES 2025")
 react_data_folder = os.path.join(folder_path, "output")
 output_file = os.path.join(folder_path, "remittance_summary.xlsx")
-processed_log = os.path.join(folder_path, "processed_files.txt")
-
-# ---- LOAD PROCESSED FILES LOG ----
-if os.path.exists(processed_log):
-    with open(processed_log, "r") as log_file:
-        processed_files = set(log_file.read().splitlines())
-else:
-    processed_files = set()
-
-all_data = []
-
-# ---- PDF PARSING PATTERN ----
-pattern = re.compile(
-    r"NAME\s+(?P<patient>[A-Z ,]+).*?"
-    r"(\d{7,10})\s(?P<pos>\d{4})\s(?P<date>\d{6})\s+1\s(?P<proc>[A-Z0-9]+(?:\s[A-Z0-9]+)?)\s+"
-    r"(?P<billed>\d+\.\d{2})\s+(?P<allowed>\d+\.\d{2})\s+(?P<deduct>\d+\.\d{2})\s+"
-    r"(?P<coins>\d+\.\d{2})\s+(?P<group>[A-Z0-9\-]+)\s+(?P<grp_amt>\-?\d+\.\d{2})\s+"
-    r"(?P<prov_pd>\-?\d+\.\d{2})", re.DOTALL
-)
-
-# ---- PROCESS PDF FILES ----
-new_files = []
-for filename in os.listdir(source_pdf_folder):
-    if filename.lower().endswith(".pdf") and filename not in processed_files:
-        new_files.append(filename)
-        filepath = os.path.join(source_pdf_folder, filename)
-        doc = fitz.open(filepath)
-        full_text = "".join([page.get_text() for page in doc])
-
-        # Detect insurance payer
-        payer = "Unknown"
-        for line in full_text.splitlines()[:20]:
-            line = line.upper()
-            if "HUMANA" in line:
-                payer = "Humana"
-            elif "BLUE CARE NETWORK" in line:
-                payer = "BCN"
-            elif "BCBSM" in line or "BLUE CROSS" in line:
-                payer = "BCBS"
-            elif "UHC" in line or "UNITED" in line:
-                payer = "UHC"
-            elif "TRICARE" in line:
-                payer = "Tricare"
-            elif "PRIORITY HEALTH" in line:
-                payer = "Priority Health"
-
-        matches = pattern.findall(full_text)
-        for match in matches:
-            patient, _, pos, date, proc, billed, allowed, deduct, coins, group, grp_amt, prov_pd = match
-            all_data.append({
-                "INSURANCE": payer,
-                "File": filename,
-                "PATIENT NAME": patient.strip(),
-                "SERV DATE": f"{pos} {date}",
-                "PROC": proc.strip(),
-                "BILLED": float(billed),
-                "ALLOWED": float(allowed),
-                "DEDUCT": float(deduct),
-                "COINS": float(coins),
-                "GRP/RC-AMT": group.strip(),
-                "RC-AMT VALUE": float(grp_amt),
-                "PROV PD": float(prov_pd)
-            })
-
-# ---- EXIT IF NO NEW FILES ----
-if not all_data:
-    print("No new files to process.")
-    exit()
-
-# ---- CREATE DATAFRAME ----
-df = pd.DataFrame(all_data)
-
-# ---- EXPAND COLUMNS ----
-for code in df["GRP/RC-AMT"].unique():
-    df[code] = 0.00
-for i, row in df.iterrows():
-    df.at[i, row["GRP/RC-AMT"]] = row["RC-AMT VALUE"]
-df.drop(columns=["GRP/RC-AMT", "RC-AMT VALUE"], inplace=True)
-
-# ---- APPEND TO EXCEL ----
-if os.path.exists(output_file):
-    df_existing = pd.read_excel(output_file)
-    df_combined = pd.concat([df_existing, df], ignore_index=True)
-else:
-    df_combined = df
-df_combined.to_excel(output_file, index=False)
-
-# ---- AGGREGATE FOR JSON DASHBOARD ----
-def parse_service_date(serv_date_str):
-    try:
-        parts = serv_date_str.split()
-        if len(parts) == 2:
-            return datetime.strptime(parts[1], "%m%d%y")
-    except (ValueError, AttributeError):
-        return pd.NaT
-
-df_combined["Parsed_Date"] = df_combined["SERV DATE"].apply(parse_service_date)
-df_combined.dropna(subset=["Parsed_Date"], inplace=True)
-
-total_billed = df_combined["BILLED"].sum()
-total_paid = df_combined["PROV PD"].sum()
-collection_rate = (total_paid / total_billed * 100) if total_billed else 0
-denied_df = df_combined[df_combined["PROV PD"] == 0]
-denial_rate = (len(denied_df) / len(df_combined) * 100) if len(df_combined) else 0
-average_payment = df_combined["PROV PD"].mean()
-total_denied = denied_df["BILLED"].sum()
-
-kpi_data = {
-    "payments_ytd": round(total_paid, 2),
-    "denial_rate": round(denial_rate / 100, 3),
-    "days_to_pay": 18,
-    "write_offs": round(total_denied, 2),
-    "clean_rate": round((100 - denial_rate) / 100, 3),
-    "incentives_ytd": 22500
-}
-
-payer_data = (
-    df_combined.groupby("INSURANCE")["PROV PD"]
-    .sum().reset_index().rename(columns={"INSURANCE": "name", "PROV PD": "amount"})
-    .to_dict(orient="records")
-)
-
-denial_cols = [col for col in df_combined.columns if re.match(r"[A-Z]{2}-\d{2,3}", col)]
-denial_sums = df_combined[denial_cols].sum().reset_index()
-denial_sums.columns = ["name", "value"]
-denial_reason_data = denial_sums[denial_sums["value"] > 0].to_dict(orient="records")
-
-cpt_data = (
-    df_combined.groupby("PROC")["PROV PD"]
-    .sum().reset_index().rename(columns={"PROC": "name", "PROV PD": "amount"})
-    .to_dict(orient="records")
-)
-
-# ---- EXPORT JSONS ----
-os.makedirs(react_data_folder, exist_ok=True)
-with open(os.path.join(react_data_folder, "kpi_snapshot.json"), "w") as f:
-    json.dump(kpi_data, f, indent=2)
-with open(os.path.join(react_data_folder, "payer_summary.json"), "w") as f:
-    json.dump(payer_data, f, indent=2)
-with open(os.path.join(react_data_folder, "denial_trends.json"), "w") as f:
-    json.dump(denial_reason_data, f, indent=2)
-with open(os.path.join(react_data_folder, "claim_risk_scores.json"), "w") as f:
-    json.dump(cpt_data, f, indent=2)
-
-from datetime import datetime, timezone
-
-worklist_rows = []
-denial_cols = [col for col in df_combined.columns if re.match(r"[A-Z]{2}-\d{2,3}", col)]
-today = datetime.now(timezone.utc).date()
-
-for _, row in df_combined.iterrows():
-    if float(row.get("PROV PD", 0) or 0) == 0:
-        reason = next((c for c in denial_cols if float(row.get(c, 0) or 0) != 0), None)
-        serv_date = row.get("Parsed_Date")
-        days = (today - serv_date.date()).days if pd.notna(serv_date) else 0
-        worklist_rows.append({
-            "id": f"{row.get('INSURANCE','UNK')}-{str(row.get('File','')).split('.')[0]}",
-            "reason": reason or "Unspecified denial",
-            "claim": row.get("File", ""),
-            "amount": float(row.get("BILLED", 0) or 0),
-            "days": int(days),
-        })
-
-with open(os.path.join(react_data_folder, "worklist.json"), "w") as f:
-    json.dump(worklist_rows, f, indent=2)
-
-# ---- FINALIZE ----
-with open(processed_log, "a") as log_file:
-    for f in new_files:
-        log_file.write(f + "\n")
-
-print("Dashboard JSONs exported to output folder!")
-print(f"Done! Added {len(new_files)} new files.")
\ No newline at end of file
+cache_dir = os.path.join(folder_path, "era_cache")
+store_path = os.path.join(folder_path, "remittance.db")
+columns_path = os.path.join(folder_path, "remittance_columns")
+
+def export(workers=1, rebuild=False, excel=False, sharded=False):
+    # ---- PROCESS PDF FILES (cached by content hash) ----
+    cache = ExtractionCache(cache_dir)
+    source_files = era_files(source_pdf_folder)
+    with metrics.stage("ingest"):
+        hashes, new_files = cache.update(source_pdf_folder, source_files, workers=workers)
+
+    # ---- APPEND CHANGED FILES TO THE STORE ----
+    store = RemittanceStore(store_path)
+    changed, removed = store.sync(hashes, cache)
+
+    # ---- EXIT IF NO NEW FILES ----
+    if not changed and not removed and not rebuild:
+        print("No new files to process.")
+        store.close()
+        return
+
+    # ---- AGGREGATE FOR JSON DASHBOARD (running totals kept by the store) ----
+    if rebuild:
+        store.rebuild_aggregates()
+    t = totals(store)
+    if not t["lines"]:
+        print("No service lines found.")
+        store.close()
+        return
+
+    total_billed = t["billed"]
+    total_paid = t["paid"]
+    collection_rate = (total_paid / total_billed * 100) if total_billed else 0
+    denial_rate = t["denied"] / t["lines"] * 100
+    average_payment = total_paid / t["lines"]
+    total_denied = t["denied_billed"]
+
+    kpi_data = {
+        "payments_ytd": round(total_paid, 2),
+        "denial_rate": round(denial_rate / 100, 3),
+        "days_to_pay": 18,
+        "write_offs": round(total_denied, 2),
+        "clean_rate": round((100 - denial_rate) / 100, 3),
+        "incentives_ytd": 22500
+    }
+
+    with metrics.stage("aggregate"):
+        payer_data = amounts_by(store, "payer")
+        denial_reason_data = denial_sums(store)
+        cpt_data = amounts_by(store, "proc")
+
+    # ---- OPTIONAL EXCEL EXPORT ----
+    if excel:
+        with metrics.stage("excel.pivot"):
+            wide = expand_denial_columns(store.load(), store.load_adjustments())
+        with metrics.stage("excel.write"):
+            wide.to_excel(output_file, index=False)
+
+    # ---- COLUMNAR HISTORY (memory-mapped arrays, rewritten only when the store changed) ----
+    table = refresh(store, columns_path)
+
+    # ---- DENIAL WORKLIST (zero-paid lines only) ----
+    with metrics.stage("worklist"):
+        # linked to the scrubbed visit when the reconciliation index has one
+        denied = table.where(table.column("prov_pd") == 0)
+        worklist = worklist_frame(denied.frame(), visits=line_visits(store, "prov_pd = 0"),
+                                  adjustments=denied.adjustment_frame())
+
+    # ---- PAYER x CPT x CARC DENIAL STATS (claim risk scoring) ----
+    with metrics.stage("denial_stats"):
+        write_denial_stats(store, react_data_folder)
+    store.close()
+
+    # ---- EXPORT JSONS ----
+    datasets = {
+        "kpi_snapshot": kpi_data,
+        "payer_summary": payer_data,
+        "denial_trends": denial_reason_data,
+        "claim_risk_scores": cpt_data,
+        "worklist": worklist.drop(columns="payer").to_dict(orient="records"),
+    }
+    with metrics.stage("json.write"):
+        if sharded:
+            # compact pages + manifest.json; worklist also split by payer
+            write_sharded(react_data_folder, datasets, groups={"worklist": {"payer": worklist["payer"].tolist()}})
+        else:
+            os.makedirs(react_data_folder, exist_ok=True)
+            for name, data in datasets.items():
+                with open(os.path.join(react_data_folder, f"{name}.json"), "w") as f:
+                    json.dump(data, f, indent=2)
+                    metrics.count("json_bytes", f.tell())
+
+    # ---- FINALIZE ----
+    cache.prune()
+
+    print("Dashboard JSONs exported to output folder!")
+    print(f"Done! Parsed {len(new_files)} new or changed files, {len(changed)} updated in the store.")
+
+def main(workers=1, rebuild=False, excel=False, sharded=False, profile=None):
+    # Stage timings and counters (plus the --profile summary) go to run_metrics.json.
+    with metrics.profile(profile) as profiled:
+        export(workers, rebuild, excel, sharded)
+    metrics.write(react_data_folder, "export_remittance_json_fixed", profiled, workers=workers, rebuild=rebuild)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export ERA remittance PDFs to dashboard JSON.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="PDF extraction processes (1 = serial, 0 = one per CPU core)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="regenerate outputs from the store even if no PDF changed")
+    parser.add_argument("--excel", action="store_true",
+                        help="also write remittance_summary.xlsx from the store")
+    parser.add_argument("--sharded", action="store_true",
+                        help="write compact paged JSON plus manifest.json instead of one file per dataset")
+    parser.add_argument("--profile", choices=metrics.PROFILES,
+                        help="also profile the run (cProfile or tracemalloc) into run_metrics.json")
+    args = parser.parse_args()
+    main(args.workers or default_workers(), args.rebuild, args.excel, args.sharded, args.profile)
@@ -0,0 +1,262 @@
+"""
+Local read-only query API over the remittance store (remittance.db).
+Answers the dashboard endpoints straight from the indexed service lines, so
+staff can slice the data without re-running an export:
+
+  GET /kpi_snapshot  /payer_summary  /denial_trends  /claim_risk_scores  /worklist
+      (a ".json" suffix is accepted, so the UI's file paths work unchanged)
+
+Filters (all optional, combinable):
+  payer=UHC,Aetna     INSURANCE in the list (repeatable)
+  cpt=99214,36415     PROC code, with or without modifier (repeatable)
+  from=2025-01-01     service date on or after (ISO)
+  to=2025-06-30       service date on or before (ISO)
+  page=1&page_size=500  worklist only
+
+Response shapes match the exported JSON files. Results are kept in an
+in-memory LRU keyed by endpoint + filters + store version (the db file's
+mtime/size, so a sync invalidates everything) and carry an ETag; a matching
+If-None-Match gets 304.
+
+  python -m src.api.server --db remittance.db --port 8787
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple
+from collections import OrderedDict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import argparse, hashlib, json, os, threading
+
+import pandas as pd
+
+from src.era_pipeline.aggregates import DENIAL_CODE_RE
+from src.era_pipeline.frames import WORKLIST_FIELDS, utc_today, worklist_frame
+from src.era_pipeline.store import RemittanceStore
+
+# Same placeholders the export scripts write into kpi_snapshot.json.
+DAYS_TO_PAY = 18
+INCENTIVES_YTD = 22500
+
+CACHE_SIZE = 256
+
+def _cents(column:str) -> str:
+    return f"CAST(ROUND({column} * 100) AS INTEGER)"
+
+class QueryError(ValueError):
+    pass
+
+def _list(params:Dict[str,List[str]], name:str) -> List[str]:
+    return [v.strip() for raw in params.get(name, []) for v in raw.split(",") if v.strip()]
+
+def _iso(params:Dict[str,List[str]], name:str) -> str|None:
+    if name not in params:
+        return None
+    try:
+        return date.fromisoformat(params[name][-1]).isoformat()
+    except ValueError:
+        raise QueryError(f"{name} must be an ISO date (YYYY-MM-DD)")
+
+def _int(params:Dict[str,List[str]], name:str, default:int) -> int:
+    try:
+        value = int(params[name][-1]) if name in params else default
+    except ValueError:
+        raise QueryError(f"{name} must be an integer")
+    if value < 1:
+        raise QueryError(f"{name} must be >= 1")
+    return value
+
+def filters(params:Dict[str,List[str]]) -> Dict[str,Any]:
+    """Normalized filters (sorted lists) so equivalent queries share a cache entry."""
+    return {
+        "payer": sorted(set(_list(params, "payer"))),
+        "cpt": sorted(set(_list(params, "cpt"))),
+        "from": _iso(params, "from"),
+        "to": _iso(params, "to"),
+    }
+
+def where_clause(f:Dict[str,Any], dates:bool=True, cpt:bool=True) -> Tuple[str,tuple]:
+    # Lines without a parseable service date are excluded, as in the exports.
+    clauses, params = ["dos IS NOT NULL"], []
+    if f["payer"]:
+        clauses.append(f"insurance IN ({','.join('?' * len(f['payer']))})")
+        params.extend(f["payer"])
+    if cpt and f["cpt"]:
+        clauses.append("(" + " OR ".join("proc = ? OR proc LIKE ?" for _ in f["cpt"]) + ")")
+        for code in f["cpt"]:
+            params.extend([code, f"{code} %"])
+    if dates and f["from"]:
+        clauses.append("dos >= ?")
+        params.append(f["from"])
+    if dates and f["to"]:
+        clauses.append("dos <= ?")
+        params.append(f["to"])
+    return " AND ".join(clauses), tuple(params)
+
+# ---- ENDPOINTS ----
+def kpi_snapshot(store:RemittanceStore, f:Dict[str,Any], params, today:date) -> Dict[str,Any]:
+    where, args = where_clause(f)
+    lines, paid, denied, denied_billed = store.conn.execute(
+        f"SELECT COUNT(*), TOTAL({_cents('prov_pd')}), TOTAL(prov_pd = 0),"
+        f" TOTAL(CASE WHEN prov_pd = 0 THEN {_cents('billed')} ELSE 0 END)"
+        f" FROM service_lines WHERE {where}", args).fetchone()
+    denial_rate = denied / lines if lines else 0
+    return {
+        "payments_ytd": round(paid / 100, 2),
+        "denial_rate": round(denial_rate, 3),
+        "days_to_pay": DAYS_TO_PAY,
+        "write_offs": round(denied_billed / 100, 2),
+        "clean_rate": round(1 - denial_rate, 3),
+        "incentives_ytd": INCENTIVES_YTD
+    }
+
+def _paid_by(store:RemittanceStore, f:Dict[str,Any], column:str) -> List[Dict[str,Any]]:
+    where, args = where_clause(f)
+    rows = store.conn.execute(
+        f"SELECT {column}, TOTAL({_cents('prov_pd')}) FROM service_lines WHERE {where}"
+        f" GROUP BY {column} ORDER BY {column}", args)
+    return [{"name": key, "amount": cents / 100} for key, cents in rows]
+
+def payer_summary(store:RemittanceStore, f:Dict[str,Any], params, today:date) -> List[Dict[str,Any]]:
+    return _paid_by(store, f, "insurance")
+
+def claim_risk_scores(store:RemittanceStore, f:Dict[str,Any], params, today:date) -> List[Dict[str,Any]]:
+    return _paid_by(store, f, "proc")
+
+def denial_trends(store:RemittanceStore, f:Dict[str,Any], params, today:date) -> List[Dict[str,Any]]:
+    # every adjustment of the selected lines, not just the one on the line
+    where, args = where_clause(f)
+    rows = store.conn.execute(
+        f"SELECT code, TOTAL({_cents('amount')}) FROM adjustments JOIN service_lines USING (file, line)"
+        f" WHERE {where} GROUP BY code ORDER BY code", args)
+    return [{"name": code, "value": cents / 100} for code, cents in rows
+            if DENIAL_CODE_RE.match(code) and cents > 0]
+
+def worklist(store:RemittanceStore, f:Dict[str,Any], params, today:date) -> List[Dict[str,Any]]:
+    # Ids number a claim's denied lines, so build over every denied line of
+    # the selected payers and apply the per-line filters afterwards: a line
+    # keeps the same id however the list is sliced.
+    where, args = where_clause(f, dates=False, cpt=False)
+    df = store.load(f"{where} AND prov_pd = 0", args)
+    wl = worklist_frame(df, today, adjustments=store.load_adjustments(f"{where} AND prov_pd = 0", args))
+    lines = df.loc[wl.index]
+    keep = lines["SERV DATE"].notna()
+    if f["from"]:
+        keep &= lines["SERV DATE"] >= pd.Timestamp(f["from"])
+    if f["to"]:
+        keep &= lines["SERV DATE"] <= pd.Timestamp(f["to"])
+    if f["cpt"]:
+        code = lines["PROC"].astype(str).str.split(" ").str[0]
+        keep &= lines["PROC"].astype(str).isin(f["cpt"]) | code.isin(f["cpt"])
+    rows = wl[keep.to_numpy()][WORKLIST_FIELDS]
+    page, size = _int(params, "page", 1), _int(params, "page_size", len(rows) or 1)
+    return rows.iloc[(page - 1) * size:page * size].to_dict(orient="records")
+
+ENDPOINTS = {
+    "kpi_snapshot": kpi_snapshot,
+    "payer_summary": payer_summary,
+    "denial_trends": denial_trends,
+    "claim_risk_scores": claim_risk_scores,
+    "worklist": worklist,
+}
+
+# ---- CACHE ----
+class QueryCache:
+    """LRU of encoded responses: key -> (etag, body)."""
+    def __init__(self, maxsize:int=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+class DashboardAPI:
+    def __init__(self, db_path:str, cache_size:int=CACHE_SIZE):
+        self.db_path = db_path
+        self.store = RemittanceStore(db_path, read_only=True)
+        self.cache = QueryCache(cache_size)
+        self.lock = threading.Lock()  # one sqlite connection, one query at a time
+
+    def version(self) -> Tuple[int,int]:
+        st = os.stat(self.db_path)
+        return st.st_mtime_ns, st.st_size
+
+    def query(self, endpoint:str, params:Dict[str,List[str]]) -> Tuple[str,bytes]:
+        """(etag, JSON body) for an endpoint; KeyError / QueryError on bad input."""
+        handler = ENDPOINTS[endpoint]
+        f = filters(params)
+        paging = tuple(params.get(k, [""])[-1] for k in ("page", "page_size"))
+        # worklist ages ("days") roll over at UTC midnight; the same date keys the entry
+        today = utc_today()
+        key = (endpoint, json.dumps(f, sort_keys=True), paging, self.version(), today)
+        hit = self.cache.get(key)
+        if hit:
+            return hit
+        with self.lock:
+            body = json.dumps(handler(self.store, f, params, today), separators=(",", ":")).encode()
+        entry = ('"' + hashlib.sha256(body).hexdigest()[:32] + '"', body)
+        self.cache.put(key, entry)
+        return entry
+
+def make_handler(api:DashboardAPI):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status:int, body:bytes=b"", etag:str|None=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Cache-Control", "no-cache")
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status:int, message:str):
+            self._send(status, json.dumps({"error": message}).encode())
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            endpoint = url.path.strip("/").rsplit("/", 1)[-1].removesuffix(".json")
+            if endpoint == "":
+                return self._send(200, json.dumps(sorted(ENDPOINTS)).encode())
+            if endpoint not in ENDPOINTS:
+                return self._error(404, f"unknown endpoint: {endpoint}")
+            try:
+                etag, body = api.query(endpoint, parse_qs(url.query))
+            except QueryError as e:
+                return self._error(400, str(e))
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                return self._send(304, etag=etag)
+            self._send(200, body, etag)
+
+    return Handler
+
+def serve(db_path:str, host:str="127.0.0.1", port:int=8787):
+    server = ThreadingHTTPServer((host, port), make_handler(DashboardAPI(db_path)))
+    print(f"Serving {db_path} on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only dashboard query API over remittance.db.")
+    parser.add_argument("--db", default="remittance.db", help="remittance store written by the export scripts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+    serve(args.db, args.host, args.port)
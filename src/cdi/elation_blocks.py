@@ -1,21 +1,22 @@
-
 """
 CDI prompt generator for Elation Note-style blocks.
 Produces lightweight prompts to nudge missing documentation/codes.
+Triggers and their negations live in src/rules/cdi.json; one keyword scan
+per note finds all of them. For a day's export see src/cdi/stream.py.
 """
 from __future__ import annotations
 from typing import Dict, Any, List
+import os
+
+from src.rules.engine import RuleSet, load_rules
+
+CDI_RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "cdi.json")
+
+def text_prompts(text:str, rules:RuleSet) -> List[Dict[str,str]]:
+    return [dict(then["prompt"]) for _, then in rules.fired(rules.scan({"text": text}))]
 
-def cdi_prompts(note:Dict[str,Any]) -> List[Dict[str,str]]:
-    text = (note.get("text") or "").lower()
-    prompts = []
-    if "ckd" in text and "n18.3" not in text:
-        prompts.append({"type":"dx","message":"You mentioned CKD — add N18.30 staging if appropriate?"})
-    if "phq" in text and "g0444" not in text:
-        prompts.append({"type":"cpt","message":"PHQ documented — bill G0444 if ≥15 min and tool/score captured?"})
-    if "advance care planning" in text and "99497" not in text:
-        prompts.append({"type":"cpt","message":"ACP discussed — add 99497 if ≥16 minutes with consent/time?"})
-    return prompts
+def cdi_prompts(note:Dict[str,Any], rules_path:str=CDI_RULES) -> List[Dict[str,str]]:
+    return text_prompts(note.get("text") or "", load_rules(rules_path))
 
 if __name__ == "__main__":
     demo = {"text":"PHQ-9 performed; patient with CKD stage 3a. Advance care planning discussed."}
@@ -0,0 +1,155 @@
+"""
+Streaming CDI prompts over a day's note export.
+
+Reads notes from NDJSON (one JSON object per line) or CSV, optionally
+gzipped or "-" for stdin NDJSON, and writes one NDJSON line per note that
+has prompts:
+
+  {"id": "N123", "prompts": [{"type": "dx", "message": "..."}]}
+
+Notes are handled in chunks; with --workers > 1 the chunks go to a pool
+(processes by default: the keyword scan holds the GIL) with a bounded
+number in flight, so memory stays flat however large the export is and the
+output keeps input order.
+
+  python -m src.cdi.stream notes.ndjson -o cdi_prompts.ndjson --workers 4
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple, Iterator, IO
+import argparse, collections, csv, gzip, json, os, sys, time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from src.cdi.elation_blocks import CDI_RULES, text_prompts
+from src.rules.engine import load_rules
+
+CHUNK = 256
+
+# ---- INPUT ----
+def _open(path:str) -> IO[str]:
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+def _format(path:str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "ndjson"
+
+def read_notes(path:str, fmt:str|None=None, id_field:str="id", text_field:str="text",
+               skipped:List[int]|None=None) -> Iterator[Tuple[str,str]]:
+    """
+    (note id, text) per note, read lazily. Notes without an id get their
+    line/row number; unreadable NDJSON lines are skipped (their line numbers
+    are appended to skipped).
+    """
+    fmt = fmt or _format(path)
+    f = _open(path)
+    try:
+        if fmt == "csv":
+            csv.field_size_limit(1 << 30)  # multi-KB notes exceed the 128 KB default
+            for n, row in enumerate(csv.DictReader(f), start=1):
+                yield str(row.get(id_field) or n), row.get(text_field) or ""
+            return
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                note = json.loads(line)
+            except ValueError:
+                note = None
+            if not isinstance(note, dict):
+                if skipped is not None:
+                    skipped.append(n)
+                continue
+            yield str(note.get(id_field) or n), note.get(text_field) or ""
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def _chunks(notes:Iterator[Tuple[str,str]], size:int) -> Iterator[List[Tuple[str,str]]]:
+    chunk = []
+    for note in notes:
+        chunk.append(note)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# ---- PROMPTS ----
+def prompt_chunk(chunk:List[Tuple[str,str]], rules_path:str=CDI_RULES) -> List[Tuple[str,List[Dict[str,str]]]]:
+    """(id, prompts) for the notes of a chunk that have any; runs in pool workers."""
+    rules = load_rules(rules_path)
+    out = []
+    for note_id, text in chunk:
+        prompts = text_prompts(text, rules)
+        if prompts:
+            out.append((note_id, prompts))
+    return out
+
+def stream_prompts(notes:Iterator[Tuple[str,str]], out:IO[str], rules_path:str=CDI_RULES,
+                   workers:int=1, pool:str="process", chunk:int=CHUNK) -> Dict[str,int]:
+    """
+    Write prompts for every note to out as NDJSON, in input order. At most
+    2 x workers chunks are in flight. Returns note / prompted / prompt counts.
+    """
+    counts = {"notes": 0, "prompted": 0, "prompts": 0}
+
+    def write(results):
+        for note_id, prompts in results:
+            out.write(json.dumps({"id": note_id, "prompts": prompts}, ensure_ascii=False) + "\n")
+            counts["prompted"] += 1
+            counts["prompts"] += len(prompts)
+
+    def counted(chunks):
+        for c in chunks:
+            counts["notes"] += len(c)
+            yield c
+
+    chunks = counted(_chunks(notes, chunk))
+    if workers <= 1:
+        for c in chunks:
+            write(prompt_chunk(c, rules_path))
+        return counts
+    executor = (ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor)(max_workers=workers)
+    with executor:
+        pending: collections.deque = collections.deque()
+        for c in chunks:
+            pending.append(executor.submit(prompt_chunk, c, rules_path))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CDI prompts for a note export (NDJSON or CSV).")
+    parser.add_argument("notes", help="notes file (.ndjson/.jsonl/.csv, optionally .gz) or - for stdin NDJSON")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output (default stdout)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="input format (default: by extension)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--rules", default=CDI_RULES)
+    parser.add_argument("--workers", type=int, default=1, help="pool size; 0 = one per CPU")
+    parser.add_argument("--pool", choices=["process", "thread"], default="process")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="notes per pool task")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    skipped: List[int] = []
+    notes = read_notes(args.notes, args.format, args.id_field, args.text_field, skipped)
+    out = sys.stdout if args.output == "-" else open(args.output + ".tmp", "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        counts = stream_prompts(notes, out, args.rules, workers, args.pool, args.chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if out is not sys.stdout:
+        os.replace(args.output + ".tmp", args.output)
+    seconds = time.perf_counter() - start
+    print(f"{counts['notes']:,} notes, {counts['prompted']:,} with prompts ({counts['prompts']:,} prompts)"
+          f" in {seconds:.2f}s, {counts['notes'] / max(seconds, 1e-9):,.0f} notes/s", file=sys.stderr)
+    if skipped:
+        print(f"skipped {len(skipped)} unreadable line(s): {skipped[:10]}", file=sys.stderr)
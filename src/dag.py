@@ -0,0 +1,132 @@
+"""
+Small dependency-aware task runner for run_all.
+
+Tasks declare the tasks they must follow, the files/folders they read and
+the files they write. Independent tasks run concurrently on a thread pool.
+A task is skipped when its fingerprint (its inputs' size/mtime, the source
+file defining it, and its dependencies' fingerprints) matches the last run,
+all its outputs still exist and none of its dependencies ran this time (a
+dependency that ran may have rewritten a file the task also writes).
+Fingerprints live in a small JSON state file next to the outputs.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import hashlib, json, os, sys, time, traceback
+from src import metrics
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[[], None]
+    deps: List[str] = field(default_factory=list)
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+
+def _stat_entries(path:str) -> List[str]:
+    # "path size mtime" per file; a folder contributes every file under it
+    # (bytecode caches excluded: importing a module rewrites them).
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [f"{path} {st.st_size} {st.st_mtime_ns}"]
+    if os.path.isdir(path):
+        entries = []
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for f in sorted(files):
+                entries.extend(_stat_entries(os.path.join(root, f)))
+        return entries
+    return [f"{path} missing"]
+
+def fingerprint(task:Task, dep_prints:List[str]) -> str:
+    h = hashlib.sha256(task.name.encode())
+    module = sys.modules.get(task.fn.__module__)
+    sources = [module.__file__] if module and getattr(module, "__file__", None) else []
+    for path in sources + task.inputs:
+        for entry in _stat_entries(os.path.abspath(path)):
+            h.update(entry.encode())
+    for p in dep_prints:
+        h.update(p.encode())
+    return h.hexdigest()
+
+def _order(tasks:List[Task]) -> List[Task]:
+    # Topological order (declaration order among ready tasks); rejects cycles.
+    by_name = {t.name: t for t in tasks}
+    for t in tasks:
+        missing = [d for d in t.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"task {t.name!r} depends on unknown {missing}")
+    done, ordered = set(), []
+    while len(ordered) < len(tasks):
+        ready = [t for t in tasks if t.name not in done and all(d in done for d in t.deps)]
+        if not ready:
+            raise ValueError("task dependency cycle: " + ", ".join(t.name for t in tasks if t.name not in done))
+        ordered.extend(ready)
+        done.update(t.name for t in ready)
+    return ordered
+
+def run(tasks:List[Task], state_path:str, jobs:int=4, force:bool=False) -> Dict[str,str]:
+    """
+    Run the graph; returns {task: "ran" | "skipped" | "failed" | "blocked"}.
+    A failed task (an exception or sys.exit) blocks its dependents and
+    loses its saved fingerprint; unrelated tasks still run.
+    """
+    ordered = _order(tasks)
+    state: Dict[str,str] = {}
+    if os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    prints: Dict[str,str] = {}
+    status: Dict[str,str] = {}
+
+    def execute(task:Task, fp:str):
+        start = time.perf_counter()
+        with metrics.thread_profile(), metrics.stage(f"task.{task.name}"):
+            task.fn()
+        return fp, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        running = {}
+        while len(status) < len(ordered):
+            for task in ordered:
+                if task.name in status or task.name in running.values():
+                    continue
+                if any(status.get(d) in ("failed", "blocked") for d in task.deps):
+                    status[task.name] = "blocked"
+                    print(f"[{task.name}] blocked by a failed dependency")
+                    continue
+                if not all(status.get(d) in ("ran", "skipped") for d in task.deps):
+                    continue
+                fp = fingerprint(task, [prints[d] for d in task.deps])
+                fresh = (state.get(task.name) == fp
+                         and all(os.path.exists(p) for p in task.outputs)
+                         and not any(status[d] == "ran" for d in task.deps))
+                if fresh and not force:
+                    prints[task.name] = fp
+                    status[task.name] = "skipped"
+                    print(f"[{task.name}] up to date, skipped")
+                    continue
+                running[pool.submit(execute, task, fp)] = task.name
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    fp, seconds = future.result()
+                except (Exception, SystemExit):  # a task's sys.exit() fails it, not the graph
+                    status[name] = "failed"
+                    state.pop(name, None)  # rerun next time even if nothing changed
+                    print(f"[{name}] failed:\n{traceback.format_exc()}")
+                    continue
+                prints[name] = state[name] = fp
+                status[name] = "ran"
+                print(f"[{name}] done in {seconds:.2f}s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, state_path)
+    return status
@@ -0,0 +1,107 @@
+"""
+Incremental dashboard aggregates.
+Each ERA file contributes a small set of partial sums per dimension:
+
+  total  ""          every dated line (KPI totals)
+  payer  INSURANCE
+  proc   PROC
+  month  YYYY-MM     from the SERV DATE thru-date
+  carc   GRP-RC      one entry per ADJUSTMENTS pair, so a line with CO-45 and
+                     PR-3 counts under both; `amount` sums that adjustment
+
+For the other dimensions `amount` is the line's total adjustment.
+
+RemittanceStore keeps those partials per file and folds them into running
+totals as files are added, changed or removed, so a refresh costs the new
+batch rather than the year-to-date volume. Amounts are integer cents so the
++/- deltas never drift. Lines whose SERV DATE doesn't parse are left out,
+as the full-frame export did with dropna(Parsed_Date).
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple
+from datetime import datetime
+import re
+
+import pandas as pd
+
+DIMENSIONS = ("total", "payer", "proc", "month", "carc")
+# lines, billed, paid, denied (lines paid 0), denied_billed, amount
+MEASURES = ("lines", "billed", "paid", "denied", "denied_billed", "amount")
+
+# Adjustment codes reported as denial trends (same filter as the old denial_cols).
+DENIAL_CODE_RE = re.compile(r"[A-Z]{2}-\d{2,3}")
+MONTH_ORDER = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
+
+def _cents(x:float) -> int:
+    return int(round(x * 100))
+
+def service_day(serv_date:str) -> str|None:
+    # "MMDD MMDDYY" -> "YYYY-MM-DD"; None when the date part doesn't parse.
+    parts = serv_date.split()
+    if len(parts) != 2:
+        return None
+    try:
+        return datetime.strptime(parts[1], "%m%d%y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+def service_month(serv_date:str) -> str|None:
+    day = service_day(serv_date)
+    return day[:7] if day else None
+
+def file_partials(records:List[Dict[str,Any]]) -> List[Tuple]:
+    """(dim, key, lines, billed, paid, denied, denied_billed, amount) rows for one file."""
+    acc: Dict[Tuple[str,str],List[int]] = {}
+    def add(dim, key, billed, paid, denied, amount):
+        m = acc.setdefault((dim, key), [0] * len(MEASURES))
+        m[0] += 1
+        m[1] += billed
+        m[2] += paid
+        m[3] += denied
+        m[4] += billed if denied else 0
+        m[5] += amount
+    for r in records:
+        month = service_month(r["SERV DATE"])
+        if month is None:
+            continue
+        billed, paid = _cents(r["BILLED"]), _cents(r["PROV PD"])
+        denied = int(r["PROV PD"] == 0)
+        adjustments = [(code, _cents(amt)) for code, amt in r["ADJUSTMENTS"]]
+        amount = sum(amt for _, amt in adjustments)
+        add("total", "", billed, paid, denied, amount)
+        add("payer", r["INSURANCE"], billed, paid, denied, amount)
+        add("proc", r["PROC"], billed, paid, denied, amount)
+        add("month", month, billed, paid, denied, amount)
+        for code, amt in adjustments:
+            add("carc", code, billed, paid, denied, amt)
+    return [(dim, key, *m) for (dim, key), m in acc.items()]
+
+# ---- DASHBOARD SHAPES ----
+def totals(store) -> Dict[str,float]:
+    df = store.totals("total")
+    if df.empty:
+        return dict.fromkeys(MEASURES, 0)
+    return df.iloc[0][list(MEASURES)].to_dict()
+
+def amounts_by(store, dim:str) -> List[Dict[str,Any]]:
+    # [{"name", "amount"}] of provider paid per key (payer / proc)
+    df = store.totals(dim)
+    return [{"name": k, "amount": v} for k, v in zip(df["key"], df["paid"])]
+
+def denial_sums(store) -> List[Dict[str,Any]]:
+    df = store.totals("carc")
+    return [{"name": k, "value": v} for k, v in zip(df["key"], df["amount"])
+            if DENIAL_CODE_RE.match(k) and v > 0]
+
+def monthly_performance(store) -> List[Dict[str,Any]]:
+    # Calendar months across years fold together, as the old "%b" group-by did.
+    df = store.totals("month")
+    if df.empty:
+        return []
+    df["Month"] = pd.to_datetime(df["key"], format="%Y-%m").dt.strftime("%b")
+    monthly = df.groupby("Month").agg(billed=("billed","sum"), paid=("paid","sum"), denied=("denied","sum")).reset_index()
+    monthly["Month"] = pd.Categorical(monthly["Month"], categories=MONTH_ORDER, ordered=True)
+    monthly = monthly.sort_values("Month")
+    monthly["Month"] = monthly["Month"].astype(str)
+    monthly["denied"] = monthly["denied"].astype(int)
+    return monthly.to_dict(orient="records")
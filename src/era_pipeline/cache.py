@@ -0,0 +1,135 @@
+"""
+Per-file ERA extraction cache keyed by content hash + parser version.
+Replaces the filename-only processed_files.txt log: a re-downloaded or
+corrected ERA under the same name is re-parsed, and the full aggregate can
+be rebuilt from cached service lines without reopening any PDF.
+
+Zip bundle members are entries of their own ("<bundle>.zip/<member>"),
+hashed from memory. A member whose content is already in the folder (or
+in an earlier member) is skipped, so a bundle of remits that were also
+saved loose does not count them twice.
+
+PDF page text is cached separately (textcache.py) and does not depend on
+the parser version, so a version bump re-parses from cached text.
+
+Layout:
+  <cache_dir>/index.json               filename -> {size, mtime, sha256}
+                                       (a zip member uses its bundle's size/mtime)
+  <cache_dir>/<sha256>-v<version>.json parsed service lines for that content
+  <cache_dir>/text/                    compressed page text per PDF (textcache.py)
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple
+import hashlib, json, os
+
+from src import metrics
+from src.era_pipeline.extract import PARSER_VERSION, extract_files, read_member, split_member
+from src.era_pipeline.textcache import PageTextCache
+
+def content_hash(path:str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class ExtractionCache:
+    def __init__(self, cache_dir:str, version:str=PARSER_VERSION):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.texts = PageTextCache(cache_dir)
+        self.index: Dict[str,Dict[str,Any]] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def key(self, sha:str) -> str:
+        return f"{sha}-v{self.version}"
+
+    def _entry_path(self, sha:str) -> str:
+        return os.path.join(self.cache_dir, f"{self.key(sha)}.json")
+
+    @metrics.stage("cache.hash")
+    def hash_file(self, folder:str, filename:str) -> str:
+        # Reuse the stored hash while size and mtime are unchanged.
+        member = split_member(filename)
+        st = os.stat(os.path.join(folder, member[0] if member else filename))
+        known = self.index.get(filename)
+        if known and known["size"] == st.st_size and known["mtime"] == st.st_mtime:
+            return known["sha256"]
+        if member:
+            sha = hashlib.sha256(read_member(folder, filename)).hexdigest()
+        else:
+            sha = content_hash(os.path.join(folder, filename))
+        self.index[filename] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha}
+        return sha
+
+    @metrics.stage("cache.read")
+    def get(self, sha:str, filename:str) -> List[Dict[str,Any]]|None:
+        path = self._entry_path(sha)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            records = json.load(f)["records"]
+        # Identical content may be saved under several names.
+        return [{**r, "File": filename} for r in records]
+
+    @metrics.stage("cache.write")
+    def put(self, sha:str, filename:str, records:List[Dict[str,Any]]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._entry_path(sha), "w") as f:
+            json.dump({"file": filename, "parser_version": self.version, "records": records}, f)
+
+    def status(self, folder:str, filenames:List[str]) -> Tuple[Dict[str,str], List[str]]:
+        """
+        Return ({filename: sha256}, [filenames with no current cache entry]).
+        Zip members duplicating content seen elsewhere are left out of both.
+        """
+        hashes = {name: self.hash_file(folder, name) for name in filenames}
+        seen = {sha for name, sha in hashes.items() if not split_member(name)}
+        for name in [n for n in hashes if split_member(n)]:
+            if hashes[name] in seen:
+                del hashes[name]
+            else:
+                seen.add(hashes[name])
+        stale = [name for name, sha in hashes.items() if not os.path.exists(self._entry_path(sha))]
+        return hashes, stale
+
+    def update(self, folder:str, filenames:List[str], workers:int=1) -> Tuple[Dict[str,str], List[str]]:
+        """Parse only new/changed files. Returns ({filename: sha256}, parsed_filenames)."""
+        hashes, stale = self.status(folder, filenames)
+        for name, records in zip(stale, extract_files(folder, stale, workers, hashes, self.texts)):
+            self.put(hashes[name], name, records)
+        # Files removed from the folder drop out of the index.
+        self.index = {name: self.index[name] for name in filenames}
+        self.save()
+        return hashes, stale
+
+    def extract(self, folder:str, filenames:List[str], workers:int=1) -> Tuple[List[Dict[str,Any]], List[str]]:
+        """
+        Service lines for every file in `filenames` (file order preserved),
+        parsing only new/changed files. Returns (records, parsed_filenames).
+        """
+        hashes, stale = self.update(folder, filenames, workers)
+        records = []
+        for name in hashes:
+            records.extend(self.get(hashes[name], name) or [])
+        return records, stale
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def prune(self) -> int:
+        """Delete entries (and page text) no indexed file (or older parser version) refers to."""
+        live = {os.path.basename(self._entry_path(v["sha256"])) for v in self.index.values()}
+        removed = self.texts.prune(v["sha256"] for v in self.index.values())
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json") and name != "index.json" and name not in live:
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+        return removed
@@ -0,0 +1,268 @@
+"""
+Memory-mapped, array-backed copy of the service-line table for multi-year
+history.
+
+Every column is one .npy file opened with mmap_mode="r": amounts as
+float64, the thru-date as datetime64[D] (NaT when it doesn't parse), and
+payer, file, patient, claim, POS, PROC and CPT as int32 codes into per-column
+dictionaries kept in the manifest. Adjustments (the store's `adjustments`
+table, every CAS adjustment of a line in print order) are a CSR block (row
+i owns adj_code/adj_amount[adj_indptr[i]:adj_indptr[i+1]]), so no column
+per adjustment code is ever materialized. Opening the table reads only the
+manifest; pages are faulted in as a column is touched.
+
+Rows are in store order (file, line), the order store.load() returns, so a
+row mask lines up with store queries. ServiceLineTable.totals(dim) has
+RemittanceStore.totals' shape, so aggregates.totals / amounts_by /
+denial_sums / monthly_performance run over a table (or a where() slice of
+one, e.g. a single year) as well as over the store.
+
+Layout:
+  <dir>/manifest.json   {version, rows, adjustments, fingerprint, dictionaries}
+  <dir>/<column>.npy    one array per column
+The export scripts call refresh() after each sync; it rewrites the table
+(into a sibling folder, swapped in when complete) only when the store's
+files changed.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Iterable
+import copy, hashlib, json, os, shutil
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+from src.era_pipeline.aggregates import DIMENSIONS, MEASURES
+from src.era_pipeline.store import LOAD_COLUMNS, CATEGORICAL
+
+# Bump when the layout changes; an older table is rewritten.
+COLUMNAR_VERSION = 2
+MANIFEST = "manifest.json"
+CHUNK = 100_000
+
+STRINGS = ("insurance", "file", "patient", "claim", "pos", "proc", "cpt")
+AMOUNTS = ("billed", "allowed", "deduct", "coins", "prov_pd")
+SELECT = ("SELECT insurance, file, patient, claim, pos, proc, cpt, billed, allowed, deduct, coins, prov_pd, dos,"
+          " (SELECT COUNT(*) FROM adjustments a WHERE a.file = s.file AND a.line = s.line)"
+          " FROM service_lines s ORDER BY file, line")
+# same (file, line) order as SELECT, so each chunk takes the next sum(counts) rows
+SELECT_ADJUSTMENTS = "SELECT code, amount FROM adjustments ORDER BY file, line, seq"
+
+class _Encoder:
+    """Dictionary encoder that grows across chunks."""
+    def __init__(self):
+        self.values: List[str] = []
+        self.ids: Dict[str,int] = {}
+
+    def encode(self, column:Iterable) -> np.ndarray:
+        inverse, uniques = pd.factorize(np.asarray(column, dtype=object), use_na_sentinel=False)
+        ids = np.empty(len(uniques), dtype=np.int32)
+        for i, v in enumerate(uniques):
+            v = "" if v is None else str(v)
+            if v not in self.ids:
+                self.ids[v] = len(self.values)
+                self.values.append(v)
+            ids[i] = self.ids[v]
+        return ids[inverse]
+
+def fingerprint(store) -> str:
+    keys = sorted(store.file_keys().items())
+    return hashlib.sha256(json.dumps([COLUMNAR_VERSION, keys]).encode()).hexdigest()
+
+@metrics.stage("columnar.write")
+def write_table(store, path:str) -> str:
+    """Write the store's service lines as a columnar table at `path` (replaced when complete)."""
+    conn = store.conn
+    rows, = conn.execute("SELECT COUNT(*) FROM service_lines").fetchone()
+    adjustments, = conn.execute("SELECT COUNT(*) FROM adjustments").fetchone()
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    def column(name, dtype, n):
+        return np.lib.format.open_memmap(os.path.join(tmp, f"{name}.npy"), mode="w+", dtype=dtype, shape=(n,))
+    cols = {name: column(name, np.int32, rows) for name in STRINGS}
+    cols.update({name: column(name, np.float64, rows) for name in AMOUNTS})
+    cols["dos"] = column("dos", "datetime64[D]", rows)
+    indptr = column("adj_indptr", np.int64, rows + 1)
+    adj_code = column("adj_code", np.int32, adjustments)
+    adj_amount = column("adj_amount", np.float64, adjustments)
+    encoders = {name: _Encoder() for name in STRINGS + ("adjustment",)}
+
+    indptr[0] = 0
+    start = filled = 0
+    cursor = conn.execute(SELECT)
+    adj_cursor = conn.cursor().execute(SELECT_ADJUSTMENTS)
+    while True:
+        chunk = cursor.fetchmany(CHUNK)
+        if not chunk:
+            break
+        data = list(zip(*chunk))
+        stop = start + len(chunk)
+        for i, name in enumerate(STRINGS):
+            cols[name][start:stop] = encoders[name].encode(data[i])
+        for i, name in enumerate(AMOUNTS, len(STRINGS)):
+            cols[name][start:stop] = np.asarray(data[i], dtype=np.float64)
+        cols["dos"][start:stop] = np.array(data[-2], dtype="datetime64[D]")
+        counts = np.asarray(data[-1], dtype=np.int64)
+        indptr[start + 1:stop + 1] = filled + np.cumsum(counts)
+        n = int(counts.sum())
+        if n:
+            code, amount = zip(*adj_cursor.fetchmany(n))
+            adj_code[filled:filled + n] = encoders["adjustment"].encode(code)
+            adj_amount[filled:filled + n] = np.asarray(amount, dtype=np.float64)
+        start, filled = stop, filled + n
+    for array in (*cols.values(), indptr, adj_code, adj_amount):
+        array.flush()
+    del cols, indptr, adj_code, adj_amount
+
+    manifest = {"version": COLUMNAR_VERSION, "rows": rows, "adjustments": adjustments,
+                "fingerprint": fingerprint(store),
+                "dictionaries": {name: enc.values for name, enc in encoders.items()}}
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    metrics.count("columnar_rows", rows)
+    return path
+
+def refresh(store, path:str) -> ServiceLineTable:
+    """The table at `path`, rewritten first if the store's files changed since it was written."""
+    manifest = os.path.join(path, MANIFEST)
+    if os.path.exists(manifest):
+        with open(manifest, "r") as f:
+            current = json.load(f).get("fingerprint") == fingerprint(store)
+        if current:
+            return ServiceLineTable(path)
+    write_table(store, path)
+    return ServiceLineTable(path)
+
+class ServiceLineTable:
+    def __init__(self, path:str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), "r") as f:
+            self.manifest = json.load(f)
+        self.dictionaries = {k: np.asarray(v, dtype=object) for k, v in self.manifest["dictionaries"].items()}
+        self._arrays: Dict[str,np.ndarray] = {}
+        self.rows: np.ndarray|None = None  # None = every row; else positions into the full table
+
+    def __len__(self) -> int:
+        return self.manifest["rows"] if self.rows is None else len(self.rows)
+
+    def _array(self, name:str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def column(self, name:str) -> np.ndarray:
+        """Amounts, dos or string codes for this table's rows (a memmap view when unsliced)."""
+        values = self._array(name)
+        return values if self.rows is None else values[self.rows]
+
+    def strings(self, name:str) -> np.ndarray:
+        return self.dictionaries[name][self.column(name)]
+
+    def where(self, mask:np.ndarray) -> ServiceLineTable:
+        """The rows of this table selected by a boolean mask (or positions) over it."""
+        mask = np.asarray(mask)
+        picked = np.flatnonzero(mask) if mask.dtype == bool else mask
+        view = copy.copy(self)  # shares the manifest, dictionaries and open arrays
+        view.rows = picked if self.rows is None else self.rows[picked]
+        return view
+
+    def adjustments(self):
+        """(row, code, amount) per adjustment of this table's rows; row indexes this table."""
+        indptr = self._array("adj_indptr")
+        if self.rows is None:
+            counts = np.diff(indptr)
+            return (np.repeat(np.arange(len(counts)), counts), self._array("adj_code"),
+                    self._array("adj_amount"))
+        starts, stops = indptr[self.rows], indptr[self.rows + 1]
+        counts = stops - starts
+        row = np.repeat(np.arange(len(self.rows)), counts)
+        at = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return row, self._array("adj_code")[at], self._array("adj_amount")[at]
+
+    def adjustment_frame(self) -> pd.DataFrame:
+        """adjustments() as store.load_adjustments() returns them: row, code, amount."""
+        row, code, amount = self.adjustments()
+        return pd.DataFrame({"row": row, "code": self.dictionaries["adjustment"][np.asarray(code)],
+                             "amount": np.asarray(amount)})
+
+    # ---- AGGREGATION ----
+    def totals(self, dim:str) -> pd.DataFrame:
+        """RemittanceStore.totals(dim) over these rows: key + MEASURES, dated lines only, in dollars."""
+        if dim not in DIMENSIONS:
+            raise ValueError(f"unknown dimension {dim!r}")
+        dated = ~np.isnat(self.column("dos"))
+        billed = np.rint(self.column("billed") * 100)
+        paid = np.rint(self.column("prov_pd") * 100)
+        denied = (self.column("prov_pd") == 0).astype(np.float64)
+        row, code, amount = self.adjustments()
+        amount = np.rint(np.asarray(amount) * 100)
+        if dim == "carc":
+            keep = dated[row]
+            row, code, amount = row[keep], np.asarray(code)[keep], amount[keep]
+            keys, group = self.dictionaries["adjustment"], code
+        else:
+            line_amount = np.bincount(row, weights=amount, minlength=len(self))
+            row = np.flatnonzero(dated)
+            amount = line_amount[row]
+            if dim == "total":
+                keys, group = np.array([""], dtype=object), np.zeros(len(row), dtype=np.int64)
+            elif dim == "month":
+                months = self.column("dos")[row].astype("datetime64[M]")
+                keys, group = np.unique(months, return_inverse=True)
+                keys = np.array([str(m) for m in keys], dtype=object)
+            else:
+                name = "insurance" if dim == "payer" else dim
+                keys, group = self.dictionaries[name], self.column(name)[row]
+        n = len(keys)
+        sums = {
+            "lines": np.bincount(group, minlength=n),
+            "billed": np.bincount(group, weights=billed[row], minlength=n),
+            "paid": np.bincount(group, weights=paid[row], minlength=n),
+            "denied": np.bincount(group, weights=denied[row], minlength=n),
+            "denied_billed": np.bincount(group, weights=(billed * denied)[row], minlength=n),
+            "amount": np.bincount(group, weights=amount, minlength=n),
+        }
+        df = pd.DataFrame({"key": keys, **sums})
+        df = df[df["lines"] > 0].sort_values("key").reset_index(drop=True)
+        for m in ("lines", "denied"):
+            df[m] = df[m].astype(np.int64)
+        for m in ("billed", "paid", "denied_billed", "amount"):
+            df[m] = df[m] / 100
+        return df[["key", *MEASURES]]
+
+    # ---- FRAMES ----
+    def frame(self) -> pd.DataFrame:
+        """
+        These rows in store.load()'s shape (LOAD_COLUMNS, categoricals); the
+        first adjustment fills GRP/RC-AMT / RC-AMT VALUE. Keep it to a slice
+        (e.g. where(prov_pd == 0) for the worklist) on a large history.
+        """
+        n = len(self)
+        row, code, amount = self.adjustments()
+        first = np.r_[True, row[1:] != row[:-1]] if len(row) else np.zeros(0, dtype=bool)
+        grp = np.full(n, "", dtype=object)
+        grp_amt = np.zeros(n)
+        grp[row[first]] = self.dictionaries["adjustment"][np.asarray(code)[first]]
+        grp_amt[row[first]] = np.asarray(amount)[first]
+        cat = lambda name: pd.Categorical.from_codes(
+            np.asarray(self.column(name)), categories=pd.Index(self.dictionaries[name], dtype=object))
+        df = pd.DataFrame({
+            "insurance": cat("insurance"), "file": cat("file"), "patient": cat("patient"),
+            "claim": self.strings("claim"), "pos": cat("pos"),
+            "serv_date": pd.to_datetime(np.asarray(self.column("dos"))),
+            "proc": cat("proc"),
+            **{name: np.asarray(self.column(name)) for name in AMOUNTS[:-1]},
+            "grp": pd.Categorical(grp), "grp_amt": grp_amt, "prov_pd": np.asarray(self.column("prov_pd")),
+        })
+        for name in CATEGORICAL:
+            df[name] = df[name].cat.remove_unused_categories()
+        df.columns = LOAD_COLUMNS
+        return df
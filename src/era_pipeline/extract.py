@@ -0,0 +1,173 @@
+"""
+ERA extraction: 835 / PDF → parsed service-line records.
+X12 835 files are read natively (parse_era); rendered PDFs are the fallback
+for remits with no electronic copy. Zip bundles in the ERA folder are read
+in place: each member is listed as "<bundle>.zip/<member>" and parsed from
+memory, never extracted to disk. Workers return records (not raw text) so a
+process pool can fan files out and the caller merges results back in file
+order; in a pool each worker also returns its metrics (src/metrics.py),
+which the parent merges. Given the file's hash and a PageTextCache, a PDF's
+page texts are read from (or saved to) the text cache, so re-parsing a PDF
+seen before never opens it.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Iterable, Iterator, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import os, zipfile
+
+import fitz  # PyMuPDF
+
+from src import metrics
+from src.era_pipeline.layouts import detect_payer, parser_for
+from src.era_pipeline.parse_era import is_835, parse_835
+from src.era_pipeline.textcache import PageTextCache
+
+# Bump when parsing output changes so cached extractions are re-parsed.
+PARSER_VERSION = "5"
+
+def _header(pages:Iterator[str]) -> List[str]:
+    # Leading pages up to the first non-blank line (the payer name).
+    head = []
+    for text in pages:
+        head.append(text)
+        if text.strip():
+            break
+    return head
+
+def _page_texts(doc) -> Iterator[str]:
+    for page in doc:
+        with metrics.stage("pdf.get_text"):
+            text = page.get_text()
+        metrics.count("pages")
+        metrics.count("text_chars", len(text))
+        yield text
+
+def pdf_pages(filepath:str, data:bytes|None=None, sha:str|None=None,
+              texts:PageTextCache|None=None) -> List[str]:
+    """Page texts of a PDF: from the text cache when `sha` is cached, else extracted (and cached)."""
+    cached = texts.get(sha) if texts is not None and sha else None
+    if cached is not None:
+        return cached
+    with metrics.stage("pdf.open"):
+        doc = fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(filepath)
+    with doc:
+        pages = list(_page_texts(doc))
+    if texts is not None and sha:
+        texts.put(sha, pages)
+    return pages
+
+def parse_pages(pages:Iterable[str], filename:str) -> List[Dict[str,Any]]:
+    pages = iter(pages)
+    head = _header(pages)
+    payer = detect_payer("".join(head))
+    parse = parser_for(payer)
+    return [{"INSURANCE": payer, "File": filename, **line}
+            for line in parse(chain(head, pages))]
+
+def parse_pdf(filepath:str, data:bytes|None=None, filename:str|None=None,
+              sha:str|None=None, texts:PageTextCache|None=None) -> List[Dict[str,Any]]:
+    # `data` parses an in-memory copy (e.g. a zip member) instead of reading filepath.
+    # pdf.parse is the layout regex work only; text extraction is pdf.get_text.
+    filename = filename or os.path.basename(filepath)
+    pages = pdf_pages(filepath, data, sha, texts)
+    with metrics.stage("pdf.parse"):
+        return parse_pages(pages, filename)
+
+def split_member(name:str) -> Tuple[str,str]|None:
+    # "<bundle>.zip/<member>" -> (bundle, member); None for a plain file.
+    archive, sep, member = name.partition(".zip/")
+    return (archive + ".zip", member) if sep else None
+
+def read_member(folder:str, name:str) -> bytes:
+    archive, member = split_member(name)
+    with zipfile.ZipFile(os.path.join(folder, archive)) as z:
+        return z.read(member)
+
+def member_size(folder:str, name:str) -> int:
+    # uncompressed size from the zip directory, without reading the member
+    archive, member = split_member(name)
+    with zipfile.ZipFile(os.path.join(folder, archive)) as z:
+        return z.getinfo(member).file_size
+
+def parse_file(folder:str, name:str, sha:str|None=None,
+               texts:PageTextCache|None=None) -> List[Dict[str,Any]]:
+    member = split_member(name)
+    pdf = not is_835(name)
+    path = name if member else os.path.join(folder, name)
+    data = None
+    # a zip member is only read when its page text is not cached
+    if member and not (pdf and texts is not None and sha in texts):
+        with metrics.stage("zip.read"):
+            data = read_member(folder, name)
+    if pdf:
+        records = parse_pdf(path, data, name if member else None, sha, texts)
+    else:
+        records = parse_835(path, data, filename=name if member else None)
+    if member:
+        size = len(data) if data is not None else member_size(folder, name)
+    else:
+        size = os.path.getsize(path)
+    metrics.count("files")
+    metrics.count("bytes", size)
+    metrics.count("lines", len(records))
+    return records
+
+def _parse_entry(entry:Tuple) -> List[Dict[str,Any]]:
+    return parse_file(*entry)
+
+def _parse_entry_metered(entry:Tuple) -> Tuple[List[Dict[str,Any]],Dict[str,Any]]:
+    return parse_file(*entry), metrics.drain()
+
+def _stem(name:str) -> str:
+    return os.path.splitext(name)[0].lower()
+
+def _is_era(name:str) -> bool:
+    return is_835(name) or name.lower().endswith(".pdf")
+
+def era_files(folder:str) -> List[str]:
+    """
+    ERA files in `folder`, sorted: every 835 plus the PDFs that have no 835
+    with the same stem (the PDF is then just a rendering of the same remit).
+    Members of *.zip bundles are listed as "<bundle>.zip/<member>".
+    """
+    names = []
+    for f in os.listdir(folder):
+        if f.lower().endswith(".zip"):
+            with zipfile.ZipFile(os.path.join(folder, f)) as z:
+                names.extend(f"{f}/{m.filename}" for m in z.infolist()
+                             if not m.is_dir() and _is_era(m.filename))
+        elif _is_era(f):
+            names.append(f)
+    electronic = {_stem(f) for f in names if is_835(f)}
+    return sorted(f for f in names if is_835(f) or _stem(f) not in electronic)
+
+def extract_files(folder:str, filenames:Iterable[str], workers:int=1, hashes:Dict[str,str]|None=None,
+                  texts:PageTextCache|None=None) -> List[List[Dict[str,Any]]]:
+    """
+    Parse each ERA file in `filenames`; returns one record list per file, in the
+    order given. workers > 1 uses a process pool. With `hashes` ({filename:
+    sha256}) and `texts`, PDF page text goes through the text cache.
+    """
+    hashes = hashes or {}
+    entries = [(folder, f, hashes.get(f), texts) for f in filenames]
+    if workers <= 1 or len(entries) <= 1:
+        return list(map(_parse_entry, entries))
+    # executor.map yields in submission order, so the merge matches a serial run
+    chunksize = max(1, len(entries) // (workers * 4))
+    per_file = []
+    # a forked worker starts with a copy of the parent's registry; reset it so
+    # drain() returns only the worker's own stages
+    with ProcessPoolExecutor(max_workers=workers, initializer=metrics.reset) as pool:
+        for records, part in pool.map(_parse_entry_metered, entries, chunksize=chunksize):
+            metrics.merge(part)
+            per_file.append(records)
+    return per_file
+
+def extract_records(folder:str, filenames:Iterable[str], workers:int=1) -> List[Dict[str,Any]]:
+    per_file = extract_files(folder, filenames, workers)
+    return [r for records in per_file for r in records]
+
+def default_workers() -> int:
+    # --workers 0: one process per CPU core
+    return os.cpu_count() or 1
@@ -0,0 +1,90 @@
+"""
+DataFrame transforms shared by the ERA export scripts.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.era_pipeline.aggregates import DENIAL_CODE_RE
+
+WORKLIST_FIELDS = ["id", "reason", "claim", "amount", "days"]
+
+def utc_today() -> date:
+    # the worklist's clock for "days"
+    return datetime.now(timezone.utc).date()
+
+def expand_denial_columns(df:pd.DataFrame, adjustments:pd.DataFrame|None=None) -> pd.DataFrame:
+    """
+    Spread a line's adjustments into one column per adjustment code
+    (first-seen order, 0.0 elsewhere) and drop "GRP/RC-AMT" / "RC-AMT VALUE".
+    `adjustments` is store.load_adjustments() for the same rows (row, code,
+    amount), so every adjustment of a line lands in its row; without it the
+    pair is spread. Same wide layout as the old per-row df.at loop, built
+    with one scatter into a dense block. Lines with no adjustment get no
+    column.
+    """
+    if adjustments is None:
+        column = np.asarray(df["GRP/RC-AMT"], dtype=object)  # plain values, also for a categorical
+        rows = np.flatnonzero(column != "")
+        column, amounts = column[rows], df["RC-AMT VALUE"].to_numpy(dtype=float)[rows]
+    else:
+        rows = adjustments["row"].to_numpy()
+        column, amounts = adjustments["code"].to_numpy(dtype=object), adjustments["amount"].to_numpy(dtype=float)
+    codes = pd.unique(column)
+    positions = pd.Categorical(column, categories=codes).codes
+    values = np.zeros((len(df), len(codes)))
+    np.add.at(values, (rows, positions), amounts)
+    wide = pd.DataFrame(values, columns=codes, index=df.index)
+    base = df.drop(columns=["GRP/RC-AMT", "RC-AMT VALUE"])
+    return pd.concat([base, wide], axis=1)
+
+def _denial_reasons(df:pd.DataFrame, adjustments:pd.DataFrame|None) -> np.ndarray:
+    # per frame row: the largest nonzero denial-code adjustment, else "Unspecified denial"
+    reason = np.full(len(df), "Unspecified denial", dtype=object)
+    if adjustments is None:
+        adjustments = pd.DataFrame({"row": np.arange(len(df)), "code": df["GRP/RC-AMT"].astype(str).to_numpy(),
+                                    "amount": df["RC-AMT VALUE"].to_numpy(dtype=float)})
+    denial = adjustments["code"].str.match(DENIAL_CODE_RE) & (adjustments["amount"] != 0)
+    largest = adjustments[denial].sort_values("amount", ascending=False, kind="stable").drop_duplicates("row")
+    reason[largest["row"].to_numpy()] = largest["code"].to_numpy()
+    return reason
+
+def worklist_frame(df:pd.DataFrame, today:date|None=None, visits:List[str|None]|None=None,
+                   adjustments:pd.DataFrame|None=None) -> pd.DataFrame:
+    """
+    Worklist for the zero-paid, dated service lines of a store.load() frame,
+    in frame order: the worklist.json fields (WORKLIST_FIELDS) plus the
+    line's payer, which the sharded export groups by. `visits` (one per
+    frame row, reconcile.line_visits) adds the linked visit id as "visit".
+    reason is the line's largest nonzero [A-Z]{2}-NN(N) denial-code
+    adjustment in `adjustments` (store.load_adjustments() for the same rows;
+    without it only GRP/RC-AMT is looked at), else "Unspecified denial". id is
+    "<payer>-<claim id>" (ICN / patient account, file stem when the remit
+    has none); a claim's 2nd, 3rd... denied line gets "-2", "-3"...
+    """
+    today = today or utc_today()
+    keep = (df["PROV PD"] == 0) & df["SERV DATE"].notna()
+    reason = _denial_reasons(df, adjustments)[keep.to_numpy()]
+    df = df[keep]
+    claim = df["CLAIM ID"].astype(str)
+    stem = df["File"].astype(str).str.split(".").str[0]
+    base = df["INSURANCE"].astype(str) + "-" + claim.where(claim != "", stem)
+    nth = base.groupby(base).cumcount()
+    out = pd.DataFrame({
+        "id": base.where(nth == 0, base + "-" + (nth + 1).astype(str)),
+        "reason": reason,
+        "claim": df["File"].astype(str),
+        "amount": df["BILLED"].astype(float),
+        "days": (pd.Timestamp(today) - df["SERV DATE"]).dt.days.astype(int),
+        "payer": df["INSURANCE"].astype(str),
+    })
+    if visits is not None:
+        out["visit"] = pd.Series(visits, dtype=object)[keep.to_numpy()].to_numpy()
+    return out
+
+def build_worklist(df:pd.DataFrame, today:date|None=None) -> List[Dict[str,Any]]:
+    """worklist.json rows ({id, reason, claim, amount, days}); see worklist_frame."""
+    return worklist_frame(df, today)[WORKLIST_FIELDS].to_dict(orient="records")
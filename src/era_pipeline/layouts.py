@@ -0,0 +1,250 @@
+"""
+Payer detection and per-layout ERA text extractors.
+
+Payer is detected once from the ERA's first line (the payer name printed
+above the "[]" placeholder) with one compiled alternation; the payer then
+picks its extractor from PARSERS. Every payer in ERA COPIES 2025 arrives as
+the same clearinghouse "standard paper remittance" (SPR) print, so they all
+map to parse_spr; register() lets a payer with its own layout plug in.
+Unrecognized payers fall back to parse_generic (the original regex).
+
+Extractors take page texts and yield service-line dicts without the
+INSURANCE/File keys (added by extract.parse_pdf). Every adjustment of a line
+is in ADJUSTMENTS as [GRP-RC, amount] pairs in print order, and its RARC
+remark codes in REMARKS; GRP/RC-AMT / RC-AMT VALUE keep the first (the one
+printed on the service line itself).
+"""
+from __future__ import annotations
+from typing import Callable, Dict, Any, List, Iterable, Iterator, Tuple
+import re
+
+# (header keyword, payer). At the same position earlier entries win, so
+# specific names precede the generic ones they contain ("UNITED OF OMAHA"
+# before "UNITED", "BLUE CROSS COMPLETE" before "BLUE CROSS").
+PAYERS: List[Tuple[str,str]] = [
+    ("AARP", "AARP"),
+    ("TRICARE", "Tricare"),
+    ("PGBA", "Tricare"),
+    ("HUMANA", "Humana"),
+    ("BLUE CARE NETWORK", "BCN"),
+    ("BLUE CROSS COMPLETE", "Blue Cross Complete"),
+    ("BCBSM", "BCBS"),
+    ("BLUE CROSS", "BCBS"),
+    ("BLUECROSS", "BCBS"),
+    ("HIGHMARK", "Highmark"),
+    ("MUTUAL OF OMAHA", "Mutual of Omaha"),
+    ("UNITED OF OMAHA", "Mutual of Omaha"),
+    ("UNITED WORLD LIFE", "Mutual of Omaha"),
+    ("OMAHA", "Mutual of Omaha"),
+    ("GOLDEN RULE", "Golden Rule"),
+    ("UNITEDHEALTHCARE", "UHC"),
+    ("UNITED HEALTHCARE", "UHC"),
+    ("UHC", "UHC"),
+    ("UNITED", "UHC"),
+    ("WPS", "WPS"),
+    ("PRIORITY HEALTH", "Priority Health"),
+    ("AETNA", "Aetna"),
+    ("ASR HEALTH", "ASR"),
+    ("UMR", "UMR"),
+    ("MERIDIAN", "Meridian"),
+    ("MOLINA", "Molina"),
+    ("CIGNA", "Cigna"),
+    ("MICHIGAN DEPARTMENT OF HEALTH", "MDHHS"),
+    ("AMBETTER", "Ambetter"),
+    ("INSIGHT BENEFIT", "Insight"),
+    ("GROUP MARKETING", "Group Marketing"),
+    ("HEALTHCARE MANAGEMENT ADMIN", "HMA"),
+    ("HEALTHSMART", "HealthSmart"),
+    ("OSCAR", "Oscar"),
+    ("ALLIED BENEFIT", "Allied"),
+    ("SELF INSURED SERVICES", "SISCO"),
+    ("AUXIANT", "Auxiant"),
+    ("MERITAIN", "Meritain"),
+    ("MID AMERICA", "Mid-America"),
+    ("MID-AMERICA", "Mid-America"),
+]
+_PAYER_BY_KEYWORD = dict(PAYERS)
+_PAYER_RE = re.compile("|".join(re.escape(keyword) for keyword, _ in PAYERS))
+
+def detect_payer(text:str) -> str:
+    # Payer name is the first non-blank line of the print.
+    first = next((line for line in text.splitlines() if line.strip()), "")
+    m = _PAYER_RE.search(first.upper())
+    return _PAYER_BY_KEYWORD[m.group(0)] if m else "Unknown"
+
+# ---- GENERIC LAYOUT (original regex) ----
+# A service line belongs to the nearest preceding "NAME <patient>"; each NAME
+# yields at most its first service line. Matching the two halves separately
+# (instead of one DOTALL "NAME ... .*? ... line" pattern over the whole
+# document) keeps the scan linear and lets the parser work page by page.
+NAME_RE = re.compile(r"NAME\s+(?P<patient>[A-Z ,]+)")
+LINE_RE = re.compile(
+    r"(\d{7,10})\s(?P<pos>\d{4})\s(?P<date>\d{6})\s+1\s(?P<proc>[A-Z0-9]+(?:\s[A-Z0-9]+)?)\s+"
+    r"(?P<billed>\d+\.\d{2})\s+(?P<allowed>\d+\.\d{2})\s+(?P<deduct>\d+\.\d{2})\s+"
+    r"(?P<coins>\d+\.\d{2})\s+(?P<group>[A-Z0-9\-]+)\s+(?P<grp_amt>\-?\d+\.\d{2})\s+"
+    r"(?P<prov_pd>\-?\d+\.\d{2})"
+)
+
+# Text kept past a chunk boundary so a NAME or service line split across
+# pages is still matched whole; also the distance a match must end before
+# the buffer edge to be accepted ahead of more text arriving.
+WINDOW = 4096
+
+def iter_service_lines(chunks:Iterable[str]) -> Iterator[Tuple[str, re.Match]]:
+    """
+    Yield (patient, service-line match) from a stream of text chunks (pages),
+    carrying the current patient across chunk boundaries. Memory is bounded
+    by one chunk plus WINDOW characters.
+    """
+    buf, pos, patient = "", 0, None
+    chunks = iter(chunks)
+    final = False
+    while not final:
+        chunk = next(chunks, None)
+        final = chunk is None
+        buf += chunk or ""
+        # Matches ending inside the last WINDOW chars wait for the next chunk.
+        limit = len(buf) if final else len(buf) - WINDOW
+        while True:
+            if patient is None:
+                m = NAME_RE.search(buf, pos)
+                if not m or m.end() > limit:
+                    break
+                patient, pos = m.group("patient").strip(), m.end()
+            m = LINE_RE.search(buf, pos)
+            if not m or m.end() > limit:
+                break
+            yield patient, m
+            patient, pos = None, m.end()
+        # Drop consumed text; keep a deferred match whole, else a WINDOW tail.
+        keep = m.start() if m else max(pos, len(buf) - WINDOW)
+        buf, pos = buf[keep:], 0
+
+def parse_generic(pages:Iterable[str]) -> Iterator[Dict[str,Any]]:
+    for patient, m in iter_service_lines(pages):
+        yield {
+            "PATIENT NAME": patient,
+            "CLAIM ID": "",
+            "SERV DATE": f"{m.group('pos')} {m.group('date')}",
+            "PROC": m.group("proc").strip(),
+            "BILLED": float(m.group("billed")),
+            "ALLOWED": float(m.group("allowed")),
+            "DEDUCT": float(m.group("deduct")),
+            "COINS": float(m.group("coins")),
+            "GRP/RC-AMT": m.group("group").strip(),
+            "RC-AMT VALUE": float(m.group("grp_amt")),
+            "PROV PD": float(m.group("prov_pd")),
+            "ADJUSTMENTS": [[m.group("group").strip(), float(m.group("grp_amt"))]],
+            "REMARKS": [],
+        }
+
+# ---- SPR LAYOUT ----
+# REND PROV  SERV DATE   POS NOS   PROC   MODS      BILLED    ALLOWED  DEDUCT    COINS   GRP/RC-AMT          PROV PD
+# NAME DOANE, DEBBIE          HIC 94805320400  ACNT 6511LMD642  ...
+# 1306898036 0519 051925       1 99214               219.00   152.63     0.00     0.00   CO-45      66.37     152.63
+# 1013940584 0213 021325 11    1 99396 25            327.00   165.75     0.00     0.00   CO-144     12.44     153.31
+#            0220 022025 11    1 36415                20.00     4.30     0.00     0.00   CO-45      15.70       4.30
+# 272620668  0509 050925         99406 33             27.06    15.69     0.00     0.00   CO-45      11.37      15.69
+#                                       REM: M80 N1                                      PR-3       30.00
+#                                                                                        CO-253      1.93
+# Further adjustments and the remark codes of a line follow it on
+# continuation lines under the GRP/RC-AMT column.
+_AMT = r"-?[\d,]*\d\.\d{2}"
+SPR_NAME_RE = re.compile(r"NAME (?P<patient>.+?) +HIC ")
+# Payer claim number, else the provider's patient account; a blank field is
+# followed straight by the next label.
+SPR_ICN_RE = re.compile(r" ICN +(?!ASG )(?P<id>\S+)")
+SPR_ACNT_RE = re.compile(r" ACNT +(?!ICN )(?P<id>\S+)")
+SPR_LINE_RE = re.compile(
+    r"(?P<prov>[\d ]{10}) (?P<from>\d{4}) (?P<date>\d{6}) (?P<units>[ \d.\-]*?) ?"
+    r"(?P<proc>[A-Z0-9]{5}(?:\d{6})?)(?P<mods>(?: [A-Z0-9]{2})*)\s+"
+    rf"(?P<billed>{_AMT})\s+(?P<allowed>{_AMT})\s+(?P<deduct>{_AMT})\s+(?P<coins>{_AMT})\s+"
+    rf"(?P<adjustments>(?:[A-Z]{{2}}-[A-Z0-9]+\s+{_AMT}\s+)*)(?P<prov_pd>{_AMT})\s*$"
+)
+SPR_ADJ_RE = re.compile(rf"(?P<group>[A-Z]{{2}}-[A-Z0-9]+)\s+(?P<amt>{_AMT})")
+# "(M1)" is a printed modifier flag; REM codes are RARCs (N448, MA130, M51).
+SPR_MORE_RE = re.compile(
+    r" {10,}(?:\([A-Z0-9]+\) +)?(?:REM:(?P<remarks>(?: [A-Z]{1,2}\d{1,4}[A-Z]?)+) *)?"
+    rf"(?:(?P<group>[A-Z]{{2}}-[A-Z0-9]+) +(?P<amt>{_AMT}))? *$"
+)
+
+def _amount(text:str|None) -> float:
+    return float(text.replace(",", "")) if text else 0.0
+
+def _iter_lines(pages:Iterable[str]) -> Iterator[str]:
+    # A page that doesn't end in a newline continues its last line on the next.
+    tail = ""
+    for text in pages:
+        lines = (tail + text).split("\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+def parse_spr(pages:Iterable[str]) -> Iterator[Dict[str,Any]]:
+    """
+    One record per service line under the current NAME, with the
+    adjustments and remarks of the continuation lines below it (a record is
+    yielded once the next non-continuation line arrives). Lines with nothing
+    billed and no adjustment (CPT II quality codes) are skipped; a
+    paid-in-full line has an empty GRP/RC-AMT.
+    """
+    patient = claim = record = None
+    for line in _iter_lines(pages):
+        if record is not None:
+            m = SPR_MORE_RE.match(line)
+            if m and (m.group("group") or m.group("remarks")):
+                if m.group("group"):
+                    record["ADJUSTMENTS"].append([m.group("group"), _amount(m.group("amt"))])
+                if m.group("remarks"):
+                    record["REMARKS"].extend(m.group("remarks").split())
+                continue
+            if line.strip():
+                if record["BILLED"] or record["ADJUSTMENTS"]:
+                    yield _first_adjustment(record)
+                record = None
+        if line.startswith("NAME "):
+            m = SPR_NAME_RE.match(line)
+            patient = m.group("patient").strip() if m else line[5:].strip()
+            m = SPR_ICN_RE.search(line) or SPR_ACNT_RE.search(line)
+            claim = m.group("id") if m else ""
+            continue
+        if patient is None:
+            continue
+        m = SPR_LINE_RE.match(line)
+        if not m:
+            continue
+        mods = m.group("mods").split()
+        record = {
+            "PATIENT NAME": patient,
+            "CLAIM ID": claim,
+            "SERV DATE": f"{m.group('from')} {m.group('date')}",
+            "PROC": " ".join([m.group("proc")] + mods[:1]),
+            "BILLED": _amount(m.group("billed")),
+            "ALLOWED": _amount(m.group("allowed")),
+            "DEDUCT": _amount(m.group("deduct")),
+            "COINS": _amount(m.group("coins")),
+            "GRP/RC-AMT": "",  # filled from ADJUSTMENTS when the record is complete
+            "RC-AMT VALUE": 0.0,
+            "PROV PD": _amount(m.group("prov_pd")),
+            "ADJUSTMENTS": [[a.group("group"), _amount(a.group("amt"))]
+                            for a in SPR_ADJ_RE.finditer(m.group("adjustments"))],
+            "REMARKS": [],
+        }
+    if record is not None and (record["BILLED"] or record["ADJUSTMENTS"]):
+        yield _first_adjustment(record)
+
+def _first_adjustment(record:Dict[str,Any]) -> Dict[str,Any]:
+    if record["ADJUSTMENTS"]:
+        record["GRP/RC-AMT"], record["RC-AMT VALUE"] = record["ADJUSTMENTS"][0]
+    return record
+
+# ---- PARSER REGISTRY ----
+Parser = Callable[[Iterable[str]], Iterator[Dict[str,Any]]]
+PARSERS: Dict[str,Parser] = {payer: parse_spr for payer in _PAYER_BY_KEYWORD.values()}
+
+def register(payer:str, parser:Parser):
+    PARSERS[payer] = parser
+
+def parser_for(payer:str) -> Parser:
+    return PARSERS.get(payer, parse_generic)
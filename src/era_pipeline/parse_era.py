@@ -1,8 +1,172 @@
-
 """
-Placeholder: parse ERA files and normalize to internal tables.
-Replace with your existing parser and mapping.
+Streaming X12 835 (electronic remittance advice) reader.
+Emits the same normalized service-line records as the PDF extractor, read
+straight from the 835 segments instead of rendered text:
+
+  N1*PR           payer name -> INSURANCE (via layouts.detect_payer)
+  CLP / NM1*QC    claim (CLP07 payer claim number, else CLP01) + patient ("LAST, FIRST")
+  SVC             procedure, billed, paid (PROV PD)
+  DTM*472/150/151 service date (falls back to the claim's DTM*232/233)
+  CAS             adjustments; PR-1 -> DEDUCT, PR-2 -> COINS, first non-PR
+                  (else first) -> GRP/RC-AMT, as the PDF print shows it;
+                  all of them -> ADJUSTMENTS (that one first)
+  AMT*B6          allowed amount
+  LQ*HE           remark codes (RARC) -> REMARKS
 """
-def parse_era_folder(folder:str)->list[dict]:
-    # Return a list of payment events or claim summaries.
-    return []
+from __future__ import annotations
+from typing import Dict, Any, List, Iterable, Iterator, IO
+import io, os
+
+from src import metrics
+from src.era_pipeline.layouts import detect_payer
+
+EXTENSIONS = (".835", ".edi", ".x12", ".era")
+
+def is_835(filename:str) -> bool:
+    return filename.lower().endswith(EXTENSIONS)
+
+def iter_segments(stream:IO[str], chunk_size:int=1 << 16) -> Iterator[List[str]]:
+    """
+    Yield each segment as a list of elements. Delimiters come from the ISA
+    header (element separator at offset 3, segment terminator at 105); the
+    component separator at 104 is ISA16, the ISA segment's last element,
+    which parse_segments reads.
+    """
+    head = stream.read(106)
+    if not head.startswith("ISA") or len(head) < 106:
+        raise ValueError("not an X12 interchange (missing ISA header)")
+    element, terminator = head[3], head[105]
+    buf = head
+    while True:
+        *segments, buf = buf.split(terminator)
+        for seg in segments:
+            seg = seg.strip("\r\n ")
+            if seg:
+                yield seg.split(element)
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+    seg = buf.strip("\r\n ")
+    if seg:
+        yield seg.split(element)
+
+def _el(seg:List[str], i:int) -> str:
+    return seg[i] if len(seg) > i else ""
+
+def _num(text:str) -> float:
+    return float(text) if text else 0.0
+
+def _mmdd_mmddyy(start:str, end:str) -> str:
+    # CCYYMMDD pair -> the PDF print's "MMDD MMDDYY" SERV DATE
+    end = end or start
+    return f"{start[4:8]} {end[4:8]}{end[2:4]}"
+
+def parse_segments(segments:Iterable[List[str]], filename:str) -> Iterator[Dict[str,Any]]:
+    payer = "Unknown"
+    patient = claim = ""
+    claim_dates = ["", ""]
+    line = None
+    component = ":"
+
+    def emit(line):
+        start, end = line["dates"] if line["dates"][0] else claim_dates
+        adjustments = line["adjustments"]
+        deduct = sum((amt for grp, rc, amt in adjustments if grp == "PR" and rc == "1"), 0.0)
+        coins = sum((amt for grp, rc, amt in adjustments if grp == "PR" and rc == "2"), 0.0)
+        contractual = [adj for adj in adjustments if adj[0] != "PR"]
+        first = (contractual or adjustments or [None])[0]
+        allowed = line["allowed"]
+        if allowed is None:
+            allowed = line["billed"] - sum((amt for _, _, amt in contractual), 0.0)
+        return {
+            "INSURANCE": payer,
+            "File": filename,
+            "PATIENT NAME": patient,
+            "CLAIM ID": claim,
+            "SERV DATE": _mmdd_mmddyy(start, end) if start else "",
+            "PROC": line["proc"],
+            "BILLED": line["billed"],
+            "ALLOWED": round(allowed, 2),
+            "DEDUCT": round(deduct, 2),
+            "COINS": round(coins, 2),
+            "GRP/RC-AMT": f"{first[0]}-{first[1]}" if first else "",
+            "RC-AMT VALUE": first[2] if first else 0.0,
+            "PROV PD": line["paid"],
+            "ADJUSTMENTS": [[f"{grp}-{rc}", amt] for grp, rc, amt in
+                            ([first] if first else []) + [adj for adj in adjustments if adj is not first]],
+            "REMARKS": line["remarks"],
+        }
+
+    def keep(line):
+        # Same rule as layouts.parse_spr: nothing billed and no adjustment is noise.
+        return line["billed"] or line["adjustments"]
+
+    for seg in segments:
+        tag = seg[0]
+        if tag in ("CLP", "SE", "LX") and line:
+            if keep(line):
+                yield emit(line)
+            line = None
+        if tag == "ISA":
+            component = _el(seg, 16)[:1] or component
+        elif tag == "N1" and _el(seg, 1) == "PR":
+            payer = detect_payer(_el(seg, 2))
+        elif tag == "CLP":
+            patient, claim_dates = "", ["", ""]
+            claim = _el(seg, 7) or _el(seg, 1)
+        elif tag == "NM1" and _el(seg, 1) == "QC":
+            last, first = _el(seg, 3), _el(seg, 4)
+            patient = f"{last}, {first}" if first else last
+        elif tag == "DTM" and _el(seg, 1) in ("232", "233") and line is None:
+            # claim statement period; only before the first SVC of the claim
+            claim_dates[0 if seg[1] == "232" else 1] = _el(seg, 2)
+        elif tag == "SVC":
+            if line and keep(line):
+                yield emit(line)
+            # SVC01 = "HC:99214:25:..." split on ISA16 (':', '>', '^'...)
+            composite = _el(seg, 1).split(component)
+            code = _el(composite, 1)
+            mods = [m for m in composite[2:6] if m]
+            line = {
+                "proc": " ".join([code] + mods[:1]),
+                "billed": _num(_el(seg, 2)),
+                "paid": _num(_el(seg, 3)),
+                "dates": ["", ""],
+                "adjustments": [],
+                "remarks": [],
+                "allowed": None,
+            }
+        elif line is not None:
+            if tag == "DTM" and _el(seg, 1) in ("472", "150"):
+                line["dates"][0] = _el(seg, 2)
+            elif tag == "DTM" and _el(seg, 1) == "151":
+                line["dates"][1] = _el(seg, 2)
+            elif tag == "CAS":
+                group = _el(seg, 1)
+                for i in range(2, len(seg), 3):
+                    if seg[i]:
+                        line["adjustments"].append((group, seg[i], _num(_el(seg, i + 1))))
+            elif tag == "AMT" and _el(seg, 1) == "B6":
+                line["allowed"] = _num(_el(seg, 2))
+            elif tag == "LQ" and _el(seg, 1) == "HE" and _el(seg, 2):
+                line["remarks"].append(_el(seg, 2))
+    if line and keep(line):
+        yield emit(line)
+
+@metrics.stage("x12.parse")
+def parse_835(filepath:str, data:bytes|None=None, filename:str|None=None) -> List[Dict[str,Any]]:
+    # `data` parses an in-memory copy (e.g. a zip member) instead of reading filepath.
+    filename = filename or os.path.basename(filepath)
+    if data is not None:
+        return list(parse_segments(iter_segments(io.StringIO(data.decode("ascii", "replace"))), filename))
+    with open(filepath, "r", encoding="ascii", errors="replace", newline="") as f:
+        return list(parse_segments(iter_segments(f), filename))
+
+def parse_era_folder(folder:str) -> list[dict]:
+    # Service-line records for every 835 file in the folder, in filename order.
+    records = []
+    for filename in sorted(os.listdir(folder)):
+        if is_835(filename):
+            records.extend(parse_835(os.path.join(folder, filename)))
+    return records
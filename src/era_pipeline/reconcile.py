@@ -0,0 +1,194 @@
+"""
+Reconciliation index: scrubber suggestions, submitted claims and ERA service
+lines joined on (patient, DOS, CPT).
+
+Both sides live in remittance.db under B-tree indexes on the same key:
+
+  service_lines (patient_key, dos, cpt)    kept by RemittanceStore.sync, so
+                                           new ERAs are linked as they arrive
+  encounter_codes (patient_key, dos, cpt)  one row per visit x CPT, written by
+                                           record() (run_all, after scoring)
+
+A lookup is an index seek on either side; no table is scanned or merged in
+pandas. encounter_codes is not an ERA table, so a store schema bump (which
+refills the ERA tables from the cache) leaves it alone.
+
+patient_key normalizes "LAST, FIRST M" (as printed on the remit) to
+"LAST,FIRST"; "FIRST [M] LAST" is turned around the same way. A visit is
+keyed by its patient_name when it has one, else by patient_id, which only
+matches a remit once a name is available.
+
+    python -m src.era_pipeline.reconcile --db remittance.db lookup "DOE, JANE" 2025-08-26 99214
+    python -m src.era_pipeline.reconcile --db remittance.db denials     # recommended CPT x CARC
+"""
+from __future__ import annotations
+from typing import Dict, Any, List
+import argparse, json, re, sqlite3
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS encounter_codes (
+    visit TEXT NOT NULL,
+    cpt TEXT NOT NULL,
+    patient_key TEXT NOT NULL,
+    dos TEXT NOT NULL,       -- ISO service date
+    patient_id TEXT,
+    modifiers TEXT,          -- space-separated
+    suggested INTEGER NOT NULL,  -- 1 = scrubber recommendation, 0 = only on the claim
+    claim TEXT,              -- submitted claim stub id, NULL before a claim is built
+    payer TEXT,
+    risk REAL,
+    PRIMARY KEY (visit, cpt)
+);
+CREATE INDEX IF NOT EXISTS ix_encounter_key ON encounter_codes (patient_key, dos, cpt);
+"""
+
+# encounter_codes row -> its ERA lines (index seek on ix_lines_recon)
+MATCH = "s.patient_key = e.patient_key AND s.dos = e.dos AND s.cpt = e.cpt"
+
+_NON_NAME = re.compile(r"[^A-Z0-9, ]")
+
+def patient_key(name) -> str:
+    text = _NON_NAME.sub("", str(name or "").upper())
+    last, comma, given = text.partition(",")
+    if not comma:
+        words = text.split()
+        if len(words) < 2:
+            return text.strip()
+        last, given = words[-1], " ".join(words[:-1])
+    first = given.split()
+    return f"{' '.join(last.split())},{first[0] if first else ''}"
+
+def has_index(conn:sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'encounter_codes'").fetchone() is not None
+
+def recommended_outcomes(conn:sqlite3.Connection) -> Dict[str,List[int]]:
+    """{cpt: [ERA lines, denied]} over the ERA lines matched to scrubber-recommended codes."""
+    if not has_index(conn):
+        return {}
+    rows = conn.execute(
+        "SELECT e.cpt, COUNT(*), TOTAL(s.prov_pd = 0) FROM encounter_codes e"
+        f" JOIN service_lines s ON {MATCH} WHERE e.suggested = 1 GROUP BY e.cpt")
+    return {cpt: [int(n), int(d)] for cpt, n, d in rows}
+
+class ReconciliationIndex:
+    """Encounter side of the index over a RemittanceStore's connection."""
+    def __init__(self, store):
+        self.conn = store.conn
+        if not has_index(self.conn):
+            self.conn.executescript(SCHEMA)
+
+    def record(self, suggestions:List[Dict[str,Any]], claims:List[Dict[str,Any]]|None=None,
+               scores:List[Dict[str,Any]]|None=None) -> int:
+        """
+        Upsert visits: `suggestions` as run_all writes them (id, patient_id,
+        optional patient_name, dos, recommended_cpts), the claim stubs built
+        from them (`visit_id`, else the claim id, names the visit) and their
+        batch_score rows. A recorded visit's codes are replaced, other visits
+        are untouched. Returns the number of code rows written.
+        """
+        by_visit = {c.get("visit_id", c.get("id")): c for c in claims or []}
+        risk = {s["claim_stub_id"]: s["risk"] for s in scores or []}
+        rows = []
+        for s in suggestions:
+            visit, dos = s.get("id"), s.get("dos")
+            if not visit or not dos:
+                continue
+            key = patient_key(s.get("patient_name") or s.get("patient_id"))
+            claim = by_visit.get(visit)
+            codes = {c["code"]: (c.get("modifiers") or [], 1) for c in s.get("recommended_cpts", [])}
+            for c in (claim or {}).get("cpts", []):
+                codes.setdefault(c["code"], (c.get("modifiers") or [], 0))
+            for cpt, (mods, suggested) in codes.items():
+                rows.append((visit, cpt, key, dos, s.get("patient_id"), " ".join(mods), suggested,
+                             claim and claim.get("id"), claim and claim.get("payer"),
+                             risk.get(claim.get("id")) if claim else None))
+        with self.conn:
+            self.conn.executemany("DELETE FROM encounter_codes WHERE visit = ?",
+                                  ((s.get("id"),) for s in suggestions))
+            self.conn.executemany("INSERT INTO encounter_codes VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+        return len(rows)
+
+    def lookup(self, patient:str, dos:str, cpt:str) -> Dict[str,List[Dict[str,Any]]]:
+        """The visits' codes and the ERA lines for one (patient, ISO DOS, CPT)."""
+        key = (patient_key(patient), dos, cpt)
+        encounters = self.conn.execute(
+            "SELECT visit, patient_id, modifiers, suggested, claim, payer, risk FROM encounter_codes"
+            " WHERE patient_key = ? AND dos = ? AND cpt = ?", key)
+        names = [d[0] for d in encounters.description]
+        era = self.conn.execute(
+            "SELECT file, line, insurance, claim, proc, billed, allowed, grp, grp_amt, prov_pd FROM service_lines"
+            " WHERE patient_key = ? AND dos = ? AND cpt = ? ORDER BY file, line", key)
+        era_names = [d[0] for d in era.description]
+        return {"encounters": [dict(zip(names, r)) for r in encounters.fetchall()],
+                "era_lines": [dict(zip(era_names, r)) for r in era.fetchall()]}
+
+    def outcomes(self, where:str="1", params:tuple=()) -> pd.DataFrame:
+        """
+        Every encounter code (filtered by `where` on its columns, alias e)
+        with its matched ERA lines: status "paid", "denied" (provider paid
+        0) or "pending" (no remit line yet).
+        """
+        df = pd.read_sql_query(
+            "SELECT e.visit, e.patient_id, e.dos, e.cpt, e.suggested, e.claim, e.payer, e.risk,"
+            " s.file, s.insurance, s.billed, s.grp, s.grp_amt, s.prov_pd"
+            f" FROM encounter_codes e LEFT JOIN service_lines s ON {MATCH}"
+            f" WHERE {where} ORDER BY e.dos, e.visit, e.cpt", self.conn, params=params)
+        df["status"] = "paid"
+        df.loc[df["prov_pd"] == 0, "status"] = "denied"
+        df.loc[df["file"].isna(), "status"] = "pending"
+        return df
+
+    def denials_by_carc(self) -> pd.DataFrame:
+        """Scrubber-recommended CPTs that were later denied, by adjustment code (each one a line carries)."""
+        return pd.read_sql_query(
+            "SELECT e.cpt, a.code AS carc, COUNT(*) AS lines, TOTAL(s.billed) AS billed"
+            f" FROM encounter_codes e JOIN service_lines s ON {MATCH}"
+            " JOIN (SELECT DISTINCT file, line, code FROM adjustments) a ON a.file = s.file AND a.line = s.line"
+            " WHERE e.suggested = 1 AND s.prov_pd = 0 GROUP BY e.cpt, a.code ORDER BY lines DESC, e.cpt",
+            self.conn)
+
+def line_visits(store, where:str="1", params:tuple=()) -> List[str|None]|None:
+    """
+    The linked visit id (or None) of each service line store.load(where,
+    params) returns, in the same order; None when no line is linked.
+    """
+    if not has_index(store.conn):
+        return None
+    rows = store.conn.execute(
+        f"SELECT (SELECT MIN(e.visit) FROM encounter_codes e WHERE {MATCH}) FROM service_lines s"
+        f" WHERE {where} ORDER BY s.file, s.line", params)
+    visits = [v for v, in rows]
+    return visits if any(v is not None for v in visits) else None
+
+def main():
+    from src.era_pipeline.store import RemittanceStore
+    parser = argparse.ArgumentParser(description="Query the scrubber / ERA reconciliation index.")
+    parser.add_argument("--db", default="remittance.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    lk = sub.add_parser("lookup", help="visits and ERA lines for one patient, DOS, CPT")
+    lk.add_argument("patient")
+    lk.add_argument("dos", help="YYYY-MM-DD")
+    lk.add_argument("cpt")
+    sub.add_parser("denials", help="recommended CPTs later denied, by CARC")
+    sub.add_parser("outcomes", help="every recorded code with its ERA status (CSV)")
+    args = parser.parse_args()
+
+    store = RemittanceStore(args.db, read_only=True)
+    try:
+        if not has_index(store.conn):
+            parser.exit(1, "no encounters recorded in this store yet (run src/run_all.py)\n")
+        index = ReconciliationIndex(store)
+        if args.command == "lookup":
+            print(json.dumps(index.lookup(args.patient, args.dos, args.cpt), indent=2))
+        elif args.command == "denials":
+            print(index.denials_by_carc().to_string(index=False))
+        else:
+            print(index.outcomes().to_csv(index=False), end="")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
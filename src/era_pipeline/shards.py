@@ -0,0 +1,99 @@
+"""
+Sharded dashboard JSON: compact pages plus a manifest, so the UI fetches
+only the pages it renders and keeps unchanged ones cached.
+
+Layout under the output folder:
+  manifest.json                               counts, pages, content hashes
+  <dataset>/page-0001.json                    PAGE_SIZE rows per page
+  worklist/payer/<payer>/page-0001.json       a dataset's rows split by group
+
+manifest.json:
+  {"version": 1, "page_size": 500,
+   "datasets": {"<dataset>": {"count": N,
+                              "pages": [{"path", "count", "sha256"}, ...],
+                              "groups": {"payer": {"<payer>": {"count", "pages"}}}}}}
+
+A page whose bytes didn't change is not rewritten (its mtime and ETag stay
+put), and pages left over from a bigger previous export are deleted.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List
+import hashlib, json, os, re
+
+from src import metrics
+
+PAGE_SIZE = 500
+MANIFEST = "manifest.json"
+
+def _slug(name:str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name) or "_"
+
+def _unchanged(path:str, data:bytes) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) != len(data):
+        return False
+    with open(path, "rb") as f:
+        return f.read() == data
+
+def _write_page(out_dir:str, path:str, rows:Any) -> Dict[str,Any]:
+    data = json.dumps(rows, separators=(",", ":")).encode()
+    full = os.path.join(out_dir, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    if not _unchanged(full, data):
+        with open(full, "wb") as f:
+            f.write(data)
+        metrics.count("json_bytes", len(data))
+    return {"path": path.replace(os.sep, "/"), "count": len(rows) if isinstance(rows, list) else 1,
+            "sha256": hashlib.sha256(data).hexdigest()}
+
+def _write_pages(out_dir:str, prefix:str, rows:Any, page_size:int) -> Dict[str,Any]:
+    if not isinstance(rows, list):
+        # A single document (e.g. the KPI snapshot) is one page.
+        return {"count": 1, "pages": [_write_page(out_dir, os.path.join(prefix, "page-0001.json"), rows)]}
+    pages = [_write_page(out_dir, os.path.join(prefix, f"page-{n // page_size + 1:04d}.json"), rows[n:n + page_size])
+             for n in range(0, len(rows), page_size)]
+    return {"count": len(rows), "pages": pages}
+
+def write_sharded(out_dir:str, datasets:Dict[str,Any], groups:Dict[str,Dict[str,List[str]]]|None=None,
+                  page_size:int=PAGE_SIZE) -> Dict[str,Any]:
+    """
+    Write every dataset as pages plus manifest.json into out_dir.
+    groups = {dataset: {group_name: [group key per row]}} additionally splits
+    that dataset's rows by key (e.g. {"worklist": {"payer": payers}}).
+    Returns the manifest.
+    """
+    manifest = {"version": 1, "page_size": page_size, "datasets": {}}
+    for name, rows in datasets.items():
+        entry = _write_pages(out_dir, name, rows, page_size)
+        for group, keys in (groups or {}).get(name, {}).items():
+            split: Dict[str,List[Any]] = {}
+            for key, row in zip(keys, rows):
+                split.setdefault(key, []).append(row)
+            entry.setdefault("groups", {})[group] = {
+                key: _write_pages(out_dir, os.path.join(name, group, _slug(key)), part, page_size)
+                for key, part in sorted(split.items())}
+        manifest["datasets"][name] = entry
+    _remove_stale(out_dir, manifest)
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+def _manifest_paths(entry:Dict[str,Any]) -> List[str]:
+    paths = [p["path"] for p in entry["pages"]]
+    for by_key in entry.get("groups", {}).values():
+        for sub in by_key.values():
+            paths.extend(_manifest_paths(sub))
+    return paths
+
+def _remove_stale(out_dir:str, manifest:Dict[str,Any]):
+    # Only page files inside the dataset folders this export owns.
+    live = {p for entry in manifest["datasets"].values() for p in _manifest_paths(entry)}
+    for name in manifest["datasets"]:
+        for root, _, files in os.walk(os.path.join(out_dir, name), topdown=False):
+            for f in files:
+                rel = os.path.relpath(os.path.join(root, f), out_dir).replace(os.sep, "/")
+                if re.fullmatch(r"page-\d+\.json", f) and rel not in live:
+                    os.remove(os.path.join(root, f))
+            if not os.listdir(root):
+                os.rmdir(root)
@@ -0,0 +1,79 @@
+"""
+Payer x CPT x CARC denial statistics for claim risk scoring.
+
+Counted from the remittance store's dated service lines, a line counting as
+denied when the provider was paid 0 (the dashboard's denial measure). The
+export scripts write them to era_stats.json next to the dashboard JSON each
+time the store changes; src/predict/denial_risk.py reads that file.
+
+  {"version": 1,
+   "overall": [lines, denied],
+   "cpt":       {"99214": [lines, denied]},
+   "payer":     {"UHC": [lines, denied]},
+   "payer_cpt": {"UHC": {"99214": [lines, denied]}},
+   "payer_cpt_carc": {"UHC": {"99214": {"CO-97": denied lines}}},
+   "recommended": {"99214": [lines, denied]}}
+
+CPT is the PROC code without its modifier. A denied line counts once under
+each CARC among its adjustments (store table `adjustments`), and only codes
+matching the dashboard's denial-code pattern are counted. "recommended" counts
+the ERA lines the reconciliation index links to scrubber-recommended codes
+(empty until run_all has recorded visits), the outcome feedback for scoring.
+"""
+from __future__ import annotations
+from typing import Dict, Any
+import json, os
+
+import pandas as pd
+
+from src.era_pipeline.aggregates import DENIAL_CODE_RE
+from src.era_pipeline.reconcile import recommended_outcomes
+
+STATS_FILE = "era_stats.json"
+
+def _counts(df:pd.DataFrame, keys:list) -> pd.DataFrame:
+    return df.groupby(keys, observed=True)[["lines", "denied"]].sum().reset_index()
+
+def _pairs(df:pd.DataFrame) -> list:
+    return [[int(n), int(d)] for n, d in zip(df["lines"], df["denied"])]
+
+def denial_stats(store) -> Dict[str,Any]:
+    df = pd.read_sql_query(
+        "SELECT insurance AS payer, proc, COUNT(*) AS lines, TOTAL(prov_pd = 0) AS denied"
+        " FROM service_lines WHERE dos IS NOT NULL GROUP BY insurance, proc", store.conn)
+    df["cpt"] = df["proc"].str.split(" ").str[0]
+    stats: Dict[str,Any] = {"version": 1, "overall": [int(df["lines"].sum()), int(df["denied"].sum())]}
+
+    cpt = _counts(df, ["cpt"])
+    stats["cpt"] = dict(zip(cpt["cpt"], _pairs(cpt)))
+    payer = _counts(df, ["payer"])
+    stats["payer"] = dict(zip(payer["payer"], _pairs(payer)))
+
+    payer_cpt: Dict[str,Dict[str,list]] = {}
+    pc = _counts(df, ["payer", "cpt"])
+    for p, c, pair in zip(pc["payer"], pc["cpt"], _pairs(pc)):
+        payer_cpt.setdefault(p, {})[c] = pair
+    stats["payer_cpt"] = payer_cpt
+
+    carc: Dict[str,Dict[str,Dict[str,int]]] = {}
+    pcc = pd.read_sql_query(
+        "SELECT insurance AS payer, proc, code, COUNT(*) AS denied"
+        " FROM (SELECT DISTINCT file, line, code FROM adjustments) JOIN service_lines USING (file, line)"
+        " WHERE dos IS NOT NULL AND prov_pd = 0 GROUP BY insurance, proc, code", store.conn)
+    pcc = pcc[pcc["code"].map(lambda g: bool(DENIAL_CODE_RE.match(g)))]
+    pcc["cpt"] = pcc["proc"].str.split(" ").str[0]
+    pcc = pcc.groupby(["payer", "cpt", "code"])["denied"].sum().reset_index()
+    for p, c, g, n in zip(pcc["payer"], pcc["cpt"], pcc["code"], pcc["denied"]):
+        carc.setdefault(p, {}).setdefault(c, {})[g] = int(n)
+    stats["payer_cpt_carc"] = carc
+    stats["recommended"] = recommended_outcomes(store.conn)
+    return stats
+
+def write_denial_stats(store, out_dir:str) -> str:
+    path = os.path.join(out_dir, STATS_FILE)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(denial_stats(store), f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,206 @@
+"""
+Canonical service-line store (local SQLite).
+Rows are kept in long form (one row per ERA service line) and only the
+files whose content changed are deleted/re-inserted, so a run never
+rewrites history. remittance_summary.xlsx is an optional export.
+Dashboard aggregates (see aggregates.py) are maintained alongside: each
+file's partial sums are subtracted from / added to running totals in the
+same transaction that replaces its rows. Each line also carries its
+reconciliation key (normalized patient, DOS, CPT; see reconcile.py).
+
+A line's CAS adjustments are rows of their own in `adjustments` (file, line,
+seq), so denial trends are one GROUP BY code over that table however many
+adjustments a line has; grp / grp_amt on the line keep the first (seq 0).
+"""
+from __future__ import annotations
+from typing import Dict, List, Tuple
+import sqlite3
+
+import pandas as pd
+
+from src import metrics
+from src.era_pipeline.aggregates import MEASURES, file_partials, service_day
+from src.era_pipeline.reconcile import patient_key
+
+# load() column names, in SELECT order
+LOAD_COLUMNS = ["INSURANCE", "File", "PATIENT NAME", "CLAIM ID", "POS", "SERV DATE", "PROC", "BILLED", "ALLOWED",
+                "DEDUCT", "COINS", "GRP/RC-AMT", "RC-AMT VALUE", "PROV PD"]
+CATEGORICAL = ("insurance", "file", "patient", "pos", "proc", "grp")
+
+# Bump when the tables change; an older store is dropped and refilled from the cache.
+SCHEMA_VERSION = 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file TEXT PRIMARY KEY,
+    cache_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS service_lines (
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    insurance TEXT,
+    patient TEXT,
+    claim TEXT,
+    pos TEXT,
+    serv_date TEXT,
+    proc TEXT,
+    billed REAL,
+    allowed REAL,
+    deduct REAL,
+    coins REAL,
+    grp TEXT,
+    grp_amt REAL,
+    prov_pd REAL,
+    dos TEXT,  -- ISO service date (thru date), NULL when it doesn't parse
+    patient_key TEXT,  -- reconcile.patient_key(patient)
+    cpt TEXT,  -- proc without its modifiers
+    remarks TEXT,  -- RARC remark codes, space-separated
+    PRIMARY KEY (file, line)
+);
+CREATE TABLE IF NOT EXISTS adjustments (
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    seq INTEGER NOT NULL,  -- print order; 0 is service_lines.grp
+    code TEXT NOT NULL,    -- GRP-RC, e.g. CO-45
+    amount REAL,
+    PRIMARY KEY (file, line, seq)
+);
+CREATE INDEX IF NOT EXISTS ix_adjustments_code ON adjustments (code);
+CREATE INDEX IF NOT EXISTS ix_lines_insurance ON service_lines (insurance);
+CREATE INDEX IF NOT EXISTS ix_lines_proc ON service_lines (proc);
+CREATE INDEX IF NOT EXISTS ix_lines_dos ON service_lines (dos);
+CREATE INDEX IF NOT EXISTS ix_lines_recon ON service_lines (patient_key, dos, cpt);
+CREATE TABLE IF NOT EXISTS file_aggregates (
+    file TEXT NOT NULL,
+    dim TEXT NOT NULL,
+    key TEXT NOT NULL,
+    lines INTEGER, billed INTEGER, paid INTEGER, denied INTEGER, denied_billed INTEGER, amount INTEGER,
+    PRIMARY KEY (file, dim, key)
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    dim TEXT NOT NULL,
+    key TEXT NOT NULL,
+    lines INTEGER, billed INTEGER, paid INTEGER, denied INTEGER, denied_billed INTEGER, amount INTEGER,
+    PRIMARY KEY (dim, key)
+);
+"""
+
+# Add (sign=1) or subtract (sign=-1) one file's partials from the running totals.
+FOLD = (
+    "INSERT INTO aggregates SELECT dim, key, "
+    + ", ".join(f"?1 * {m}" for m in MEASURES)
+    + " FROM file_aggregates WHERE file = ?2 ON CONFLICT (dim, key) DO UPDATE SET "
+    + ", ".join(f"{m} = {m} + excluded.{m}" for m in MEASURES)
+)
+
+def _row(filename:str, line:int, r:dict) -> tuple:
+    pos, _, date = r["SERV DATE"].partition(" ")
+    return (filename, line, r["INSURANCE"], r["PATIENT NAME"], r["CLAIM ID"], pos, date, r["PROC"],
+            r["BILLED"], r["ALLOWED"], r["DEDUCT"], r["COINS"],
+            r["GRP/RC-AMT"], r["RC-AMT VALUE"], r["PROV PD"], service_day(r["SERV DATE"]),
+            patient_key(r["PATIENT NAME"]), r["PROC"].split(" ")[0], " ".join(r["REMARKS"]))
+
+def _adjustment_rows(filename:str, records:List[dict]):
+    for line, r in enumerate(records):
+        for seq, (code, amount) in enumerate(r["ADJUSTMENTS"]):
+            yield filename, line, seq, code, amount
+
+class RemittanceStore:
+    def __init__(self, path:str, read_only:bool=False):
+        self.path = path
+        if read_only:
+            # Readers (e.g. the query API) never create or migrate the schema.
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.conn = sqlite3.connect(path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS service_lines; DROP TABLE IF EXISTS adjustments;"
+                " DROP TABLE IF EXISTS file_aggregates; DROP TABLE IF EXISTS aggregates;")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def file_keys(self) -> Dict[str,str]:
+        return dict(self.conn.execute("SELECT file, cache_key FROM files"))
+
+    @metrics.stage("store.sync")
+    def sync(self, hashes:Dict[str,str], cache) -> Tuple[List[str], List[str]]:
+        """
+        Bring the store in line with {filename: sha256}, loading rows for
+        files that are new, changed, or parsed by another parser version from
+        the extraction cache, and folding their aggregate deltas into the
+        running totals. A parser-version bump changes every key, so it
+        recomputes everything. Returns (changed, removed).
+        """
+        known = self.file_keys()
+        changed = [name for name, sha in hashes.items() if known.get(name) != cache.key(sha)]
+        removed = [name for name in known if name not in hashes]
+        with self.conn:
+            for name in changed + removed:
+                self.conn.execute(FOLD, (-1, name))
+                for table in ("service_lines", "adjustments", "file_aggregates", "files"):
+                    self.conn.execute(f"DELETE FROM {table} WHERE file = ?", (name,))
+            for name in changed:
+                records = cache.get(hashes[name], name) or []
+                self.conn.executemany(
+                    "INSERT INTO service_lines VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (_row(name, i, r) for i, r in enumerate(records)))
+                self.conn.executemany("INSERT INTO adjustments VALUES (?,?,?,?,?)",
+                                      _adjustment_rows(name, records))
+                self.conn.executemany(
+                    "INSERT INTO file_aggregates VALUES (?,?,?,?,?,?,?,?,?)",
+                    ((name, *p) for p in file_partials(records)))
+                self.conn.execute(FOLD, (1, name))
+                self.conn.execute("INSERT INTO files VALUES (?, ?)", (name, cache.key(hashes[name])))
+            self.conn.execute("DELETE FROM aggregates WHERE lines = 0")
+        return changed, removed
+
+    @metrics.stage("store.rebuild_aggregates")
+    def rebuild_aggregates(self):
+        """Recompute the running totals from the per-file partials."""
+        sums = ", ".join(f"SUM({m})" for m in MEASURES)
+        with self.conn:
+            self.conn.execute("DELETE FROM aggregates")
+            self.conn.execute(
+                f"INSERT INTO aggregates SELECT dim, key, {sums} FROM file_aggregates GROUP BY dim, key")
+
+    def totals(self, dim:str) -> pd.DataFrame:
+        """Running totals for one dimension, ordered by key; amounts in dollars."""
+        df = pd.read_sql_query(
+            f"SELECT key, {', '.join(MEASURES)} FROM aggregates WHERE dim = ? ORDER BY key",
+            self.conn, params=(dim,))
+        for m in ("billed", "paid", "denied_billed", "amount"):
+            df[m] = df[m] / 100
+        return df
+
+    @metrics.stage("store.load")
+    def load(self, where:str="1", params:tuple=()) -> pd.DataFrame:
+        """
+        Service lines ordered by file, with typed columns: SERV DATE as
+        datetime64 (NaT when unparseable) parsed in one vectorized pass, POS
+        (the SERV DATE prefix) and the repeated strings as categoricals.
+        `where` is an SQL filter on the table columns (e.g. "prov_pd = 0"),
+        with `params` bound to its ? placeholders.
+        """
+        df = pd.read_sql_query(
+            "SELECT insurance, file, patient, claim, pos, serv_date, proc, billed, allowed,"
+            f" deduct, coins, grp, grp_amt, prov_pd FROM service_lines WHERE {where} ORDER BY file, line",
+            self.conn, params=params)
+        df["serv_date"] = pd.to_datetime(df["serv_date"], format="%m%d%y", errors="coerce")
+        df = df.astype({c: "category" for c in CATEGORICAL})
+        df.columns = LOAD_COLUMNS
+        return df
+
+    @metrics.stage("store.load_adjustments")
+    def load_adjustments(self, where:str="1", params:tuple=()) -> pd.DataFrame:
+        """
+        Every adjustment of the lines load(where, params) returns, long form:
+        row (position in that frame), code, amount; in row, print order.
+        """
+        return pd.read_sql_query(
+            "SELECT r.row, a.code, a.amount FROM (SELECT file, line, ROW_NUMBER() OVER (ORDER BY file, line) - 1"
+            f" AS row FROM service_lines WHERE {where}) r JOIN adjustments a USING (file, line)"
+            " ORDER BY r.row, a.seq", self.conn, params=params)
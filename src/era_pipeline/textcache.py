@@ -0,0 +1,148 @@
+"""
+Per-page extracted PDF text, cached by content hash.
+
+page.get_text() is most of a fresh PDF parse, and its output depends only
+on the file's bytes, not on the parser. Each PDF's page texts are kept as
+one zlib-compressed JSON entry keyed by SHA-256 (page n is item n), so a
+PARSER_VERSION bump or a layout fix re-parses every ERA from cached text
+without opening a PDF:
+
+    python -m src.era_pipeline.textcache --cache era_cache          # entries, pages, size, scans
+    python -m src.era_pipeline.textcache --cache era_cache parse    # run the current parsers over it
+
+Pages with an empty text layer (scans) are listed in their entry as
+"no_text": the queue for a slow OCR fallback, which this tier never runs.
+
+Layout:
+  <cache_dir>/text/<sha256>-t<version>.json.z   {"pages": [...], "no_text": [page numbers]}
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Iterable, Iterator, Tuple
+import argparse, json, os, sys, time, zlib
+
+from src import metrics
+
+# Bump if the get_text() call (flags, output kind) changes.
+TEXT_VERSION = "1"
+SUFFIX = f"-t{TEXT_VERSION}.json.z"
+
+class PageTextCache:
+    def __init__(self, cache_dir:str):
+        self.text_dir = os.path.join(cache_dir, "text")
+
+    def _path(self, sha:str) -> str:
+        return os.path.join(self.text_dir, sha + SUFFIX)
+
+    def __contains__(self, sha:str) -> bool:
+        return os.path.exists(self._path(sha))
+
+    def _entry(self, sha:str) -> Dict[str,Any]|None:
+        path = self._path(sha)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    @metrics.stage("text.read")
+    def get(self, sha:str) -> List[str]|None:
+        entry = self._entry(sha)
+        if entry is None:
+            return None
+        metrics.count("text_cache_pages", len(entry["pages"]))
+        return entry["pages"]
+
+    @metrics.stage("text.write")
+    def put(self, sha:str, pages:List[str]):
+        # Written from pool workers too, so tmp + replace per entry.
+        os.makedirs(self.text_dir, exist_ok=True)
+        no_text = [n for n, text in enumerate(pages) if not text.strip()]
+        metrics.count("pages_no_text", len(no_text))
+        path = self._path(sha)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(json.dumps({"pages": pages, "no_text": no_text}).encode(), 6))
+        os.replace(tmp, path)
+
+    def shas(self) -> List[str]:
+        if not os.path.isdir(self.text_dir):
+            return []
+        return sorted(f[:-len(SUFFIX)] for f in os.listdir(self.text_dir) if f.endswith(SUFFIX))
+
+    def no_text(self, hashes:Dict[str,str]) -> List[Tuple[str,int]]:
+        """(filename, page number) of every cached page with no text layer."""
+        queue = []
+        for name, sha in hashes.items():
+            entry = self._entry(sha)
+            if entry:
+                queue.extend((name, n) for n in entry["no_text"])
+        return queue
+
+    def prune(self, live:Iterable[str]) -> int:
+        """Delete entries (and older text versions) for content no indexed file has."""
+        if not os.path.isdir(self.text_dir):
+            return 0
+        keep = {sha + SUFFIX for sha in live}
+        removed = 0
+        for name in os.listdir(self.text_dir):
+            if name not in keep:
+                os.remove(os.path.join(self.text_dir, name))
+                removed += 1
+        return removed
+
+# ---- CLI ----
+def _cached_pdfs(cache_dir:str, texts:PageTextCache) -> Iterator[Tuple[str,str]]:
+    # (filename, sha) for indexed PDFs whose text is cached; like the cache,
+    # zip members duplicating a loose file (or an earlier member) are skipped
+    index_path = os.path.join(cache_dir, "index.json")
+    if not os.path.exists(index_path):
+        return
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    loose = {entry["sha256"] for name, entry in index.items() if ".zip/" not in name}
+    seen = set()
+    for name, entry in sorted(index.items()):
+        sha = entry["sha256"]
+        if ".zip/" in name:
+            if sha in loose or sha in seen:
+                continue
+            seen.add(sha)
+        if name.lower().endswith(".pdf") and sha in texts:
+            yield name, sha
+
+def main():
+    from src.era_pipeline.extract import parse_pages
+    parser = argparse.ArgumentParser(description="Inspect or re-parse the cached ERA page text.")
+    parser.add_argument("command", nargs="?", choices=("stats", "parse"), default="stats")
+    parser.add_argument("--cache", default="era_cache", help="extraction cache folder")
+    parser.add_argument("--out", help="parse: also write the service lines here as NDJSON")
+    args = parser.parse_args()
+
+    texts = PageTextCache(args.cache)
+    files = list(_cached_pdfs(args.cache, texts))
+    if args.command == "stats":
+        size = sum(os.path.getsize(texts._path(sha)) for sha in texts.shas())
+        pages = sum(len(texts.get(sha)) for _, sha in files)
+        queue = texts.no_text(dict(files))
+        print(f"{len(texts.shas())} entries, {size / 2**20:.1f} MB; {len(files)} indexed PDFs, {pages} pages")
+        print(f"{len(queue)} page(s) with no text layer (OCR queue)")
+        for name, n in queue:
+            print(f"  {name} p{n + 1}")
+        return
+
+    start = time.perf_counter()
+    lines = 0
+    out = open(args.out, "w") if args.out else None
+    try:
+        for name, sha in files:
+            records = parse_pages(texts.get(sha), name)
+            lines += len(records)
+            if out:
+                out.writelines(json.dumps(r) + "\n" for r in records)
+    finally:
+        if out:
+            out.close()
+    print(f"parsed {len(files)} files, {lines} service lines from cached text "
+          f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Run instrumentation: stage timers, counters and an optional profiler.
+
+    from src import metrics
+
+    with metrics.stage("pdf.open"):        # or @metrics.stage("pdf.open")
+        doc = fitz.open(path)
+    metrics.count("pages")
+    metrics.count("bytes", len(data))
+
+Stages nest per thread: each records calls, inclusive seconds and self
+seconds (time not spent in a nested stage), so "pdf.parse" minus its
+"pdf.get_text" children is the regex/record-building cost. Timing is
+always on (a perf_counter pair and a lock per stage); profile() adds
+cProfile (every thread that enters thread_profile(), merged) or tracemalloc
+(peak and top allocation sites) behind the scripts' --profile flag.
+
+Process-pool workers keep their own registry (the pool's initializer is
+reset(), so a forked worker doesn't re-report the parent's stages); a
+worker returns drain() with its results and the parent merge()s it.
+Entering profile() starts a run: it resets the registry and the wall
+clock. write() puts run_metrics.json next to the dashboard outputs and
+appends a one-line summary to run_metrics_history.ndjson, so throughput
+can be tracked across runs.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Iterator
+import contextlib, cProfile, io, json, os, pstats, threading, time, tracemalloc
+
+METRICS_FILE = "run_metrics.json"
+HISTORY_FILE = "run_metrics_history.ndjson"
+PROFILE_FILE = "run_profile.prof"
+PROFILES = ("cprofile", "tracemalloc")
+TOP = 25
+
+_lock = threading.Lock()
+_local = threading.local()
+_stages: Dict[str,List[float]] = {}   # name -> [calls, seconds, self seconds]
+_counters: Dict[str,float] = {}
+_started = time.time()
+_mode: str|None = None
+_profilers: List[cProfile.Profile] = []
+
+def reset():
+    global _started
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _started = time.time()
+
+# ---- TIMERS AND COUNTERS ----
+class stage(contextlib.ContextDecorator):
+    """Time a block (with metrics.stage(name):) or a function (@metrics.stage(name))."""
+    def __init__(self, name:str):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        # [start, seconds spent in nested stages]
+        stack.append([time.perf_counter(), 0.0])
+        return self
+
+    def __exit__(self, *exc):
+        start, nested = _local.stack.pop()
+        seconds = time.perf_counter() - start
+        if _local.stack:
+            _local.stack[-1][1] += seconds
+        with _lock:
+            s = _stages.setdefault(self.name, [0, 0.0, 0.0])
+            s[0] += 1
+            s[1] += seconds
+            s[2] += seconds - nested
+        return False
+
+def count(name:str, n:float=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def drain() -> Dict[str,Any]:
+    """This process's stages and counters since the last drain, then cleared."""
+    with _lock:
+        out = {"stages": {k: list(v) for k, v in _stages.items()}, "counters": dict(_counters)}
+        _stages.clear()
+        _counters.clear()
+    return out
+
+def merge(part:Dict[str,Any]):
+    """Fold a drain() from another process into this registry."""
+    with _lock:
+        for name, (calls, seconds, own) in part.get("stages", {}).items():
+            s = _stages.setdefault(name, [0, 0.0, 0.0])
+            s[0] += calls
+            s[1] += seconds
+            s[2] += own
+        for name, n in part.get("counters", {}).items():
+            _counters[name] = _counters.get(name, 0) + n
+
+def snapshot() -> Dict[str,Any]:
+    with _lock:
+        stages = {name: {"calls": int(c), "seconds": round(s, 4), "self_seconds": round(own, 4)}
+                  for name, (c, s, own) in sorted(_stages.items())}
+        counters = {k: int(v) if float(v).is_integer() else round(v, 4) for k, v in sorted(_counters.items())}
+    return {"stages": stages, "counters": counters}
+
+# ---- PROFILING ----
+@contextlib.contextmanager
+def thread_profile() -> Iterator[None]:
+    """Profile the calling thread too (cProfile only sees the thread that enabled it)."""
+    if _mode != "cprofile":
+        yield
+        return
+    profiler = cProfile.Profile()
+    with _lock:
+        _profilers.append(profiler)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+@contextlib.contextmanager
+def profile(mode:str|None) -> Iterator[Dict[str,Any]]:
+    """
+    Start a run (reset()) and profile the block when mode is "cprofile" or
+    "tracemalloc"; the yielded dict receives the summary (pass it to
+    write()). Only the reset for None.
+    """
+    global _mode
+    reset()
+    summary: Dict[str,Any] = {}
+    if mode not in PROFILES:
+        yield summary
+        return
+    _mode = mode
+    if mode == "tracemalloc":
+        tracemalloc.start()
+    try:
+        with thread_profile():
+            yield summary
+    finally:
+        if mode == "tracemalloc":
+            current, peak = tracemalloc.get_traced_memory()
+            sites = tracemalloc.take_snapshot().statistics("lineno")[:TOP]
+            tracemalloc.stop()
+            summary.update({"mode": mode, "peak_mb": round(peak / 2**20, 2),
+                            "top_allocations": [{"site": str(s.traceback[0]), "mb": round(s.size / 2**20, 3),
+                                                 "blocks": s.count} for s in sites]})
+        else:
+            with _lock:
+                profilers, _profilers[:] = list(_profilers), []
+            stats = pstats.Stats(profilers[0], stream=io.StringIO())
+            for p in profilers[1:]:
+                stats.add(p)
+            summary.update({"mode": mode, "stats": stats, "top_cumulative": _top(stats)})
+        _mode = None
+
+def _top(stats:pstats.Stats) -> List[Dict[str,Any]]:
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:TOP]
+    return [{"function": f"{os.path.basename(f)}:{line}({fn})", "calls": nc,
+             "tottime": round(tt, 4), "cumtime": round(ct, 4)}
+            for (f, line, fn), (cc, nc, tt, ct, _) in rows]
+
+# ---- OUTPUT ----
+def write(out_dir:str, run:str, profiled:Dict[str,Any]|None=None, **extra) -> str:
+    """
+    run_metrics.json in out_dir (stages, counters, throughput, profile
+    summary; a cProfile run also leaves run_profile.prof for pstats/snakeviz)
+    plus one summary line appended to run_metrics_history.ndjson.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    report = {"run": run, "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_started)),
+              "wall_seconds": round(time.time() - _started, 3), **extra, **snapshot()}
+    wall = report["wall_seconds"] or 1e-9
+    report["throughput_per_s"] = {k: round(v / wall, 2) for k, v in report["counters"].items()}
+    if profiled:
+        profiled = dict(profiled)
+        stats = profiled.pop("stats", None)
+        if stats is not None:
+            stats.dump_stats(os.path.join(out_dir, PROFILE_FILE))
+            profiled["file"] = PROFILE_FILE
+        report["profile"] = profiled
+    path = os.path.join(out_dir, METRICS_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+    summary = {k: report[k] for k in ("run", "started", "wall_seconds", "counters")}
+    summary["stages"] = {name: s["seconds"] for name, s in report["stages"].items()}
+    with open(os.path.join(out_dir, HISTORY_FILE), "a") as f:
+        f.write(json.dumps(summary, separators=(",", ":")) + "\n")
+    return path
@@ -0,0 +1,384 @@
+"""
+Trainable denial model: logistic regression (numpy, CPU) over a sparse
+binary feature matrix, trained on the remittance store's outcomes.
+
+One sample per dated service line, labelled denied when the provider was
+paid 0 (the dashboard's denial measure). Features:
+
+  claim level   payer=, claim_cpt= (every code on the claim), mod=, icd=,
+                rule= (denial rules from src/rules/denial_risk.json)
+  line level    cpt=, pc= (payer|cpt)
+
+A claim is scored by its riskiest line, as in denial_risk.score_table.
+ERA prints carry no diagnoses, so icd= features only ever come from claim
+stubs and keep a zero weight until outcomes with ICDs are loaded.
+
+The encoded matrix is cached per ERA file (keyed by the store's file key)
+against an append-only vocabulary, so a new batch of ERAs only encodes its
+own claims. A change to the denial rules or FEATURE_VERSION re-encodes all.
+
+  python -m src.predict.denial_model train --db remittance.db --model output/denial_model.npz
+  python -m src.predict.denial_model eval  --db remittance.db --model output/denial_model.npz
+
+train fits on the earliest 80% of service dates, reports holdout AUC (and
+the payer x CPT rate's AUC as a baseline) and inference latency, then
+refits on every line and saves. eval scores a saved model on lines dated
+after its training data, and times predict_table end to end.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple
+import argparse, hashlib, json, os, sys, time
+
+import numpy as np
+import pandas as pd
+
+from src.predict.denial_risk import DENIAL_RULES
+from src.rules.engine import RuleSet, load_rules
+
+FEATURE_VERSION = 1
+MODEL_FILE = "denial_model.npz"
+CACHE_FILE = "denial_features.npz"
+HOLDOUT = 0.2
+
+# ---- FEATURES ----
+def _features_key(rules_path:str) -> str:
+    with open(rules_path, "rb") as f:
+        return f"{FEATURE_VERSION}-{hashlib.sha256(f.read()).hexdigest()[:16]}"
+
+def _pairs(rows, prefix:str, values) -> pd.DataFrame:
+    values = pd.Series(values, dtype=object).fillna("").astype(str)
+    return pd.DataFrame({"row": np.asarray(rows, dtype=np.int64), "feature": prefix + values})
+
+def line_features(table:Dict[str,Any], rules:RuleSet) -> Tuple[np.ndarray,pd.DataFrame]:
+    """
+    (owning claim per line, long frame of (line, feature name)) for a
+    claims table (denial_risk.claims_table layout). Each code is a line; a
+    claim without codes gets one line carrying only its claim features.
+    """
+    n = table["n"]
+    code_row, codes = table["codes"]
+    code_row = np.asarray(code_row, dtype=np.int64)
+    bare = np.setdiff1d(np.arange(n), code_row)
+    line_claim = np.concatenate([code_row, bare])
+    line_codes = pd.Series(list(codes) + [""] * len(bare), dtype=object).fillna("").astype(str)
+    line_codes = line_codes.str.split(" ").str[0]
+    payers = pd.Series(table["payer"][1], dtype=object).fillna("").astype(str).to_numpy()
+
+    # claim-level features, then copied to each of the claim's lines
+    claim_feats = [
+        _pairs(np.arange(n), "payer=", payers),
+        _pairs(code_row, "claim_cpt=", line_codes[:len(code_row)]),
+        _pairs(table["modifiers"][0], "mod=", table["modifiers"][1]),
+        _pairs(table["icds"][0], "icd=", table["icds"][1]),
+    ]
+    for rule_id, _, mask in rules.masks(table):
+        hit = np.flatnonzero(mask)
+        if len(hit):
+            claim_feats.append(pd.DataFrame({"row": hit, "feature": f"rule={rule_id}"}))
+    claim_feats = pd.concat(claim_feats, ignore_index=True).drop_duplicates()
+    lines = pd.DataFrame({"line": np.arange(len(line_claim)), "row": line_claim})
+    per_line = lines.merge(claim_feats, on="row")[["line", "feature"]]
+
+    has_code = line_codes != ""
+    own = pd.concat([
+        pd.DataFrame({"line": lines["line"][has_code], "feature": "cpt=" + line_codes[has_code]}),
+        pd.DataFrame({"line": lines["line"][has_code],
+                      "feature": "pc=" + payers[line_claim[has_code.to_numpy()]] + "|" + line_codes[has_code]}),
+    ])
+    long = pd.concat([per_line, own], ignore_index=True)
+    return line_claim, long.sort_values("line", kind="stable")
+
+def encode(long:pd.DataFrame, n_lines:int, vocab:Dict[str,int], grow:bool) -> Tuple[np.ndarray,np.ndarray]:
+    """CSR (indptr, indices) over vocab ids; unseen names are added (grow) or dropped."""
+    names = long["feature"].to_numpy()
+    if grow:
+        for name in pd.unique(names):
+            if name not in vocab:
+                vocab[name] = len(vocab)
+    ids = pd.Series(names).map(vocab)
+    keep = ids.notna().to_numpy()
+    rows = long["line"].to_numpy()[keep]
+    indptr = np.zeros(n_lines + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_lines), out=indptr[1:])
+    return indptr, ids.to_numpy()[keep].astype(np.int64)
+
+# ---- TRAINING DATA (cached per ERA file) ----
+def _era_claims(store, files:List[str]) -> Tuple[Dict[str,Any],pd.DataFrame]:
+    # Lines of the given files grouped into claims (file + claim id), as a claims table.
+    marks = ",".join("?" * len(files))
+    df = pd.read_sql_query(
+        "SELECT file, line, insurance, claim, proc, prov_pd, dos FROM service_lines"
+        f" WHERE dos IS NOT NULL AND file IN ({marks}) ORDER BY file, line", store.conn, params=files)
+    key = df["file"] + "\t" + df["claim"].where(df["claim"] != "", "line " + df["line"].astype(str))
+    claim_row, claim_keys = pd.factorize(key)
+    first = pd.Series(np.arange(len(df))).groupby(claim_row).first().to_numpy()
+    code, _, mod = df["proc"].str.partition(" ").values.T
+    has_mod = mod != ""
+    table = {
+        "n": len(claim_keys),
+        "id": list(claim_keys),
+        "payer": (np.arange(len(claim_keys)), df["insurance"].to_numpy()[first]),
+        "codes": (claim_row, list(code)),
+        "modifiers": (claim_row[has_mod], list(mod[has_mod])),
+        "icds": (np.zeros(0, dtype=np.int64), []),
+    }
+    lines = pd.DataFrame({
+        "file": df["file"],
+        "label": (df["prov_pd"] == 0).astype(np.int8),
+        "day": pd.to_datetime(df["dos"]).map(pd.Timestamp.toordinal).astype(np.int64) if len(df) else [],
+    })
+    return table, lines
+
+class FeatureCache:
+    """
+    Encoded training rows per ERA file in one .npz:
+      vocab, files/file_keys, and per row: file index, label, day, CSR.
+    """
+    def __init__(self, path:str, rules_path:str=DENIAL_RULES):
+        self.path = path
+        self.rules_path = rules_path
+        self.key = _features_key(rules_path)
+        self.vocab: Dict[str,int] = {}
+        self.files: Dict[str,str] = {}
+        self.row_file = np.zeros(0, dtype=np.int64)
+        self.labels = np.zeros(0, dtype=np.int8)
+        self.days = np.zeros(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        self._file_names: List[str] = []
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as z:
+                if str(z["key"]) == self.key:
+                    self.vocab = {name: i for i, name in enumerate(z["vocab"].tolist())}
+                    self._file_names = z["file_names"].tolist()
+                    self.files = dict(zip(self._file_names, z["file_keys"].tolist()))
+                    self.row_file, self.labels, self.days = z["row_file"], z["labels"], z["days"]
+                    self.indptr, self.indices = z["indptr"], z["indices"]
+
+    def update(self, store) -> Tuple[int,int]:
+        """Re-encode new/changed ERA files and drop removed ones; returns (encoded, dropped) file counts."""
+        current = store.file_keys()
+        stale = {name for name, key in self.files.items() if current.get(name) != key}
+        fresh = sorted(name for name, key in current.items() if self.files.get(name) != key)
+        if stale:
+            for name in stale:
+                del self.files[name]
+            self._drop(stale)
+        if fresh:
+            table, lines = _era_claims(store, fresh)
+            line_claim, long = line_features(table, load_rules(self.rules_path))
+            indptr, indices = encode(long, len(line_claim), self.vocab, grow=True)
+            self._file_names.extend(fresh)
+            index = {name: i for i, name in enumerate(self._file_names)}
+            self.row_file = np.concatenate([self.row_file, lines["file"].map(index).to_numpy(dtype=np.int64)])
+            self.labels = np.concatenate([self.labels, lines["label"].to_numpy(dtype=np.int8)])
+            self.days = np.concatenate([self.days, np.asarray(lines["day"], dtype=np.int64)])
+            self.indptr = np.concatenate([self.indptr, self.indptr[-1] + indptr[1:]])
+            self.indices = np.concatenate([self.indices, indices])
+            self.files.update({name: current[name] for name in fresh})
+        if stale or fresh:
+            self.save()
+        return len(fresh), len(stale - set(fresh))
+
+    def _drop(self, stale:set):
+        # Remove the rows of stale files and renumber the remaining files.
+        gone = np.array([name in stale for name in self._file_names], dtype=bool)
+        keep = ~gone[self.row_file] if len(self.row_file) else np.zeros(0, dtype=bool)
+        lengths = np.diff(self.indptr)
+        self.indices = self.indices[np.repeat(keep, lengths)]
+        self.indptr = np.concatenate([[0], np.cumsum(lengths[keep])])
+        self.labels, self.days = self.labels[keep], self.days[keep]
+        self.row_file = (np.cumsum(~gone) - 1)[self.row_file[keep]]
+        self._file_names = [name for name, g in zip(self._file_names, gone) if not g]
+
+    def save(self):
+        names = sorted(self.vocab, key=self.vocab.get)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, key=np.array(self.key), vocab=np.array(names, dtype=str),
+                 file_names=np.array(self._file_names, dtype=str),
+                 file_keys=np.array([self.files[f] for f in self._file_names], dtype=str),
+                 row_file=self.row_file, labels=self.labels, days=self.days,
+                 indptr=self.indptr, indices=self.indices)
+        os.replace(tmp, self.path)
+
+# ---- MODEL ----
+def _rows(indptr:np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+def _logits(indptr, indices, rows, w:np.ndarray, b:float) -> np.ndarray:
+    return b + np.bincount(rows, weights=w[indices], minlength=len(indptr) - 1)
+
+def _sigmoid(z:np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+def fit(indptr, indices, y:np.ndarray, n_features:int, l2:float=1e-3,
+        iterations:int=400, lr:float=0.05) -> Tuple[np.ndarray,float]:
+    """L2-regularized logistic regression, full-batch Adam; deterministic."""
+    rows = _rows(indptr)
+    w, b = np.zeros(n_features), 0.0
+    m, v = np.zeros(n_features + 1), np.zeros(n_features + 1)
+    n = len(y)
+    for t in range(1, iterations + 1):
+        err = _sigmoid(_logits(indptr, indices, rows, w, b)) - y
+        g = np.empty(n_features + 1)
+        g[:-1] = np.bincount(indices, weights=err[rows], minlength=n_features) / n + l2 * w
+        g[-1] = err.mean()
+        m = 0.9 * m + 0.1 * g
+        v = 0.999 * v + 0.001 * g * g
+        step = lr * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8)
+        w -= step[:-1]
+        b -= step[-1]
+    return w, b
+
+def auc(y:np.ndarray, score:np.ndarray) -> float:
+    """ROC AUC via the rank-sum statistic (ties averaged)."""
+    pos = int(y.sum())
+    neg = len(y) - pos
+    if not pos or not neg:
+        return float("nan")
+    ranks = pd.Series(score).rank(method="average").to_numpy()
+    return float((ranks[y == 1].sum() - pos * (pos + 1) / 2) / (pos * neg))
+
+def save_model(path:str, vocab:Dict[str,int], w:np.ndarray, b:float, meta:Dict[str,Any]):
+    names = sorted(vocab, key=vocab.get)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, vocab=np.array(names, dtype=str), weights=w[:len(names)], bias=np.array(b),
+             meta=np.array(json.dumps(meta)))
+    os.replace(tmp, path)
+
+def load_model(path:str) -> Dict[str,Any]:
+    with np.load(path, allow_pickle=False) as z:
+        return {"vocab": {name: i for i, name in enumerate(z["vocab"].tolist())},
+                "weights": z["weights"], "bias": float(z["bias"]), "meta": json.loads(str(z["meta"]))}
+
+def predict_table(table:Dict[str,Any], model:Dict[str,Any], rules:RuleSet|None=None) -> np.ndarray:
+    """Denial probability per claim of a claims table (its riskiest line)."""
+    line_claim, long = line_features(table, rules or load_rules(DENIAL_RULES))
+    indptr, indices = encode(long, len(line_claim), model["vocab"], grow=False)
+    p = _sigmoid(_logits(indptr, indices, _rows(indptr), model["weights"], model["bias"]))
+    out = np.zeros(table["n"])
+    np.maximum.at(out, line_claim, p)
+    return out
+
+# ---- CLI ----
+def _split(days:np.ndarray) -> np.ndarray:
+    # Train on the earliest service dates, hold out the latest HOLDOUT share.
+    # When the dates can't split that way (all or nearly all on one day),
+    # the latest HOLDOUT share of lines by (date, store order) is held out.
+    if len(days) < 2:
+        sys.exit("Need at least 2 dated service lines to train and hold out.")
+    train = days < np.quantile(days, 1 - HOLDOUT)
+    if train.all() or not train.any():
+        train = np.zeros(len(days), dtype=bool)
+        holdout = max(1, int(round(len(days) * HOLDOUT)))
+        train[np.argsort(days, kind="stable")[:len(days) - holdout]] = True
+    return train
+
+def _subset(cache:FeatureCache, mask:np.ndarray):
+    lengths = np.diff(cache.indptr)
+    return (np.concatenate([[0], np.cumsum(lengths[mask])]),
+            cache.indices[np.repeat(mask, lengths)], cache.labels[mask].astype(float))
+
+def _report(name:str, y:np.ndarray, p:np.ndarray, seconds:float|None=None):
+    line = f"{name:<9} lines={len(y):>7,}  denied={y.mean():.3f}  AUC={auc(y, p):.4f}"
+    if seconds is not None:
+        line += f"  inference={seconds * 1e3:.1f} ms ({seconds / max(len(y), 1) * 1e6:.2f} us/line)"
+    print(line)
+
+def _pc_baseline(indptr, indices, y, hi, hx, pc_ids:np.ndarray, k:int=20) -> np.ndarray:
+    # Smoothed payer|cpt denial rate of the training lines (the era_stats score) per holdout line.
+    rows = _rows(indptr)
+    is_pc = np.isin(indices, pc_ids)
+    size = max(indices.max(initial=0), hx.max(initial=0)) + 1
+    lines = np.bincount(indices[is_pc], minlength=size)
+    denied = np.bincount(indices[is_pc], weights=y[rows[is_pc]], minlength=size)
+    overall = y.mean()
+    rate = (denied + k * overall) / (lines + k)
+    hpc = np.isin(hx, pc_ids)
+    out = np.full(len(hi) - 1, overall)
+    out[_rows(hi)[hpc]] = rate[hx[hpc]]
+    return out
+
+def _open(args):
+    from src.era_pipeline.store import RemittanceStore
+    store = RemittanceStore(args.db, read_only=True)
+    cache = FeatureCache(args.cache)
+    start = time.perf_counter()
+    encoded, dropped = cache.update(store)
+    print(f"features: {len(cache.labels):,} lines x {len(cache.vocab):,} features"
+          f" ({encoded} files encoded, {dropped} dropped, {time.perf_counter() - start:.2f}s)")
+    if not len(cache.labels):
+        store.close()
+        sys.exit("No dated service lines in the store.")
+    return store, cache
+
+def train(args):
+    store, cache = _open(args)
+    store.close()
+    train_mask = _split(cache.days)
+    d = len(cache.vocab)
+    indptr, indices, y = _subset(cache, train_mask)
+    start = time.perf_counter()
+    w, b = fit(indptr, indices, y, d, l2=args.l2, iterations=args.iterations)
+    print(f"fit on {len(y):,} lines in {time.perf_counter() - start:.2f}s")
+    _report("train", y, _sigmoid(_logits(indptr, indices, _rows(indptr), w, b)))
+    hi, hx, hy = _subset(cache, ~train_mask)
+    start = time.perf_counter()
+    p = _sigmoid(_logits(hi, hx, _rows(hi), w, b))
+    _report("holdout", hy, p, time.perf_counter() - start)
+    names = np.array(sorted(cache.vocab, key=cache.vocab.get), dtype=str)
+    base = _pc_baseline(indptr, indices, y, hi, hx, np.flatnonzero(np.char.startswith(names, "pc=")))
+    print(f"baseline  payer x CPT rate AUC={auc(hy, base):.4f}")
+
+    # the saved model is refit on every line
+    start = time.perf_counter()
+    w, b = fit(cache.indptr, cache.indices, cache.labels.astype(float), d, l2=args.l2, iterations=args.iterations)
+    print(f"refit on {len(cache.labels):,} lines in {time.perf_counter() - start:.2f}s")
+    meta = {"lines": int(len(cache.labels)), "features": d, "feature_key": cache.key,
+            "holdout_auc": round(auc(hy, p), 4), "trained_through": int(cache.days.max()),
+            "trained": time.strftime("%Y-%m-%d %H:%M:%S")}
+    save_model(args.model, cache.vocab, w, b, meta)
+    print(f"model saved to {args.model}")
+
+def evaluate(args):
+    """Score lines dated after the model's training data (all lines, in-sample, if none)."""
+    store, cache = _open(args)
+    model = load_model(args.model)
+    if model["meta"].get("feature_key") != cache.key:
+        print("warning: the model was trained on different features (denial rules changed?)")
+    names = sorted(cache.vocab, key=cache.vocab.get)
+    w = np.array([model["weights"][model["vocab"][n]] if n in model["vocab"] else 0.0 for n in names])
+    new = cache.days > model["meta"].get("trained_through", cache.days.max())
+    label = "new"
+    if not new.any():
+        new, label = np.ones(len(cache.days), dtype=bool), "in-sample"
+    hi, hx, hy = _subset(cache, new)
+    start = time.perf_counter()
+    p = _sigmoid(_logits(hi, hx, _rows(hi), w, model["bias"]))
+    _report(label, hy, p, time.perf_counter() - start)
+
+    # end to end: claims table -> features -> per-claim risk
+    table, _ = _era_claims(store, sorted(cache.files))
+    store.close()
+    rules = load_rules(DENIAL_RULES)
+    start = time.perf_counter()
+    predict_table(table, model, rules)
+    seconds = time.perf_counter() - start
+    print(f"batch     claims={table['n']:>6,}  predict_table={seconds * 1e3:.1f} ms"
+          f" ({seconds / max(table['n'], 1) * 1e6:.2f} us/claim)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train / evaluate the denial model on remittance.db.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, fn in (("train", train), ("eval", evaluate)):
+        p = sub.add_parser(name)
+        p.add_argument("--db", default="remittance.db", help="remittance store written by the export scripts")
+        p.add_argument("--cache", default=os.path.join("output", CACHE_FILE), help="encoded feature matrix, updated incrementally")
+        p.add_argument("--model", default=os.path.join("output", MODEL_FILE))
+        if name == "train":
+            p.add_argument("--l2", type=float, default=1e-3)
+            p.add_argument("--iterations", type=int, default=400)
+        p.set_defaults(fn=fn)
+    args = parser.parse_args()
+    args.fn(args)
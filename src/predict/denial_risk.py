@@ -1,50 +1,159 @@
-
 """
-Predictive denial risk (rule-based starter).
-Scores a claim stub based on common denial patterns.
+Predictive denial risk.
+Scores a claim stub based on common denial patterns, plus (optionally) the
+payer x CPT denial rates the ERA export writes to era_stats.json, refined by
+how often the scrubber's own recommendations of a CPT were denied.
+Claims are scored column-wise: rule hits are boolean masks over the batch.
+When a trained model is given (src/predict/denial_model.py) its probability
+is the risk; the rule and ERA factors still explain it.
+
+  python -m src.predict.denial_risk     # scores two demo claims
 """
 from __future__ import annotations
-from typing import Dict, Any, List
-import math, json, os
-
-def _rule_hits(claim:Dict[str,Any]) -> List[str]:
-    hits = []
-    cpts = [c.get("code") for c in claim.get("cpts",[])]
-    icds = claim.get("icds",[])
-    # Missing -25 when E/M + procedure/screening same day
-    if any(c.startswith("9921") for c in cpts) and any(x for x in cpts if x not in {"99212","99213","99214","99215"}):
-        if not any("25" in (c.get("modifiers") or []) for c in claim.get("cpts",[])):
-            hits.append("Missing -25 on same-day E/M + procedure")
-    # G0444 without Z13.31
-    if "G0444" in cpts and "Z13.31" not in icds:
-        hits.append("G0444 missing Z13.31")
-    # Z00.00 w/ problem-focused services
-    if "Z00.00" in icds and any(c.startswith("9921") for c in cpts):
-        hits.append("Z00.00 with problem-focused E/M")
-    return hits
-
-def score_claim(claim:Dict[str,Any], era_stats:Dict[str,Any]|None=None) -> Dict[str,Any]:
-    hits = _rule_hits(claim)
-    base = 0.15 * len(hits)
-    # Optional ERA stats bump (e.g., payer-specific risk)
-    payer = claim.get("payer","")
-    if era_stats:
-        bump = era_stats.get("payer_bumps",{}).get(payer,0)
-    else:
-        bump = 0
-    risk = min(0.95, base + bump)
-    return {"risk": round(risk,2), "top_factors": hits or ["No rule hits"]}
-
-def batch_score(claims:List[Dict[str,Any]], era_stats_path:str|None=None):
-    stats = None
-    if era_stats_path and os.path.exists(era_stats_path):
-        with open(era_stats_path,"r") as f:
-            stats = json.load(f)
-    out = []
-    for c in claims:
-        scored = score_claim(c, stats)
-        out.append({"claim_stub_id": c.get("id","tmp"), **scored})
-    return out
+from typing import Dict, Any, List, Tuple
+import json, os
+
+import numpy as np
+import pandas as pd
+
+from src.rules.engine import RuleSet, load_rules
+
+# Denial-pattern rules live in src/rules/denial_risk.json (reloaded on change).
+DENIAL_RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "denial_risk.json")
+
+# ERA rates are shrunk toward their parent (recommended CPT -> payer x CPT ->
+# CPT -> overall) by this many pseudo-lines, so a CPT seen twice doesn't
+# swing the score.
+SMOOTHING = 20
+
+def claims_table(claims:List[Dict[str,Any]]) -> Dict[str,Any]:
+    """
+    Claim stubs -> the columnar table RuleSet.masks reads: multi-valued
+    fields (codes, modifiers, icds) as parallel (claim row, value) arrays.
+    """
+    ids, payers = [], []
+    code_row, codes, mod_row, mods, icd_row, icds = [], [], [], [], [], []
+    for i, claim in enumerate(claims):
+        ids.append(claim.get("id","tmp"))
+        payers.append(claim.get("payer",""))
+        for c in claim.get("cpts",[]):
+            code_row.append(i)
+            codes.append(c.get("code"))
+            for m in c.get("modifiers") or []:
+                mod_row.append(i)
+                mods.append(m)
+        for x in claim.get("icds",[]):
+            icd_row.append(i)
+            icds.append(x)
+    return {
+        "n": len(claims),
+        "id": ids,
+        "payer": (np.arange(len(claims)), payers),
+        "codes": (np.array(code_row, dtype=np.int64), codes),
+        "modifiers": (np.array(mod_row, dtype=np.int64), mods),
+        "icds": (np.array(icd_row, dtype=np.int64), icds),
+    }
+
+def load_era_stats(path:str|None) -> Dict[str,Any]|None:
+    if path and os.path.exists(path):
+        with open(path,"r") as f:
+            return json.load(f)
+    return None
+
+def _era_line_rates(payers:np.ndarray, cpts:np.ndarray, stats:Dict[str,Any]) -> Tuple[np.ndarray,float]:
+    # Smoothed denial rate per claim line, plus the overall rate.
+    lines, denied = stats["overall"]
+    overall = denied / lines if lines else 0.0
+    cpt_rate = {c: (d + SMOOTHING * overall) / (n + SMOOTHING) for c, (n, d) in stats.get("cpt", {}).items()}
+    pc_rate = {f"{p}\t{c}": (d + SMOOTHING * cpt_rate.get(c, overall)) / (n + SMOOTHING)
+               for p, by_cpt in stats.get("payer_cpt", {}).items() for c, (n, d) in by_cpt.items()}
+    cpts = pd.Series(cpts, dtype=object).fillna("").astype(str)
+    keys = pd.Series(payers, dtype=object).fillna("").astype(str) + "\t" + cpts
+    rates = keys.map(pc_rate).fillna(cpts.map(cpt_rate)).fillna(overall)
+    # outcomes of the scrubber's recommendations (reconciliation index)
+    recommended = stats.get("recommended") or {}
+    if recommended:
+        n = cpts.map({c: v[0] for c, v in recommended.items()}).fillna(0)
+        d = cpts.map({c: v[1] for c, v in recommended.items()}).fillna(0)
+        rates = (d + SMOOTHING * rates) / (n + SMOOTHING)
+    return rates.to_numpy(dtype=float), overall
+
+def _top_carc(stats:Dict[str,Any], payer:str, cpt:str) -> str|None:
+    by_carc = stats.get("payer_cpt_carc", {}).get(payer, {}).get(cpt)
+    return max(by_carc, key=lambda k: (by_carc[k], k)) if by_carc else None
+
+def score_table(table:Dict[str,Any], era_stats:Dict[str,Any]|None=None, rules:RuleSet|None=None,
+                model:Dict[str,Any]|None=None) -> pd.DataFrame:
+    """
+    Score every claim of a columnar table in one pass: rule hits as boolean
+    masks, combined with the ERA denial rate of the claim's riskiest line
+    (payer x CPT, see src/era_pipeline/stats.py) as independent risks, or
+    the trained model's probability when one is given.
+    Returns claim_stub_id, risk, top_factors.
+    """
+    rules = rules or load_rules(DENIAL_RULES)
+    n = table["n"]
+    hits = np.zeros(n, dtype=np.int64)
+    factors: Dict[int,List[str]] = {}
+    for _, then, mask in rules.masks(table):
+        if mask.any():
+            hits += mask
+            for i in np.flatnonzero(mask).tolist():
+                factors.setdefault(i, []).append(then["hit"])
+    risk = np.minimum(0.15 * hits, 1.0)
+
+    if era_stats and "overall" in era_stats:
+        row, codes = table["codes"]
+        payers = np.asarray(table["payer"][1], dtype=object)
+        line_payers = payers[row]
+        rates, overall = _era_line_rates(line_payers, codes, era_stats)
+        # the claim's riskiest line, first one on ties
+        order = np.lexsort((-np.arange(len(rates)), rates, row))
+        last = np.r_[row[order][1:] != row[order][:-1], True] if len(order) else np.zeros(0, dtype=bool)
+        worst = order[last]
+        era = np.zeros(n)
+        era[row[worst]] = rates[worst]
+        risk = 1 - (1 - risk) * (1 - era)
+        for i in worst[rates[worst] > overall]:
+            payer, cpt = str(line_payers[i]), str(codes[i]).split(" ")[0]
+            if cpt in era_stats.get("payer_cpt", {}).get(payer, {}):
+                carc = _top_carc(era_stats, payer, cpt)
+                factor = f"ERA: {payer} {cpt} denied {rates[i]:.0%}" + (f", mostly {carc}" if carc else "")
+            else:
+                factor = f"ERA: {cpt} denied {rates[i]:.0%} (all payers)"
+            outcome = (era_stats.get("recommended") or {}).get(cpt)
+            if outcome:
+                factor += f"; {outcome[1]} of {outcome[0]} recommended {cpt} lines denied"
+            factors.setdefault(int(row[i]), []).append(factor)
+
+    if model is not None:
+        from src.predict.denial_model import predict_table
+        risk = predict_table(table, model)
+
+    # Optional static payer bumps (e.g., payer-specific risk)
+    if era_stats and era_stats.get("payer_bumps"):
+        bumps = era_stats["payer_bumps"]
+        risk = risk + np.array([bumps.get(p, 0) for p in table["payer"][1]], dtype=float)
+    risk = np.minimum(0.95, risk).round(2)
+    return pd.DataFrame({
+        "claim_stub_id": table["id"],
+        "risk": risk,
+        "top_factors": [factors.get(i) or ["No rule hits"] for i in range(n)],
+    })
+
+def score_claim(claim:Dict[str,Any], era_stats:Dict[str,Any]|None=None, rules:RuleSet|None=None) -> Dict[str,Any]:
+    scored = score_table(claims_table([claim]), era_stats, rules)
+    return {"risk": float(scored["risk"].iloc[0]), "top_factors": scored["top_factors"].iloc[0]}
+
+def batch_score(claims:List[Dict[str,Any]], era_stats_path:str|None=None, rules_path:str=DENIAL_RULES,
+                model_path:str|None=None):
+    model = None
+    if model_path and os.path.exists(model_path):
+        from src.predict.denial_model import load_model
+        model = load_model(model_path)
+    scored = score_table(claims_table(claims), load_era_stats(era_stats_path), load_rules(rules_path), model)
+    return [{"claim_stub_id": cid, "risk": float(r), "top_factors": f}
+            for cid, r, f in zip(scored["claim_stub_id"], scored["risk"], scored["top_factors"])]
 
 if __name__ == "__main__":
     demo_claims = [
@@ -0,0 +1,350 @@
+"""
+Data-driven rule engine for the scrubber and denial-risk rules.
+
+A rule set is a JSON file:
+
+  {"version": 1,
+   "rules": [{"id": "g0444-z1331",
+              "when": {"all": [{"set": "codes", "any": ["G0444"]},
+                               {"set": "icds", "none": ["Z13.31"]}]},
+              "then": {"hit": "G0444 missing Z13.31"}}, ...],
+   "indexed": ["codes", "icds"],   (optional) set fields fixed before evaluation
+   ...}                      (other top-level keys are for the caller)
+
+Conditions:
+  {"text": F, "keywords": [...], "match": "any"|"all"}   F is a text field; for a
+        list field (e.g. complaint_text) "all" must hold within one item
+  {"set": F, "any": [...]} / "none" / "prefix" (a member starts with one) /
+        "outside" (a member not in the list)
+  {"number": F, "below": n}        {"present": F}   (truthy field)
+  {"all": [...]}  {"any": [...]}  {"not": {...}}
+
+Every keyword of every rule is compiled into one trie-shaped regex, so a
+text is scanned once whatever the number of rules, and rules are indexed by
+the keywords (and indexed codes) they need: a rule that can't fire without
+one is only evaluated when it was seen. Code conditions are set lookups.
+"then" is returned to the caller as-is; rules fire in file order and see the
+facts as the caller updates them between rules.
+
+RuleSet.masks(table) evaluates the rules column-wise over many records at
+once (one boolean mask per rule) for rule sets whose facts are fixed up
+front, like claim stubs; text conditions are per-record only.
+
+load_rules(path) recompiles a rule set when its file changes (mtime/size),
+so edits take effect on the next batch without a restart.
+"""
+from __future__ import annotations
+from typing import Callable, Dict, Any, List, Iterator, Tuple
+import json, os, re, threading
+
+import numpy as np
+import pandas as pd
+
+Facts = Dict[str,Any]
+Test = Callable[[Facts], bool]
+
+# ---- KEYWORD AUTOMATON ----
+def _trie_pattern(node:Dict[str,Any]) -> str:
+    # Greedy, prefix-factored alternation: matches the longest keyword at a
+    # position and never tries more than one branch per character.
+    alts = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    return f"(?:{body})?" if "" in node else body
+
+# Up to this many keywords, one C substring search per keyword beats a
+# single regex pass (CPython's re scans ~40 MB/s, str.find GB/s).
+SUBSTRING_LIMIT = 64
+
+class KeywordMatcher:
+    """All keywords occurring in a text: a substring check each, or one trie-regex scan for large sets."""
+    def __init__(self, keywords:List[str]):
+        keywords = sorted({k.lower() for k in keywords if k})
+        self.keywords = keywords if len(keywords) <= SUBSTRING_LIMIT else None
+        trie: Dict[str,Any] = {}
+        for kw in keywords:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[""] = True
+        # One findall gives the longest keyword at each position it resumes
+        # from; keywords inside a match occur too (inside), and the only ones
+        # it can miss start inside a match and run past it -- at the offsets
+        # in overlaps, where a suffix of the match begins another keyword
+        # (checked at every occurrence of such a keyword, via str.find).
+        self.regex = re.compile(_trie_pattern(trie)) if keywords else None
+        self.inside = {kw: frozenset(k for k in keywords if k in kw) for kw in keywords}
+        self.overlaps: Dict[str,Tuple[int,...]] = {}
+        for kw in keywords:
+            offsets = tuple(i for i in range(1, len(kw))
+                            if any(len(o) > len(kw) - i and o.startswith(kw[i:]) for o in keywords))
+            if offsets:
+                self.overlaps[kw] = offsets
+
+    def find(self, text:str) -> frozenset:
+        if self.regex is None or not text:
+            return frozenset()
+        text = text.lower()
+        if self.keywords is not None:
+            return frozenset([k for k in self.keywords if k in text])
+        found = set(self.regex.findall(text))
+        if not found:
+            return frozenset()
+        if self.overlaps and not found.isdisjoint(self.overlaps):
+            match = self.regex.match
+            for kw in found.intersection(self.overlaps):
+                offsets = self.overlaps[kw]
+                start = text.find(kw)
+                while start >= 0:
+                    for i in offsets:
+                        x = match(text, start + i)
+                        if x:
+                            found.add(x.group())
+                    start = text.find(kw, start + 1)
+        if len(found) == 1:
+            return self.inside[found.pop()]
+        return frozenset().union(*(self.inside[m] for m in found))
+
+# ---- CONDITIONS ----
+ITEMS = "items"  # facts[ITEMS][field]: per-item keyword hits of a list field
+
+def _and(a:Test, b:Test) -> Test:
+    return lambda f: a(f) and b(f)
+
+def _or(a:Test, b:Test) -> Test:
+    return lambda f: a(f) or b(f)
+
+def _fold(tests:List[Test], join) -> Test:
+    test = tests[0]
+    for t in tests[1:]:
+        test = join(test, t)
+    return test
+
+def _compile(cond:Dict[str,Any], rule_id:str, keywords:List[str], text_fields:set,
+             indexed:frozenset=frozenset()) -> Tuple[Test,set|None]:
+    """
+    (test, trigger atoms): the rule can only hold if one (field, value) atom
+    was seen -- a keyword in a text field, or a member of an indexed set
+    field; None = no such bound.
+    """
+    def sub(c):
+        return _compile(c, rule_id, keywords, text_fields, indexed)
+    if not isinstance(cond, dict) or not cond:
+        raise ValueError(f"rule {rule_id!r}: condition must be a non-empty object")
+    if "text" in cond:
+        field, kws = cond["text"], [k.lower() for k in cond["keywords"]]
+        keywords.extend(kws)
+        text_fields.add(field)
+        wanted = frozenset(kws)
+        if cond.get("match", "any") == "all":
+            def all_in_one(f):
+                if not wanted <= f[field]:
+                    return False
+                items = f[ITEMS].get(field)
+                return items is None or any(wanted <= hits for hits in items)
+            return all_in_one, {(field, kws[0])}
+        # any keyword in any item == any keyword in the union of the items
+        return (lambda f: not wanted.isdisjoint(f[field])), {(field, k) for k in kws}
+    if "set" in cond:
+        field = cond["set"]
+        if "any" in cond:
+            values = frozenset(cond["any"])
+            trig = {(field, v) for v in values} if field in indexed else None
+            return (lambda f: not values.isdisjoint(f[field])), trig
+        if "none" in cond:
+            values = frozenset(cond["none"])
+            return lambda f: values.isdisjoint(f[field]), None
+        if "prefix" in cond:
+            prefixes = tuple(cond["prefix"])
+            return lambda f: any(v and v.startswith(prefixes) for v in f[field]), None
+        if "outside" in cond:
+            values = frozenset(cond["outside"])
+            return lambda f: any(v and v not in values for v in f[field]), None
+        raise ValueError(f"rule {rule_id!r}: set condition needs any/none/prefix/outside")
+    if "number" in cond:
+        field, below = cond["number"], cond["below"]
+        return lambda f: (f.get(field) or 0) < below, None
+    if "present" in cond:
+        field = cond["present"]
+        return lambda f: bool(f.get(field)), None
+    if "all" in cond:
+        parts = [sub(c) for c in cond["all"]]
+        bounded = [trig for _, trig in parts if trig is not None]
+        return _fold([t for t, _ in parts], _and), (min(bounded, key=len) if bounded else None)
+    if "any" in cond:
+        parts = [sub(c) for c in cond["any"]]
+        trig = None if any(t is None for _, t in parts) else set().union(*(t for _, t in parts))
+        return _fold([t for t, _ in parts], _or), trig
+    if "not" in cond:
+        test, _ = sub(cond["not"])
+        return (lambda f: not test(f)), None
+    raise ValueError(f"rule {rule_id!r}: unknown condition {sorted(cond)}")
+
+# ---- RULE SETS ----
+class RuleSet:
+    def __init__(self, spec:Dict[str,Any], source:str=""):
+        self.spec = spec
+        self.source = source
+        # Set fields the caller fixes before evaluation (e.g. a claim's codes)
+        # can gate rules like keywords do; fields that rules add to can't.
+        self.indexed = frozenset(spec.get("indexed", []))
+        keywords: List[str] = []
+        text_fields: set = set()
+        self.rules: List[Tuple[str,Test,Dict[str,Any]]] = []
+        self.triggers: List[set|None] = []
+        self.always: List[int] = []
+        self.by_atom: Dict[Tuple[str,str],List[int]] = {}
+        for i, rule in enumerate(spec.get("rules", [])):
+            rule_id = rule.get("id", f"#{i}")
+            if "when" in rule:
+                test, trig = _compile(rule["when"], rule_id, keywords, text_fields, self.indexed)
+            else:
+                test, trig = (lambda f: True), None
+            self.rules.append((rule_id, test, rule.get("then", {})))
+            self.triggers.append(trig)
+            if trig is None:
+                self.always.append(i)
+            else:
+                for atom in trig:
+                    self.by_atom.setdefault(atom, []).append(i)
+        self.text_fields = sorted(text_fields)
+        self.gates = self.text_fields + sorted(self.indexed)
+        self.matcher = KeywordMatcher(keywords)
+
+    def scan(self, texts:Dict[str,Any]) -> Facts:
+        """
+        Keyword hits per text field (for a list of strings, the union of its
+        items' hits, with the per-item sets under facts[ITEMS][field]).
+        """
+        facts: Facts = {ITEMS: {}}
+        find = self.matcher.find
+        for field in self.text_fields:
+            value = texts.get(field)
+            if isinstance(value, list):
+                items = [find(x or "") for x in value]
+                facts[ITEMS][field] = items
+                facts[field] = frozenset().union(*items)
+            else:
+                facts[field] = find(value or "")
+        return facts
+
+    def candidates(self, facts:Facts) -> List[int]:
+        """Rules worth evaluating: the ungated ones plus those gated by a value seen in facts."""
+        if not self.by_atom:
+            return self.always
+        ids = set(self.always)
+        by_atom = self.by_atom
+        for field in self.gates:
+            for value in facts[field]:
+                gated = by_atom.get((field, value))
+                if gated:
+                    ids.update(gated)
+        return sorted(ids)
+
+    def fired(self, facts:Facts) -> Iterator[Tuple[str,Dict[str,Any]]]:
+        """(rule id, then) for each rule that holds, in file order, evaluated lazily."""
+        rules = self.rules
+        for i in self.candidates(facts):
+            rule_id, test, then = rules[i]
+            if test(facts):
+                yield rule_id, then
+
+    def masks(self, table:Dict[str,Any]) -> List[Tuple[str,Dict[str,Any],np.ndarray]]:
+        """
+        (rule id, then, row mask) per rule over a columnar table:
+          table["n"]   number of rows
+          set field    (owner, values): parallel arrays, a row index per value
+          other field  array of length n (number / present conditions)
+        A gated rule none of whose values occur in the table is skipped.
+        """
+        cols = _Columns(table)
+        seen = {(field, v) for field in self.indexed if field in table for v in cols.unique(field)[1]}
+        out = []
+        for (rule_id, _, then), spec, trig in zip(self.rules, self.spec.get("rules", []), self.triggers):
+            if trig is not None and all(atom[0] in self.indexed for atom in trig) and not trig & seen:
+                out.append((rule_id, then, np.zeros(cols.n, dtype=bool)))
+                continue
+            mask = _mask(spec["when"], rule_id, cols) if "when" in spec else np.ones(cols.n, dtype=bool)
+            out.append((rule_id, then, mask))
+        return out
+
+# ---- COLUMN-WISE CONDITIONS ----
+class _Columns:
+    def __init__(self, table:Dict[str,Any]):
+        self.table = table
+        self.n = int(table["n"])
+        self._unique: Dict[str,tuple] = {}
+
+    def unique(self, field:str) -> tuple:
+        # (owner, distinct values, value index per entry); None counts as ""
+        if field not in self._unique:
+            owner, values = self.table[field]
+            inv, uniq = pd.factorize(pd.Series(values, dtype=object).fillna("").astype(str))
+            self._unique[field] = (np.asarray(owner, dtype=np.int64), np.asarray(uniq, dtype=object), inv)
+        return self._unique[field]
+
+    def rows_with(self, field:str, lut:np.ndarray) -> np.ndarray:
+        # rows owning at least one value for which lut (over distinct values) holds
+        owner, _, inv = self.unique(field)
+        out = np.zeros(self.n, dtype=bool)
+        out[owner[lut[inv]]] = True
+        return out
+
+def _mask(cond:Dict[str,Any], rule_id:str, cols:_Columns) -> np.ndarray:
+    if "text" in cond:
+        raise ValueError(f"rule {rule_id!r}: text conditions can't be evaluated column-wise")
+    if "set" in cond:
+        field = cond["set"]
+        _, uniq, _ = cols.unique(field)
+        filled = uniq != ""
+        if "any" in cond:
+            return cols.rows_with(field, np.isin(uniq, list(cond["any"])))
+        if "none" in cond:
+            return ~cols.rows_with(field, np.isin(uniq, list(cond["none"])))
+        if "prefix" in cond:
+            prefixes = tuple(cond["prefix"])
+            return cols.rows_with(field, np.array([u.startswith(prefixes) for u in uniq], dtype=bool) & filled)
+        if "outside" in cond:
+            return cols.rows_with(field, ~np.isin(uniq, list(cond["outside"])) & filled)
+        raise ValueError(f"rule {rule_id!r}: set condition needs any/none/prefix/outside")
+    if "number" in cond:
+        values = np.nan_to_num(np.asarray(cols.table[cond["number"]], dtype=float))
+        return values < cond["below"]
+    if "present" in cond:
+        value = cols.table[cond["present"]]
+        if isinstance(value, tuple):
+            return cols.rows_with(cond["present"], cols.unique(cond["present"])[1] != "")
+        return np.asarray(value).astype(bool)
+    if "all" in cond:
+        return np.logical_and.reduce([_mask(c, rule_id, cols) for c in cond["all"]])
+    if "any" in cond:
+        return np.logical_or.reduce([_mask(c, rule_id, cols) for c in cond["any"]])
+    if "not" in cond:
+        return ~_mask(cond["not"], rule_id, cols)
+    raise ValueError(f"rule {rule_id!r}: unknown condition {sorted(cond)}")
+
+_loaded: Dict[str,Tuple[Tuple[int,int],RuleSet]] = {}
+_lock = threading.Lock()
+
+def load_rules(path:str) -> RuleSet:
+    """Compiled rule set for a JSON file, recompiled when the file changes."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rules = RuleSet(json.load(f), path)
+        except (ValueError, KeyError, TypeError) as e:
+            if not cached:
+                raise
+            # A half-saved or broken edit keeps the last good rule set running.
+            print(f"Rule file {path} not reloaded ({e}); keeping the previous version.")
+            _loaded[path] = (version, cached[1])
+            return cached[1]
+        _loaded[path] = (version, rules)
+        return rules
@@ -2,17 +2,32 @@
 """
 Generates dashboard JSON outputs using stubs + sample visits.
 Replace individual generators with real logic as you integrate.
+
+The generators run as a small task graph (src/dag.py): independent ones run
+concurrently, and a generator whose inputs haven't changed since the last
+run is skipped. --force reruns everything.
 """
-import os, json, sys
-from src.scrubber.ov_to_billing import ov_to_billing
+import os, json, sys, argparse
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+from src.scrubber.ov_to_billing import ov_to_billing_batch
 from src.predict.denial_risk import batch_score
-# from src.era_pipeline.export_remittance_json import export_summaries
 from src.integrations.incentives_ingest import ensure_incentive_snapshot
+from src.era_pipeline.stats import STATS_FILE
+from src.era_pipeline.store import RemittanceStore
+from src.era_pipeline.layouts import detect_payer
+from src.era_pipeline.reconcile import ReconciliationIndex
+from src.predict.denial_model import MODEL_FILE
+from src.dag import Task, run
+from src import metrics
 
-BASE = os.path.dirname(os.path.dirname(__file__))
-sys.path.append(BASE)
-sys.path.append(os.path.join(BASE, "src"))
 OUT = os.path.join(BASE, "output")
+STATE_FILE = os.path.join(OUT, ".run_state.json")
+SAMPLE_VISITS = os.path.join(BASE, "src", "sample_visits.json")
+INCENTIVE_SOURCE = "../2025-INCENTIVE/output/incentive_snapshot.json"
+# trained by `python -m src.predict.denial_model train`; rule/ERA scoring without it
+DENIAL_MODEL = os.path.join(OUT, MODEL_FILE)
 
 def gen_kpis():
     kpis = {
@@ -27,49 +42,111 @@ def gen_kpis():
     with open(os.path.join(OUT,"kpi_snapshot.json"),"w") as f:
         json.dump(kpis, f, indent=2)
 
+def _payer(name) -> str:
+    if not name:
+        return ""
+    payer = detect_payer(str(name))
+    return str(name).strip() if payer == "Unknown" else payer
+
 def gen_claims_and_risk():
     # Sample visits → scrubber → claim stubs → risk
-    visits = json.load(open(os.path.join(BASE,"src","sample_visits.json"),"r"))
+    with open(SAMPLE_VISITS,"r") as f:
+        visits = json.load(f)
     suggestions = []
-    for v in visits:
-        sug = ov_to_billing(v)
-        suggestions.append({"id": v.get("id"), "patient_id": v.get("patient_id"), "dos": v.get("dos"), **sug})
+    with metrics.stage("scrubber"):
+        scrubbed = ov_to_billing_batch(visits)
+    metrics.count("visits", len(visits))
+    for v, sug in zip(visits, scrubbed):
+        # patient_name (as on the remit) lets the reconciliation index match ERA lines
+        name = {"patient_name": v["patient_name"]} if v.get("patient_name") else {}
+        suggestions.append({"id": v.get("id"), "patient_id": v.get("patient_id"), **name, "dos": v.get("dos"), **sug})
     with open(os.path.join(OUT,"scrubber_suggestions.json"),"w") as f:
         json.dump(suggestions, f, indent=2)
 
+    # The visit's payer, named as the ERA export names it ("UHC", "BCBS"), so
+    # the payer x CPT rates apply; blank when the OV row has none, and
+    # batch_score falls back to the CPT-only rate.
     claim_stubs = []
-    for s in suggestions:
+    for v, s in zip(visits, suggestions):
         cpts = [{"code": x["code"], "modifiers": x.get("modifiers",[])} for x in s["recommended_cpts"]]
-        claim_stubs.append({"id": s["id"], "payer": "MC", "cpts": cpts, "icds": s["recommended_icds"]})
-    risk = batch_score(claim_stubs, era_stats_path=None)
+        claim_stubs.append({"id": s["id"], "payer": _payer(v.get("payer")), "cpts": cpts,
+                            "icds": s["recommended_icds"]})
+    # payer x CPT denial rates written by the ERA export (skipped if it hasn't run)
+    from src.era_pipeline import export_remittance_json as era
+    with metrics.stage("denial_risk"):
+        risk = batch_score(claim_stubs, era_stats_path=os.path.join(era.react_data_folder, STATS_FILE),
+                           model_path=DENIAL_MODEL)
+    metrics.count("claims", len(claim_stubs))
     with open(os.path.join(OUT,"claim_risk_scores.json"),"w") as f:
         json.dump(risk, f, indent=2)
 
+    # (patient, DOS, CPT) links to ERA lines: worklist visit ids and the
+    # recommended-code outcomes in era_stats.json on the next export
+    if os.path.exists(era.store_path):
+        store = RemittanceStore(era.store_path)
+        try:
+            ReconciliationIndex(store).record(suggestions, claim_stubs, risk)
+        finally:
+            store.close()
+
 def gen_payer_and_denials():
-    # Use your existing ERA processor
-    import subprocess
-    import sys
+    # Use your existing ERA processor (in-process; it owns its cache and store)
+    from src.era_pipeline import export_remittance_json as era
     try:
-        subprocess.run([sys.executable, os.path.join(BASE, "src", "era_pipeline", "export_remittance_json.py")], check=True)
-    except Exception as e:
+        # rebuild: this task only runs when something changed, so always write outputs
+        era.export(rebuild=True)
+    except (Exception, SystemExit) as e:
         print(f"ERA processing failed: {e}")
-        # Fallback to mock data
+        # Fallback to mock data, then fail the task so the DAG keeps no
+        # fingerprint and the next run retries the real export
         mock_payer = [{"name": "BCBS", "amount": 45000}, {"name": "Humana", "amount": 32000}]
         mock_denials = [{"name": "CO-97", "value": 15}, {"name": "PR-1", "value": 8}]
         with open(os.path.join(OUT,"payer_summary.json"),"w") as f:
             json.dump(mock_payer, f, indent=2)
         with open(os.path.join(OUT,"denial_trends.json"),"w") as f:
             json.dump(mock_denials, f, indent=2)
+        raise
 
 def gen_incentives():
-    ensure_incentive_snapshot("../2025-INCENTIVE/output/incentive_snapshot.json", os.path.join(OUT,"incentive_snapshot.json"))
+    ensure_incentive_snapshot(INCENTIVE_SOURCE, os.path.join(OUT,"incentive_snapshot.json"))
+
+def tasks():
+    from src.era_pipeline import export_remittance_json as era
+    scrubber = os.path.join(BASE, "src", "scrubber")
+    predict = os.path.join(BASE, "src", "predict")
+    rules = os.path.join(BASE, "src", "rules")
+    out = lambda name: os.path.join(OUT, name)
+    return [
+        Task("kpis", gen_kpis, outputs=[out("kpi_snapshot.json")]),
+        # The ERA export rewrites kpi_snapshot with real totals, so it runs
+        # after the stub; the risk scores use the stats it writes and replace
+        # its CPT summary in claim_risk_scores.json with the schema's shape.
+        Task("payer_and_denials", gen_payer_and_denials, deps=["kpis"],
+             inputs=[era.source_pdf_folder, os.path.join(BASE, "src", "era_pipeline")],
+             outputs=[out("payer_summary.json"), out("denial_trends.json")]),
+        Task("claims_and_risk", gen_claims_and_risk, deps=["payer_and_denials"],
+             inputs=[SAMPLE_VISITS, scrubber, predict, rules, os.path.join(era.react_data_folder, STATS_FILE),
+                     DENIAL_MODEL],
+             outputs=[out("scrubber_suggestions.json"), out("claim_risk_scores.json")]),
+        Task("incentives", gen_incentives, inputs=[INCENTIVE_SOURCE],
+             outputs=[out("incentive_snapshot.json")]),
+    ]
 
-def main():
-    gen_kpis()
-    gen_claims_and_risk()
-    gen_payer_and_denials()
-    gen_incentives()
+def main(jobs=4, force=False, profile=None):
+    os.makedirs(OUT, exist_ok=True)
+    with metrics.profile(profile) as profiled:
+        status = run(tasks(), STATE_FILE, jobs=jobs, force=force)
+    metrics.write(OUT, "run_all", profiled, tasks=status)
     print(f"JSON written to: {OUT}")
+    failed = [name for name, s in status.items() if s in ("failed", "blocked")]
+    if failed:
+        sys.exit(f"Failed: {', '.join(failed)}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate the dashboard JSON outputs.")
+    parser.add_argument("--jobs", type=int, default=4, help="generators run concurrently")
+    parser.add_argument("--force", action="store_true", help="rerun every generator even if its inputs are unchanged")
+    parser.add_argument("--profile", choices=metrics.PROFILES,
+                        help="also profile the run (cProfile or tracemalloc) into output/run_metrics.json")
+    args = parser.parse_args()
+    main(args.jobs, args.force, args.profile)
@@ -1,4 +1,3 @@
-
 """
 OV → Billing (CPT/ICD/Modifiers) suggester.
 
@@ -27,77 +26,67 @@ Output example:
   "missing_documentation": ["Add time statement for 99497 ..."],
   "conflicts": ["AWV + 99214 requires -25 and distinct problem-oriented work"]
 }
+
+  python -m src.scrubber.ov_to_billing     # suggestions for a demo visit
 """
 from __future__ import annotations
-from dataclasses import dataclass
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
-import re
-
-E_M_BY_TIME = [
-    (40, "99215"),
-    (30, "99214"),
-    (20, "99213"),
-    (10, "99212"),
-]
-
-MDM_TO_EM = {
-    "straightforward":"99212",
-    "low":"99213",
-    "moderate":"99214",
-    "high":"99215",
-}
+from datetime import datetime
+from functools import lru_cache
+from bisect import bisect_left
+import os
 
-TIME_REQUIRED = {
-    "G0444": 15,   # Depression screen
-    "99497": 16,   # ACP first 30 min; CMS counts ≥16
-    "99406": 3,    # Smoking cessation 3-10 min
-}
+from src.rules.engine import RuleSet, load_rules
 
-ANNUAL_FREQ = {
-    "G0439": 365,  # AWV subsequent
-    "G0402": 365,  # Initial preventive physical exam (Welcome to Medicare)
-}
+# Billing rules (E/M tables, frequency limits, keyword rules) live in
+# src/rules/billing.json and are reloaded when the file changes.
+BILLING_RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "billing.json")
 
-def _pick_em_code(time_minutes:int|None, mdm_level:str|None) -> str|None:
+def _pick_em_code(time_minutes:int|None, mdm_level:str|None, em:Dict[str,Any]) -> str|None:
     if time_minutes and time_minutes >= 10:
-        for threshold, code in E_M_BY_TIME:
+        for threshold, code in em["by_time"]:
             if time_minutes >= threshold:
                 return code
     if mdm_level:
-        return MDM_TO_EM.get(mdm_level.lower())
+        return em["by_mdm"].get(mdm_level.lower())
     return None
 
-def _contains(text:str, *keywords:str) -> bool:
-    t = (text or "").lower()
-    return all(k.lower() in t for k in keywords)
-
-def _any_contains(items:List[str], *keywords:str) -> bool:
-    return any(_contains(x, *keywords) for x in (items or []))
-
-def _already_billed(history:dict, code:str, dos:str, lookback:int) -> bool:
+def _parse_day(text:str) -> datetime:
     try:
-        pivot = datetime.strptime(dos,"%Y-%m-%d")
-    except:
+        return datetime.strptime(text,"%Y-%m-%d")
+    except (ValueError, TypeError):
         # attempt flexible parsing
-        pivot = datetime.fromisoformat(dos[:10])
-    days = timedelta(days=int(lookback))
-    for row in (history or {}).get("recent_cpts", []):
-        if row.get("code") == code:
-            # if within lookback, treat as already billed
-            try:
-                prev = datetime.strptime(row.get("dos",""), "%Y-%m-%d")
-            except:
-                prev = datetime.fromisoformat(row.get("dos","")[:10])
-            if abs((pivot - prev).days) <= lookback:
-                return True
-    return False
-
-def ov_to_billing(payload:Dict[str,Any]) -> Dict[str,Any]:
-    visit = payload
+        return datetime.fromisoformat(text[:10])
+
+@lru_cache(maxsize=65536)
+def _day(text:str) -> int:
+    # DOS strings repeat heavily across a batch; parse each one once.
+    return _parse_day(text).toordinal()
+
+class CptHistory:
+    """
+    A patient's recent CPTs by code, dates parsed once and sorted, so a
+    lookback check is a binary search instead of a scan of the history.
+    A code's dates are only parsed the first time it is looked up.
+    """
+    def __init__(self, rows:List[Dict[str,Any]]|None):
+        self.raw: Dict[str,List[str]] = {}
+        for row in rows or []:
+            self.raw.setdefault(row.get("code"), []).append(row.get("dos",""))
+        self.days: Dict[str,List[int]] = {}
+
+    def billed_within(self, code:str, dos:str, lookback:int) -> bool:
+        days = self.days.get(code)
+        if days is None:
+            days = self.days[code] = sorted(_day(d) for d in self.raw.get(code, []))
+        pivot, lookback = _day(dos), int(lookback)
+        # treat as already billed if any date is within lookback either side
+        i = bisect_left(days, pivot - lookback)
+        return i < len(days) and days[i] <= pivot + lookback
+
+def _suggest(visit:Dict[str,Any], rules:RuleSet, history:CptHistory) -> Dict[str,Any]:
     dos = visit.get("dos") or ""
-    lookback_days = int(visit.get("previous_cpt_lookback_days", 365))
-    history = visit.get("history") or {}
+    frequency = rules.spec.get("frequency", {})
 
     out = {
         "recommended_cpts": [],
@@ -106,82 +95,89 @@ def ov_to_billing(payload:Dict[str,Any]) -> Dict[str,Any]:
         "conflicts": [],
     }
 
-    # 1) Determine E/M
-    em = _pick_em_code(visit.get("time_minutes"), visit.get("mdm_level"))
+    # E/M by time/MDM; the rules decide its modifiers and where it's listed
+    em = _pick_em_code(visit.get("time_minutes"), visit.get("mdm_level"), rules.spec["em"])
     if em:
         em_entry = {"code": em, "modifiers": [], "reason": "E/M selected by time/MDM"}
     else:
         em_entry = None
 
-    # 2) Preventive/AWV logic suppressing E/M unless distinct
-    visit_type = (visit.get("visit_type") or "").lower()
-    is_awv = visit_type in {"awv","preventive"} or _any_contains(visit.get("complaints",[]),"annual wellness") 
-    if is_awv:
-        # suggest G0439 if within frequency and 'subsequent' implied; leave specificity to real rules
-        if not _already_billed(history, "G0439", dos, ANNUAL_FREQ["G0439"]):
-            out["recommended_cpts"].append({"code":"G0439","modifiers":[],"reason":"Annual Wellness Visit (subsequent) — within frequency"})
-        # If distinct problem work exists (procedures or problem list), add -25 to E/M
-        if em_entry:
-            em_entry["modifiers"].append("25")
-            em_entry["reason"] = (em_entry["reason"] + " + distinct problem on same day as AWV").strip()
-            out["conflicts"].append("AWV + E/M requires -25 and distinct documentation.")
-    # 3) Same-day procedure? Then -25 on E/M
-    if visit.get("procedures"):
-        if em_entry and "25" not in em_entry["modifiers"]:
-            em_entry["modifiers"].append("25")
-            em_entry["reason"] = (em_entry["reason"] + " + same-day procedure").strip()
-
-    # Commit E/M if chosen
-    if em_entry:
-        out["recommended_cpts"].append(em_entry)
-
-    # 4) Screenings & time-based services
-    text_blob = " ".join([
-        visit.get("assessment_free_text") or "",
-        " ".join(visit.get("complaints") or [])
-    ])
-
-    # Depression screening (G0444)
-    if _any_contains(visit.get("complaints",[]), "phq", "depression") or _contains(text_blob,"phq-9") or _contains(text_blob,"g0444"):
-        out["recommended_cpts"].append({"code":"G0444","modifiers":[],"reason":"Depression screening documented"})
-        if visit.get("time_minutes",0) < TIME_REQUIRED["G0444"]:
-            out["missing_documentation"].append("Add time statement for G0444 (≥15 min, tool used, score).")
-
-    # ACP (99497)
-    if _contains(text_blob, "advance care planning") or _any_contains(visit.get("procedures",[]),"acp"):
-        out["recommended_cpts"].append({"code":"99497","modifiers":[],"reason":"Advance care planning"})
-        if visit.get("time_minutes",0) < TIME_REQUIRED["99497"]:
-            out["missing_documentation"].append("Add time for 99497 (≥16 minutes, consent).")
-
-    # 5) ICD suggestions: prefer provided candidates + enrich from free text
-    icds = set(visit.get("icd_candidates") or [])
-    if _contains(text_blob,"ckd"):
-        icds.add("N18.30")
-    if _contains(text_blob,"depression"):
-        icds.add("F32.A")
-        icds.add("Z13.31")  # screening encounter
-    if is_awv:
-        # prefer Z00.01 when abnormal findings documented
-        if _contains(text_blob,"abnormal"):
-            icds.add("Z00.01")
-        else:
-            icds.add("Z00.00")
-    out["recommended_icds"] = sorted(icds)
-
-    # 6) Frequency checks (suppress if already billed recently)
-    pruned = []
-    for c in out["recommended_cpts"]:
-        freq = ANNUAL_FREQ.get(c["code"])
-        if freq and _already_billed(history, c["code"], dos, freq):
-            continue
-        pruned.append(c)
-    out["recommended_cpts"] = pruned
+    # Keyword hits over the note (assessment + complaints), complaints and procedures
+    facts = rules.scan({
+        "note": " ".join([visit.get("assessment_free_text") or "", " ".join(visit.get("complaints") or [])]),
+        "complaint_text": list(visit.get("complaints") or []),
+        "procedure_text": list(visit.get("procedures") or []),
+    })
+    codes, icds, flags = set(), set(visit.get("icd_candidates") or []), set()
+    facts.update({
+        "visit_type": {(visit.get("visit_type") or "").lower()},
+        "time_minutes": visit.get("time_minutes"),
+        "procedures": visit.get("procedures"),
+        "em": em_entry,
+        "codes": codes,
+        "icds": icds,
+        "flags": flags,
+    })
+
+    def add_cpt(entry:Dict[str,Any]):
+        # Frequency-limited codes are suppressed if already billed recently
+        freq = frequency.get(entry["code"])
+        if freq and history.billed_within(entry["code"], dos, freq):
+            return
+        out["recommended_cpts"].append(entry)
+        codes.add(entry["code"])
+
+    for rule_id, then in rules.fired(facts):
+        for action, arg in then.items():
+            if action == "flag":
+                flags.add(arg)
+            elif action == "cpt":
+                add_cpt({"code": arg["code"], "modifiers": list(arg.get("modifiers", [])), "reason": arg["reason"]})
+            elif action == "em":
+                if em_entry:
+                    add_cpt(em_entry)
+            elif action == "em_modifier":
+                if em_entry and arg["modifier"] not in em_entry["modifiers"]:
+                    em_entry["modifiers"].append(arg["modifier"])
+                    em_entry["reason"] = (em_entry["reason"] + arg["reason"]).strip()
+            elif action == "icds":
+                icds.update(arg)
+            elif action == "conflict":
+                out["conflicts"].append(arg)
+            elif action == "missing_documentation":
+                out["missing_documentation"].append(arg)
+            else:
+                raise ValueError(f"{rules.source}: rule {rule_id!r} has unknown action {action!r}")
 
-    # 7) Simple payer edit warnings (examples)
-    if any(c["code"]=="G0444" for c in out["recommended_cpts"]) and "Z13.31" not in out["recommended_icds"]:
-        out["conflicts"].append("G0444 typically requires Z13.31 as primary or supporting diagnosis.")
+    out["recommended_icds"] = sorted(icds)
+    return out
 
-    # done
+def ov_to_billing(payload:Dict[str,Any], rules_path:str=BILLING_RULES) -> Dict[str,Any]:
+    visit = payload
+    history = visit.get("history") or {}
+    return _suggest(visit, load_rules(rules_path), CptHistory(history.get("recent_cpts")))
+
+def ov_to_billing_batch(visits:List[Dict[str,Any]],
+                        histories:Dict[str,List[Dict[str,Any]]]|None=None,
+                        rules_path:str=BILLING_RULES) -> List[Dict[str,Any]]:
+    """
+    ov_to_billing over many visits, same output per visit. DOS strings are
+    parsed once per batch and each CPT history is indexed once: visits that
+    share a recent_cpts list (e.g. one patient's visits) share its index.
+    histories = {patient_id: recent_cpts} supplies a patient-level history
+    for visits that carry none of their own.
+    """
+    rules = load_rules(rules_path)
+    indexes: Dict[int,CptHistory] = {}
+    out = []
+    for visit in visits:
+        rows = (visit.get("history") or {}).get("recent_cpts")
+        if rows is None and histories:
+            rows = histories.get(visit.get("patient_id"))
+        index = indexes.get(id(rows))
+        if index is None:
+            index = indexes[id(rows)] = CptHistory(rows)
+        out.append(_suggest(visit, rules, index))
     return out
 
 if __name__ == "__main__":
@@ -19,3 +19,42 @@ export const loadPayerSummary = () => load('/src/data/payer_summary.json');
 export const loadDenialTrends = () => load('/src/data/denial_trends.json');
 export const loadClaimRisk = () => load('/src/data/claim_risk_scores.json');
 export const loadIncentives = () => load('/src/data/incentive_snapshot.json');
+
+// Sharded export (`--sharded`): manifest.json lists each dataset's pages with
+// a content hash, so only the pages being rendered are fetched and a page
+// whose hash is unchanged is served from memory.
+export type ShardPage = { path: string; count: number; sha256: string };
+export type ShardSet = { count: number; pages: ShardPage[] };
+export type ShardDataset = ShardSet & { groups?: Record<string, Record<string, ShardSet>> };
+export type ShardManifest = {
+  version: number;
+  page_size: number;
+  datasets: Record<string, ShardDataset>;
+};
+
+const pageCache = new Map<string, unknown>();
+
+export const loadManifest = (base = '/src/data'): Promise<ShardManifest> =>
+  fetch(`${base}/manifest.json`, { cache: 'no-cache' }).then((r) => {
+    if (!r.ok) throw new Error(`Missing: ${base}/manifest.json`);
+    return r.json();
+  });
+
+export async function loadPage<T = unknown>(page: ShardPage, base = '/src/data'): Promise<T> {
+  if (!pageCache.has(page.sha256)) pageCache.set(page.sha256, await load(`${base}/${page.path}`));
+  return pageCache.get(page.sha256) as T;
+}
+
+// One page (1-based) of a dataset, optionally within a group, e.g.
+// loadDatasetPage(m, 'worklist', 1, { payer: 'UHC' }).
+export function loadDatasetPage<T = unknown>(
+  manifest: ShardManifest, dataset: string, page = 1,
+  group?: Record<string, string>, base = '/src/data'): Promise<T> {
+  let set: ShardSet = manifest.datasets[dataset];
+  if (group) {
+    const [name, key] = Object.entries(group)[0];
+    set = manifest.datasets[dataset]?.groups?.[name]?.[key] ?? { count: 0, pages: [] };
+  }
+  const p = set?.pages[page - 1];
+  return p ? loadPage<T>(p, base) : Promise.resolve([] as unknown as T);
+}